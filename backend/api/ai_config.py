@@ -10,6 +10,7 @@ from schemas.ai_configuration import (
 from api.dependencies import get_current_user, verify_user_chat_access
 from models import User, AIConfiguration
 from common.database import db
+from services.ai_config_service import ai_config_service
 
 router = APIRouter(prefix="/ai-config", tags=["ai-configuration"])
 
@@ -38,6 +39,7 @@ async def create_ai_configuration(
     config_dict["company_id"] = current_user.company_id
 
     config = await db.create_record(AIConfiguration, **config_dict)
+    ai_config_service.invalidate(current_user.company_id, config_data.chat_id)
 
     return AIConfigurationResponse.from_orm(config)
 
@@ -91,6 +93,7 @@ async def update_global_ai_configuration(
         update_data = {k: v for k, v in config_data.dict().items() if v is not None}
         await db.update_record(AIConfiguration, config.id, **update_data)
         config = await db.get_record_by_id(AIConfiguration, config.id)
+    ai_config_service.invalidate(current_user.company_id)
 
     return AIConfigurationResponse.from_orm(config)
 
@@ -118,6 +121,7 @@ async def update_chat_ai_configuration(
         update_data = {k: v for k, v in config_data.dict().items() if v is not None}
         await db.update_record(AIConfiguration, config.id, **update_data)
         config = await db.get_record_by_id(AIConfiguration, config.id)
+    ai_config_service.invalidate(current_user.company_id, chat_id)
 
     return AIConfigurationResponse.from_orm(config)
 
@@ -130,6 +134,7 @@ async def delete_global_ai_configuration(
     await db.delete_records(
         AIConfiguration, company_id=current_user.company_id, chat_id=None
     )
+    ai_config_service.invalidate(current_user.company_id)
 
 
 @router.delete("/chat/{chat_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -140,3 +145,4 @@ async def delete_chat_ai_configuration(
     await db.delete_records(
         AIConfiguration, company_id=current_user.company_id, chat_id=chat_id
     )
+    ai_config_service.invalidate(current_user.company_id, chat_id)
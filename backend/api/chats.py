@@ -1,11 +1,21 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import StreamingResponse
 from uuid import UUID
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional
 
+from common.pagination import Cursor, InvalidCursor
 from schemas.chat import ChatCreate, ChatResponse, ChatUpdate, ChatListResponse, ChatWithMessagesResponse
 from schemas.message import MessageListResponse, MessageResponse
 from services.chat_service import chat_service
 from services.message_service import message_service
+from services.export_service import FORMATS as EXPORT_FORMATS, export_service
+from services.ai_config_service import ai_config_service
+from services.conversation_cache import conversation_cache
+from services.chat_summary_service import chat_summary_service
+from services.message_index_service import message_index_service
+from services.semantic_cache_service import semantic_cache_service
+from services.speculative_draft_service import speculative_draft_service
 from api.dependencies import get_current_user, verify_user_chat_access
 from models import User
 
@@ -29,21 +39,97 @@ async def create_chat(
     return ChatResponse.from_orm(chat)
 
 
+def _parse_cursor(cursor: Optional[str]) -> Optional[Cursor]:
+    if cursor is None:
+        return None
+    try:
+        return Cursor.decode(cursor)
+    except InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
 @router.get("/", response_model=ChatListResponse)
 async def get_user_chats(
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None),
     page_size: int = Query(20, ge=1, le=100),
+    include_total: bool = Query(False),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all chats for current user"""
-    result = await chat_service.get_chats_by_user(current_user.id, page, page_size)
+    """Get chats of the current user, newest first.
+
+    Pass `next_cursor` or `prev_cursor` from a response as `cursor` to get
+    the adjacent page.
+    """
+    result = await chat_service.get_chats_by_user(
+        current_user.id, _parse_cursor(cursor), page_size, include_total
+    )
     
     return ChatListResponse(
         chats=[ChatResponse.from_orm(chat) for chat in result["records"]],
-        total_count=result["total_count"],
-        page=result["page"],
         page_size=result["page_size"],
-        total_pages=result["total_pages"]
+        next_cursor=result["next_cursor"],
+        prev_cursor=result["prev_cursor"],
+        total_count=result["total_count"],
+        approximate=result["approximate"]
+    )
+
+
+def _export_response(
+    format: str,
+    compress: bool,
+    filename: str,
+    **scope
+) -> StreamingResponse:
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown format, expected one of: {', '.join(EXPORT_FORMATS)}"
+        )
+
+    filename = f"{filename}.{format}"
+    media_type = EXPORT_FORMATS[format]
+    if compress:
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        export_service.export(format, compress=compress, **scope),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/export")
+async def export_chats(
+    format: str = Query("ndjson"),
+    chat_id: Optional[List[UUID]] = Query(None),
+    company_id: Optional[UUID] = Query(None),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    compress: bool = Query(False),
+    current_user: User = Depends(get_current_user)
+):
+    """Export messages of the current user's chats as NDJSON or CSV.
+
+    Limit to specific chats with repeated `chat_id`, and to a date range
+    with `start`/`end`. Superusers may export every chat of a company with
+    `company_id`. `compress` gzips the stream.
+    """
+    if company_id is not None:
+        if not current_user.is_superuser:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Superuser access required"
+            )
+        scope = {"company_id": company_id}
+    else:
+        # Chats of other users are filtered out by the owner condition
+        scope = {"user_id": current_user.id}
+
+    return _export_response(
+        format, compress, "chats-export", chat_ids=chat_id, start=start, end=end, **scope
     )
 
 
@@ -113,21 +199,52 @@ async def delete_chat(
             detail="Chat not found"
         )
 
+    # Chat-specific AI configuration, messages, summary and drafts go with the chat
+    ai_config_service.invalidate(current_user.company_id, chat_id)
+    conversation_cache.invalidate(chat_id)
+    chat_summary_service.forget(chat_id)
+    speculative_draft_service.forget(chat_id)
+    semantic_cache_service.forget_chat(chat_id)
+    message_index_service.forget(chat_id)
+
 
 @router.get("/{chat_id}/messages", response_model=MessageListResponse)
 async def get_chat_messages(
     chat_id: UUID,
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None),
     page_size: int = Query(50, ge=1, le=100),
+    include_total: bool = Query(False),
     current_user: User = Depends(verify_user_chat_access)
 ):
-    """Get all messages for a chat"""
-    result = await message_service.get_messages_by_chat(chat_id, page, page_size)
+    """Get messages of a chat, oldest first.
+
+    Pass `next_cursor` or `prev_cursor` from a response as `cursor` to get
+    the adjacent page.
+    """
+    result = await message_service.get_messages_by_chat(
+        chat_id, _parse_cursor(cursor), page_size, include_total
+    )
     
     return MessageListResponse(
         messages=[MessageResponse.from_orm(msg) for msg in result["records"]],
-        total_count=result["total_count"],
-        page=result["page"],
         page_size=result["page_size"],
-        total_pages=result["total_pages"]
-    )
\ No newline at end of file
+        next_cursor=result["next_cursor"],
+        prev_cursor=result["prev_cursor"],
+        total_count=result["total_count"],
+        approximate=result["approximate"]
+    )
+
+
+@router.get("/{chat_id}/export")
+async def export_chat(
+    chat_id: UUID,
+    format: str = Query("ndjson"),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    compress: bool = Query(False),
+    current_user: User = Depends(verify_user_chat_access)
+):
+    """Export messages of a chat as NDJSON or CSV (optionally gzipped)"""
+    return _export_response(
+        format, compress, f"chat-{chat_id}", chat_ids=[chat_id], start=start, end=end
+    )
@@ -0,0 +1,131 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from uuid import UUID
+
+from schemas.job import JobResponse
+from schemas.message import (
+    AIMessageGenerationRequest, AIMessageRevisionRequest, MessageResponse
+)
+from services.job_queue import Job, JobKind, JobStatus, job_queue
+from services.message_service import message_service
+from api.dependencies import get_current_user
+from models import User
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+async def _job_response(job: Job) -> JobResponse:
+    """Build job response, embedding the resulting message once completed"""
+    message = None
+    if job.status == JobStatus.COMPLETED and job.result and job.result.get("message_id"):
+        message = await message_service.get_message_by_id(UUID(job.result["message_id"]))
+
+    return JobResponse(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        result=job.result,
+        error=job.error,
+        message=MessageResponse.from_orm(message) if message else None,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
+
+async def _get_user_job(job_id: UUID, user: User) -> Job:
+    job = await job_queue.get(str(job_id))
+    if not job or job.user_id != str(user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+
+@router.post("/generate", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_generation_job(
+    request: AIMessageGenerationRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Queue AI response generation for a chat"""
+    # Verify user has access to the chat
+    from services.chat_service import chat_service
+    has_access = await chat_service.check_user_chat_access(current_user.id, request.chat_id)
+    if not has_access:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied to this chat"
+        )
+    
+    job = await job_queue.submit(
+        JobKind.GENERATE,
+        {
+            "chat_id": str(request.chat_id),
+            "context_messages_count": request.context_messages_count or 10,
+            "fresh": request.fresh,
+            "fast": request.fast
+        },
+        current_user.id
+    )
+    return await _job_response(job)
+
+
+@router.post("/revise", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_revision_job(
+    request: AIMessageRevisionRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Queue AI revision of a message"""
+    # Verify user has access to the chat containing the message
+    from services.chat_service import chat_service
+    message = await message_service.get_message_by_id(request.message_id)
+    if not message:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Message not found"
+        )
+    
+    has_access = await chat_service.check_user_chat_access(current_user.id, message.chat_id)
+    if not has_access:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied to this message"
+        )
+    
+    job = await job_queue.submit(
+        JobKind.REVISE,
+        {
+            "message_id": str(request.message_id),
+            "revision_instructions": request.revision_instructions,
+            "fresh": request.fresh,
+            "fast": request.fast
+        },
+        current_user.id
+    )
+    return await _job_response(job)
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: UUID,
+    current_user: User = Depends(get_current_user)
+):
+    """Get job status (poll until completed or failed)"""
+    job = await _get_user_job(job_id, current_user)
+    return await _job_response(job)
+
+
+@router.get("/{job_id}/wait", response_model=JobResponse)
+async def wait_for_job(
+    job_id: UUID,
+    timeout: float = Query(25, gt=0, le=60),
+    current_user: User = Depends(get_current_user)
+):
+    """Long-poll a job: returns as soon as it finishes, or its status after `timeout` seconds"""
+    await _get_user_job(job_id, current_user)
+    job = await job_queue.wait(str(job_id), timeout)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return await _job_response(job)
@@ -1,18 +1,34 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.datastructures import UploadFile
 from uuid import UUID
+from typing import Awaitable, Callable, Optional, Tuple
+import json
+import tempfile
 
 from schemas.message import (
     MessageCreate, MessageResponse, MessageUpdate, 
     AIMessageGenerationRequest, AIMessageRevisionRequest,
-    MessageImportRequest
+    MessageImportRequest, MessageImportResponse, AIBatchGenerationRequest, AIBatchGenerationResult,
+    AICandidatesGenerationRequest, AICandidatesResponse
 )
+from common.settings import settings
+from services.import_formats import FORMATS, ImportFormatError, parse_upload
+from services.job_queue import JobKind, job_queue
 from services.message_service import message_service
+from services.stream_draft_service import stream_draft_service
 from api.dependencies import get_current_user, verify_user_chat_access, verify_user_message_access
 from models import User
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
 
+def _sse_event(event: str, data) -> str:
+    """Format a single Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @router.post("/", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
 async def create_message(
     message_data: MessageCreate,
@@ -63,7 +79,7 @@ async def update_message(
     current_user: User = Depends(verify_user_message_access)
 ):
     """Update message"""
-    message = await message_service.update_message(message_id, message_data)
+    message = await message_service.update_message(message_id, message_data, approve=True)
     
     if not message:
         raise HTTPException(
@@ -106,7 +122,9 @@ async def generate_ai_response(
     
     message = await message_service.generate_ai_response(
         request.chat_id, 
-        request.context_messages_count or 10
+        request.context_messages_count or 10,
+        request.fresh,
+        request.fast
     )
     
     if not message:
@@ -118,6 +136,171 @@ async def generate_ai_response(
     return MessageResponse.from_orm(message)
 
 
+@router.post("/generate-ai-response/stream")
+async def stream_ai_response(
+    request: AIMessageGenerationRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream AI response for a chat as Server-Sent Events.
+
+    Emits a `draft` event with the draft ID, `token` events with content
+    deltas, then a final `message` event with the persisted message, or an
+    `error` event if generation fails. Generation continues if the
+    connection drops; resume it with GET /generate-ai-response/stream/{draft_id}
+    or stop it with DELETE on the same path. While a generation for the chat
+    is running, this joins it instead of starting another.
+    """
+    # Verify user has access to the chat
+    from services.chat_service import chat_service
+    has_access = await chat_service.check_user_chat_access(current_user.id, request.chat_id)
+    if not has_access:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied to this chat"
+        )
+
+    draft = await stream_draft_service.start(
+        request.chat_id,
+        request.context_messages_count or 10,
+        request.fresh,
+        request.fast
+    )
+    return _draft_event_stream(draft.id)
+
+
+@router.get("/generate-ai-response/stream/{draft_id}")
+async def resume_ai_response_stream(
+    draft_id: UUID,
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user)
+):
+    """Resume a streamed AI response after a dropped connection.
+
+    Replays the draft content from `offset` characters (what the client
+    already has), then follows the live generation with the same events as
+    the original stream; a finished draft sends its `message` at once.
+    """
+    draft = await _get_accessible_draft(draft_id, current_user)
+    return _draft_event_stream(draft.id, offset)
+
+
+@router.delete("/generate-ai-response/stream/{draft_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_ai_response_stream(
+    draft_id: UUID,
+    current_user: User = Depends(get_current_user)
+):
+    """Stop a streamed AI response; nothing is saved and the LLM call ends"""
+    await _get_accessible_draft(draft_id, current_user)
+    await stream_draft_service.cancel(draft_id)
+
+
+async def _get_accessible_draft(draft_id: UUID, current_user: User):
+    draft = await stream_draft_service.get_draft(draft_id)
+    if not draft:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Draft not found"
+        )
+
+    from services.chat_service import chat_service
+    has_access = await chat_service.check_user_chat_access(current_user.id, draft.chat_id)
+    if not has_access:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied to this chat"
+        )
+    return draft
+
+
+def _draft_event_stream(draft_id: UUID, offset: int = 0) -> StreamingResponse:
+    async def event_stream():
+        yield _sse_event("draft", {"id": str(draft_id)})
+        async for event, payload in stream_draft_service.follow(draft_id, offset):
+            if event == "token":
+                yield _sse_event("token", {"content": payload})
+            elif event == "message":
+                message = MessageResponse.from_orm(payload)
+                yield _sse_event("message", json.loads(message.json()))
+            else:
+                yield _sse_event("error", {"detail": payload})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/generate-ai-candidates", response_model=AICandidatesResponse)
+async def generate_ai_candidates(
+    request: AICandidatesGenerationRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Generate several AI draft candidates for a chat in one LLM call.
+
+    The first candidate is saved as the AI message; to pick another one,
+    update that message with the chosen candidate's content.
+    """
+    # Verify user has access to the chat
+    from services.chat_service import chat_service
+    has_access = await chat_service.check_user_chat_access(current_user.id, request.chat_id)
+    if not has_access:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied to this chat"
+        )
+    
+    result = await message_service.generate_ai_candidates(
+        request.chat_id,
+        request.context_messages_count or 10,
+        request.candidates_count,
+        request.fresh,
+        request.fast
+    )
+    
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to generate AI response"
+        )
+    
+    message, candidates = result
+    return AICandidatesResponse(
+        message=MessageResponse.from_orm(message),
+        candidates=candidates
+    )
+
+
+@router.post("/generate-ai-response/batch")
+async def generate_ai_responses_batch(
+    request: AIBatchGenerationRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Generate AI responses for many chats at once.
+
+    Streams one NDJSON result line per chat as soon as its draft is saved.
+    Chats the user cannot access are reported as failed.
+    """
+    async def result_stream():
+        async for result in message_service.generate_ai_responses_batch(
+            current_user.id,
+            request.chat_ids,
+            request.context_messages_count or 10,
+            request.fresh,
+            request.fast
+        ):
+            message = result.get("message")
+            line = AIBatchGenerationResult(
+                chat_id=result["chat_id"],
+                status=result["status"],
+                message=MessageResponse.from_orm(message) if message else None,
+                detail=result.get("detail")
+            )
+            yield line.json() + "\n"
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+
 @router.post("/revise-with-ai", response_model=MessageResponse)
 async def revise_message_with_ai(
     request: AIMessageRevisionRequest,
@@ -126,7 +309,9 @@ async def revise_message_with_ai(
     """Revise message using AI with specific instructions"""
     message = await message_service.revise_message_with_ai(
         request.message_id,
-        request.revision_instructions
+        request.revision_instructions,
+        request.fresh,
+        request.fast
     )
     
     if not message:
@@ -138,12 +323,16 @@ async def revise_message_with_ai(
     return MessageResponse.from_orm(message)
 
 
-@router.post("/import", response_model=list[MessageResponse])
+@router.post("/import", response_model=MessageImportResponse)
 async def import_messages(
     request: MessageImportRequest,
     current_user: User = Depends(get_current_user)
 ):
-    """Import multiple messages to a chat"""
+    """Import a message history to a chat.
+
+    Rows keep their order and `created_at`; invalid rows are listed in
+    `rejected` by index (with `strict`, nothing is imported if any is).
+    """
     # Verify user has access to the chat
     from services.chat_service import chat_service
     has_access = await chat_service.check_user_chat_access(current_user.id, request.chat_id)
@@ -153,6 +342,127 @@ async def import_messages(
             detail="Access denied to this chat"
         )
     
-    messages = await message_service.import_messages(request.chat_id, request.messages)
+    result = await message_service.import_messages(
+        request.chat_id, request.messages, request.strict
+    )
     
-    return [MessageResponse.from_orm(msg) for msg in messages]
\ No newline at end of file
+    return MessageImportResponse(
+        chat_id=request.chat_id,
+        imported_count=len(result["messages"]),
+        rejected=result["rejected"]
+    )
+
+
+@router.post("/import/stream")
+async def ingest_messages(
+    request: Request,
+    chat_id: UUID = Query(...),
+    format: str = Query("ndjson"),
+    manager_name: Optional[str] = Query(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Import a large conversation archive from a streamed upload.
+
+    The body is raw NDJSON/CSV or a multipart form with a `file` field.
+    Formats: `ndjson` (MessageImportItem per line), `csv` (CRM exports with
+    a header row) and `instagram` (a message_N.json thread file; messages
+    from `manager_name` become manager messages). The upload is received
+    in full (spooled to disk) first, then ingested while progress is
+    streamed back as NDJSON lines; it can also be polled at GET /jobs/{job_id}.
+    """
+    from services.chat_service import chat_service
+    has_access = await chat_service.check_user_chat_access(current_user.id, chat_id)
+    if not has_access:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied to this chat"
+        )
+    if format not in FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown format, expected one of: {', '.join(FORMATS)}"
+        )
+    if format == "instagram" and not manager_name:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="manager_name is required for Instagram exports"
+        )
+
+    # StreamingResponse reads the request channel to detect disconnects,
+    # which would drop body chunks not yet read, so receive them all first
+    upload, close_upload = await _spool_upload(request)
+    try:
+        job = await job_queue.track(
+            JobKind.IMPORT, {"chat_id": str(chat_id), "format": format}, current_user.id
+        )
+    except BaseException:
+        await close_upload()
+        raise
+
+    async def progress_stream():
+        yield json.dumps({"job_id": job.id}) + "\n"
+        result = None
+        finished = False
+        try:
+            rows = parse_upload(format, _upload_chunks(upload), manager_name)
+            async for progress in message_service.ingest_messages(chat_id, rows):
+                result = {
+                    **progress,
+                    "rejects": [reject.dict() for reject in progress["rejects"]],
+                }
+                if not progress["done"]:
+                    await job_queue.report(job, result)
+                yield json.dumps(result) + "\n"
+            await job_queue.finish(job, result)
+            finished = True
+        except Exception as e:
+            print(f"Error ingesting messages: {e}")
+            detail = str(e) if isinstance(e, ImportFormatError) else "Failed to import messages"
+            await job_queue.finish(job, result, error=detail)
+            finished = True
+            yield json.dumps({"error": detail}) + "\n"
+        finally:
+            if not finished:
+                await job_queue.finish(job, result, error="Import interrupted")
+
+    return StreamingResponse(
+        progress_stream(),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(close_upload)
+    )
+
+
+async def _spool_upload(
+    request: Request
+) -> Tuple[UploadFile, Callable[[], Awaitable[None]]]:
+    """Receive the whole upload; returns it with the coroutine that releases it"""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if not isinstance(upload, UploadFile):
+            await form.close()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Multipart upload needs a file field"
+            )
+        return upload, form.close
+
+    upload = UploadFile(
+        tempfile.SpooledTemporaryFile(max_size=settings.imports.SPOOL_MEMORY_BYTES)
+    )
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await upload.write(chunk)
+        await upload.seek(0)
+    except BaseException:
+        await upload.close()
+        raise
+    return upload, upload.close
+
+
+async def _upload_chunks(upload: UploadFile):
+    """Bytes of a spooled upload, IMPORT_READ_CHUNK_BYTES at a time"""
+    while chunk := await upload.read(settings.imports.READ_CHUNK_BYTES):
+        yield chunk
@@ -0,0 +1,61 @@
+from fastapi import APIRouter, HTTPException, status, Depends
+
+from api.dependencies import get_current_user
+from models import User
+from services.ai_service import ai_service
+from services.count_service import count_service
+from services.llm_scheduler import llm_scheduler
+from services.response_cache import response_cache
+from services.semantic_cache_service import semantic_cache_service
+from services.speculative_draft_service import speculative_draft_service
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+async def require_superuser(current_user: User = Depends(get_current_user)) -> User:
+    """Metrics span all tenants, so only superusers may read them"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Superuser access required"
+        )
+    return current_user
+
+
+@router.get("/llm-scheduler")
+async def get_llm_scheduler_metrics(current_user: User = Depends(require_superuser)):
+    """Get LLM call queue depth and wait-time metrics"""
+    return llm_scheduler.metrics()
+
+
+@router.get("/llm-client")
+async def get_llm_client_metrics(current_user: User = Depends(require_superuser)):
+    """Get model routing counts and per-model circuit state, latency and retry/hedging counters"""
+    return {
+        "routing": ai_service.router.metrics(),
+        "embeddings": ai_service.embedding_client.metrics(),
+    }
+
+
+@router.get("/speculative-drafts")
+async def get_speculative_draft_metrics(current_user: User = Depends(require_superuser)):
+    """Get pre-generated draft hit/miss counters"""
+    return speculative_draft_service.metrics()
+
+
+@router.get("/response-cache")
+async def get_response_cache_metrics(current_user: User = Depends(require_superuser)):
+    """Get exact-match LLM response cache hit/miss counters"""
+    return response_cache.metrics()
+
+
+@router.get("/semantic-cache")
+async def get_semantic_cache_metrics(current_user: User = Depends(require_superuser)):
+    """Get semantic response cache size and hit/miss counters"""
+    return semantic_cache_service.metrics()
+
+
+@router.get("/counts")
+async def get_count_metrics(current_user: User = Depends(require_superuser)):
+    """Get listing total counters by strategy (exact, cached, estimated)"""
+    return count_service.metrics()
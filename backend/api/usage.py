@@ -0,0 +1,86 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from datetime import date
+from uuid import UUID
+from typing import Optional
+
+from schemas.usage import UsageDay, UsageResponse, UsageTotals
+from services.usage_service import usage_service
+from api.dependencies import get_current_user
+from models import User
+
+router = APIRouter(prefix="/usage", tags=["usage"])
+
+
+def _avg_latency(latency_ms: int, requests: int, cache_hits: int, errors: int) -> Optional[float]:
+    """Average latency of successful provider calls (cache hits never reach it)"""
+    answered = requests - cache_hits - errors
+    return latency_ms / answered if answered > 0 else None
+
+
+def _ratio(cached_tokens: int, prompt_tokens: int) -> Optional[float]:
+    """Share of prompt tokens the provider served from its prefix cache"""
+    return cached_tokens / prompt_tokens if prompt_tokens else None
+
+
+@router.get("/", response_model=UsageResponse)
+async def get_usage(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    company_id: Optional[UUID] = Query(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Get daily LLM token usage of the current user's company.
+
+    Superusers may pass `company_id` to inspect any company.
+    """
+    if company_id and company_id != current_user.company_id and not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied to this company"
+        )
+    company_id = company_id or current_user.company_id
+
+    rows = await usage_service.get_usage(company_id, start, end)
+    days = [
+        UsageDay(
+            day=row.day,
+            model=row.model,
+            requests=row.requests,
+            cache_hits=row.cache_hits,
+            errors=row.errors,
+            prompt_tokens=row.prompt_tokens,
+            cached_tokens=row.cached_tokens,
+            cached_token_ratio=_ratio(row.cached_tokens, row.prompt_tokens),
+            completion_tokens=row.completion_tokens,
+            avg_latency_ms=_avg_latency(
+                row.latency_ms, row.requests, row.cache_hits, row.errors
+            )
+        )
+        for row in rows
+    ]
+
+    requests = sum(row.requests for row in rows)
+    cache_hits = sum(row.cache_hits for row in rows)
+    errors = sum(row.errors for row in rows)
+    prompt_tokens = sum(row.prompt_tokens for row in rows)
+    cached_tokens = sum(row.cached_tokens for row in rows)
+    totals = UsageTotals(
+        requests=requests,
+        cache_hits=cache_hits,
+        errors=errors,
+        prompt_tokens=prompt_tokens,
+        cached_tokens=cached_tokens,
+        cached_token_ratio=_ratio(cached_tokens, prompt_tokens),
+        completion_tokens=sum(row.completion_tokens for row in rows),
+        avg_latency_ms=_avg_latency(
+            sum(row.latency_ms for row in rows), requests, cache_hits, errors
+        )
+    )
+
+    return UsageResponse(
+        company_id=company_id,
+        start=start,
+        end=end,
+        days=days,
+        totals=totals
+    )
@@ -1,11 +1,38 @@
+import json
+
+import asyncpg
 from tortoise import Tortoise, connections
+from tortoise.expressions import Q
 from tortoise.transactions import in_transaction
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, AsyncIterator, List, Sequence, Union
 from uuid import UUID
 
+from .pagination import Cursor
 from .settings import settings
 
 
+# Idempotent changes to tables that already exist; generate_schemas only
+# creates missing tables
+SCHEMA_UPDATES = [
+    "ALTER TABLE ai_configurations ADD COLUMN IF NOT EXISTS speculative_drafts BOOLEAN",
+    "ALTER TABLE ai_configurations ADD COLUMN IF NOT EXISTS semantic_cache BOOLEAN",
+    "ALTER TABLE ai_configurations ADD COLUMN IF NOT EXISTS retrieval BOOLEAN",
+    "ALTER TABLE company_usage ADD COLUMN IF NOT EXISTS cached_tokens BIGINT NOT NULL DEFAULT 0",
+    "ALTER TABLE chat_summaries ADD COLUMN IF NOT EXISTS summarized_until_id UUID",
+    # Keyset pagination scans these in (created_at, id) order
+    "CREATE INDEX IF NOT EXISTS idx_messages_chat_created_id ON messages (chat_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_chats_user_created_id ON chats (user_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_chats_company_created_id ON chats (company_id, created_at, id)",
+]
+
+# A field name, or several for tie-breaking ("-" prefix for descending)
+OrderBy = Union[str, Sequence[str]]
+
+
+def _order_fields(order_by: OrderBy) -> Sequence[str]:
+    return (order_by,) if isinstance(order_by, str) else order_by
+
+
 class DatabaseFacade:
     _instance = None
     
@@ -21,6 +48,13 @@ class DatabaseFacade:
             modules={"models": ["models"]},
         )
         await Tortoise.generate_schemas()
+        await self.apply_schema_updates()
+    
+    async def apply_schema_updates(self):
+        """Bring existing tables up to date with the models"""
+        connection = connections.get("default")
+        for statement in SCHEMA_UPDATES:
+            await connection.execute_script(statement)
     
     async def close_db(self):
         """Close database connections"""
@@ -30,6 +64,25 @@ class DatabaseFacade:
         """Create a new record in the database"""
         return await model_class.create(**data)
     
+    async def create_records(self, model_class, records: List[Dict[str, Any]]) -> List[Any]:
+        """Create multiple records with a single multi-row insert"""
+        instances = [model_class(**data) for data in records]
+        if instances:
+            await model_class.bulk_create(instances)
+        return instances
+    
+    async def bulk_insert(
+        self, model_class, records: List[Dict[str, Any]], chunk_size: int = 1000
+    ) -> List[Any]:
+        """Insert many records in chunked multi-row inserts within one transaction"""
+        instances = [model_class(**data) for data in records]
+        async with in_transaction() as connection:
+            for start in range(0, len(instances), chunk_size):
+                await model_class.bulk_create(
+                    instances[start:start + chunk_size], using_db=connection
+                )
+        return instances
+    
     async def get_record_by_id(self, model_class, record_id: UUID) -> Optional[Any]:
         """Get a record by its ID"""
         return await model_class.get_or_none(id=record_id)
@@ -38,13 +91,139 @@ class DatabaseFacade:
         """Get a single record by field filters"""
         return await model_class.get_or_none(**filters)
     
-    async def get_records(self, model_class, **filters) -> List[Any]:
-        """Get multiple records with optional filters"""
+    async def get_records(self, model_class, *q_filters, **filters) -> List[Any]:
+        """Get multiple records with optional filters (Q objects or field lookups)"""
+        queryset = model_class.all()
+        if q_filters or filters:
+            queryset = queryset.filter(*q_filters, **filters)
+        return await queryset
+    
+    async def get_latest_records(
+        self, model_class, limit: int, order_by: OrderBy = "-created_at", **filters
+    ) -> List[Any]:
+        """Get the newest records, ordered and limited at the database level"""
         queryset = model_class.all()
         if filters:
             queryset = queryset.filter(**filters)
+        return await queryset.order_by(*_order_fields(order_by)).limit(limit)
+    
+    async def get_records_ordered(
+        self,
+        model_class,
+        order_by: OrderBy,
+        limit: Optional[int] = None,
+        *q_filters,
+        **filters
+    ) -> List[Any]:
+        """Get records in a given order, optionally limited at the database level"""
+        queryset = model_class.filter(*q_filters, **filters).order_by(*_order_fields(order_by))
+        if limit is not None:
+            queryset = queryset.limit(limit)
         return await queryset
     
+    async def get_latest_rows_per_group(
+        self,
+        model_class,
+        group_field: str,
+        group_values: List[Any],
+        limit: int,
+        order_field: str = "created_at",
+    ) -> List[Dict[str, Any]]:
+        """Get the newest `limit` rows for each group value in a single query"""
+        table = model_class._meta.db_table
+        query = (
+            f'SELECT * FROM ('
+            f'SELECT t.*, ROW_NUMBER() OVER ('
+            f'PARTITION BY t."{group_field}" ORDER BY t."{order_field}" DESC'
+            f') AS _row_number FROM "{table}" t WHERE t."{group_field}" = ANY($1)'
+            f') ranked WHERE _row_number <= $2'
+        )
+        connection = connections.get("default")
+        return await connection.execute_query_dict(query, [list(group_values), limit])
+    
+    async def fetch_rows(self, query: str, params: List[Any]) -> List[Dict[str, Any]]:
+        """Run a raw SELECT ($n placeholders) and return its rows as dicts"""
+        connection = connections.get("default")
+        return await connection.execute_query_dict(query, params)
+    
+    async def stream_query(
+        self,
+        query: str,
+        params: List[Any],
+        prefetch: int = 500,
+        statement_timeout: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield rows of a query through a server-side cursor.
+
+        Rows are fetched `prefetch` at a time, so memory stays constant
+        however many rows match. The cursor's read transaction lives on a
+        dedicated connection, outside the ORM pool, until the iteration ends.
+        The server aborts a fetch running longer than `statement_timeout` and
+        the transaction once it waits longer than `idle_timeout` (seconds)
+        for the consumer to ask for more rows.
+        """
+        server_settings = {}
+        if statement_timeout:
+            server_settings["statement_timeout"] = str(int(statement_timeout * 1000))
+        if idle_timeout:
+            server_settings["idle_in_transaction_session_timeout"] = str(int(idle_timeout * 1000))
+
+        connection = await asyncpg.connect(
+            settings.db.database_url, server_settings=server_settings
+        )
+        try:
+            async with connection.transaction():
+                async for record in connection.cursor(query, *params, prefetch=prefetch):
+                    yield dict(record)
+        finally:
+            await connection.close()
+    
+    async def increment_counters(
+        self,
+        model_class,
+        key_fields: List[str],
+        counter_fields: List[str],
+        rows: List[Dict[str, Any]],
+    ) -> None:
+        """Add counter values to rows identified by `key_fields` in one upsert.
+
+        Rows that don't exist yet are inserted; `key_fields` must be covered
+        by a unique constraint and each row needs an "id" for the insert.
+        """
+        if not rows:
+            return
+        table = model_class._meta.db_table
+        columns = ["id", *key_fields, *counter_fields]
+        touch = "updated_at" in model_class._meta.fields_map
+
+        values = []
+        params: List[Any] = []
+        for row in rows:
+            placeholders = []
+            for column in columns:
+                params.append(row[column])
+                placeholders.append(f"${len(params)}")
+            if touch:
+                placeholders.append("NOW()")
+            values.append(f"({', '.join(placeholders)})")
+
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        conflict_list = ", ".join(f'"{field}"' for field in key_fields)
+        updates = [
+            f'"{field}" = "{table}"."{field}" + EXCLUDED."{field}"' for field in counter_fields
+        ]
+        if touch:
+            column_list += ', "updated_at"'
+            updates.append('"updated_at" = EXCLUDED."updated_at"')
+
+        query = (
+            f'INSERT INTO "{table}" ({column_list}) VALUES {", ".join(values)} '
+            f'ON CONFLICT ({conflict_list}) DO UPDATE SET {", ".join(updates)}'
+        )
+        connection = connections.get("default")
+        await connection.execute_query(query, params)
+    
     async def get_records_with_relations(self, model_class, relations: List[str], **filters) -> List[Any]:
         """Get records with prefetched relations"""
         queryset = model_class.all().prefetch_related(*relations)
@@ -57,6 +236,10 @@ class DatabaseFacade:
         updated_count = await model_class.filter(id=record_id).update(**data)
         return updated_count > 0
     
+    async def update_records(self, model_class, values: Dict[str, Any], **filters) -> int:
+        """Update all records matching filters, returns count of updated records"""
+        return await model_class.filter(**filters).update(**values)
+    
     async def update_record_instance(self, instance, **data) -> Any:
         """Update an existing model instance"""
         for key, value in data.items():
@@ -89,33 +272,89 @@ class DatabaseFacade:
                 results.append(result)
             return results
     
-    async def get_records_paginated(
-        self, 
-        model_class, 
-        page: int = 1, 
-        page_size: int = 20, 
-        order_by: Optional[str] = None,
+    async def count_records_capped(self, model_class, cap: int, **filters) -> int:
+        """Count matching records, stopping at `cap`.
+
+        Costs at most `cap` index reads however large the result set is.
+        """
+        capped = model_class.filter(**filters).limit(cap).values_list("id")
+        connection = connections.get("default")
+        rows = await connection.execute_query_dict(
+            f"SELECT COUNT(*) AS count FROM ({capped.sql()}) AS capped"
+        )
+        return rows[0]["count"]
+
+    async def estimate_records_count(self, model_class, **filters) -> int:
+        """Planner's row estimate for matching records (no rows are read)"""
+        queryset = model_class.filter(**filters)
+        connection = connections.get("default")
+        rows = await connection.execute_query_dict(
+            f"EXPLAIN (FORMAT JSON) {queryset.sql()}"
+        )
+        plan = rows[0]["QUERY PLAN"]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    async def get_records_keyset(
+        self,
+        model_class,
+        page_size: int = 20,
+        cursor: Optional[Cursor] = None,
+        descending: bool = False,
         **filters
     ) -> Dict[str, Any]:
-        """Get paginated records"""
-        offset = (page - 1) * page_size
-        
-        queryset = model_class.all()
-        if filters:
-            queryset = queryset.filter(**filters)
-        
-        if order_by:
-            queryset = queryset.order_by(order_by)
-        
-        total_count = await queryset.count()
-        records = await queryset.offset(offset).limit(page_size)
-        
+        """Get a page of records in (created_at, id) order after/before a cursor.
+
+        Unlike OFFSET pagination the cost of a page doesn't grow with its
+        position: the query seeks to the cursor through the
+        (filter, created_at, id) index and reads page_size + 1 rows.
+        """
+        # Reading backwards flips the scan direction and the comparison
+        reverse = cursor is not None and cursor.backward
+        scan_descending = descending != reverse
+
+        queryset = model_class.filter(**filters)
+        if cursor is not None:
+            # (created_at, id) beyond the cursor, written so the index range
+            # on created_at is still usable
+            if scan_descending:
+                queryset = queryset.filter(
+                    Q(created_at__lte=cursor.created_at),
+                    Q(created_at__lt=cursor.created_at) | Q(id__lt=cursor.id),
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__gte=cursor.created_at),
+                    Q(created_at__gt=cursor.created_at) | Q(id__gt=cursor.id),
+                )
+
+        order = ("-created_at", "-id") if scan_descending else ("created_at", "id")
+        records = list(await queryset.order_by(*order).limit(page_size + 1))
+        has_more = len(records) > page_size
+        records = records[:page_size]
+        if reverse:
+            records.reverse()
+
+        # Going backward, the page we came from is the next one; going
+        # forward, there is a previous page whenever we started from a cursor
+        if reverse:
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = cursor is not None, has_more
+
+        next_cursor = prev_cursor = None
+        if records:
+            if has_prev:
+                prev_cursor = Cursor.before(records[0]).encode()
+            if has_next:
+                next_cursor = Cursor.after(records[-1]).encode()
+
         return {
             "records": records,
-            "total_count": total_count,
-            "page": page,
             "page_size": page_size,
-            "total_pages": (total_count + page_size - 1) // page_size
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
         }
 
 
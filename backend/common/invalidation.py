@@ -0,0 +1,107 @@
+import asyncio
+import json
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from .redis import get_redis
+from .settings import settings
+
+CHANNEL = "cache:invalidations"
+
+InvalidationHandler = Callable[[Dict[str, Any]], None]
+
+
+class InvalidationBus:
+    """Broadcasts cache invalidations between processes over Redis pub/sub.
+
+    In-process caches (transcripts, AI configuration, summaries) are kept
+    up to date by the writes of their own process; API replicas and
+    worker.py each hold a copy. Every local invalidation is also published,
+    and the other processes apply it through the handler registered for its
+    kind. If the subscription drops, every cache is reset on reconnect since
+    messages sent in between are lost. With CACHE_INVALIDATION_BACKEND=memory
+    (a single process) nothing is published.
+    """
+
+    def __init__(self):
+        # Lets a process skip the messages it published itself
+        self._origin = uuid.uuid4().hex
+        self._handlers: Dict[str, InvalidationHandler] = {}
+        self._resets: List[Callable[[], None]] = []
+        self._listener: Optional[asyncio.Task] = None
+        self._tasks: set = set()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.cache.INVALIDATION_BACKEND == "redis"
+
+    def subscribe(
+        self, kind: str, handler: InvalidationHandler, reset: Callable[[], None]
+    ) -> None:
+        """Apply invalidations of `kind` from other processes; `reset` drops everything"""
+        self._handlers[kind] = handler
+        self._resets.append(reset)
+
+    def publish(self, kind: str, **data: Any) -> None:
+        """Send an invalidation to other processes in the background"""
+        if not self.enabled:
+            return
+        message = json.dumps({"origin": self._origin, "kind": kind, **data}, default=str)
+        task = asyncio.create_task(self._publish(message))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def start(self) -> None:
+        """Start applying invalidations published by other processes"""
+        if self.enabled and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """Flush pending publishes and stop listening"""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    async def _publish(self, message: str) -> None:
+        try:
+            await get_redis().publish(CHANNEL, message)
+        except Exception as e:
+            print(f"Error publishing cache invalidation: {e}")
+
+    async def _listen(self) -> None:
+        reconnecting = False
+        while True:
+            pubsub = get_redis().pubsub()
+            try:
+                await pubsub.subscribe(CHANNEL)
+                if reconnecting:
+                    for reset in self._resets:
+                        reset()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._apply(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Cache invalidation subscription failed: {e}")
+                reconnecting = True
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+    def _apply(self, raw: str) -> None:
+        try:
+            data = json.loads(raw)
+            if data.pop("origin") == self._origin:
+                return
+            handler = self._handlers.get(data.pop("kind"))
+            if handler is not None:
+                handler(data)
+        except Exception as e:
+            print(f"Error applying cache invalidation: {e}")
+
+
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,49 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID
+
+
+class InvalidCursor(ValueError):
+    """Cursor is malformed or was not issued by this API"""
+
+
+@dataclass(frozen=True)
+class Cursor:
+    """Position between two records of a (created_at, id) ordering.
+
+    `backward` cursors page towards the start of the listing (prev links).
+    """
+
+    created_at: datetime
+    id: UUID
+    backward: bool = False
+
+    @classmethod
+    def after(cls, record) -> "Cursor":
+        return cls(record.created_at, record.id)
+
+    @classmethod
+    def before(cls, record) -> "Cursor":
+        return cls(record.created_at, record.id, backward=True)
+
+    def encode(self) -> str:
+        payload = json.dumps(
+            {"t": self.created_at.isoformat(), "i": str(self.id), "b": self.backward},
+            separators=(",", ":"),
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "Cursor":
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return cls(
+                datetime.fromisoformat(payload["t"]),
+                UUID(payload["i"]),
+                bool(payload.get("b", False)),
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            raise InvalidCursor("Invalid pagination cursor") from e
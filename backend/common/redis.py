@@ -0,0 +1,23 @@
+from typing import Optional
+
+import redis.asyncio as redis
+
+from .settings import settings
+
+_client: Optional[redis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """Shared Redis client (created lazily, connections are pooled)"""
+    global _client
+    if _client is None:
+        _client = redis.from_url(settings.redis.URL, decode_responses=True)
+    return _client
+
+
+async def close_redis() -> None:
+    """Close the shared Redis client if it was created"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
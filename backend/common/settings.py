@@ -1,3 +1,5 @@
+from typing import Dict, Optional
+
 from pydantic_settings import BaseSettings
 
 
@@ -19,16 +21,226 @@ class PostgresSettings(BaseSettings):
 
 
 class LLMSettings(BaseSettings):
+    # Backend: "openai" (or any OpenAI-compatible server), "anthropic" or "fake"
+    PROVIDER: str = "openai"
+    BASE_URL: Optional[str] = None
     API_KEY: str
     MODEL: str
+    # Required by the Anthropic API, which has no default
+    MAX_TOKENS: int = 1024
+    EMBEDDING_PROVIDER: str = "openai"
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    # Upper bound for the whole prompt (system prompt + conversation history)
+    CONTEXT_TOKEN_BUDGET: int = 6000
+    # Outbound call scheduling: global cap and per-company fair-share weights
+    MAX_CONCURRENCY: int = 16
+    # Concurrent LLM calls a single batch generation job may have in flight
+    BATCH_CONCURRENCY: int = 8
+    # Resilience: overall deadline per call (including retries), retry policy,
+    # hedged requests and circuit breaker
+    CALL_DEADLINE_SECONDS: float = 45.0
+    # A stream that has opened is abandoned after this long without a token
+    STREAM_IDLE_SECONDS: float = 30.0
+    MAX_RETRIES: int = 2
+    RETRY_BASE_DELAY_SECONDS: float = 0.5
+    RETRY_MAX_DELAY_SECONDS: float = 8.0
+    HEDGE_ENABLED: bool = False
+    HEDGE_MIN_SAMPLES: int = 20
+    HEDGE_MIN_DELAY_SECONDS: float = 1.0
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RESET_SECONDS: float = 30.0
+    COMPANY_WEIGHTS: Dict[str, float] = {}
+    # Model routing: companies map to tiers and tiers to models; short or
+    # explicitly "fast" requests, and requests whose model is slower than the
+    # latency target, go to FAST_MODEL. FALLBACK_MODEL is tried when the
+    # routed model fails or takes longer than FALLBACK_AFTER_SECONDS.
+    COMPANY_TIERS: Dict[str, str] = {}
+    TIER_MODELS: Dict[str, str] = {}
+    FAST_MODEL: Optional[str] = None
+    FAST_MAX_PROMPT_TOKENS: int = 1500
+    LATENCY_TARGET_SECONDS: Optional[float] = None
+    # Latency samples older than this are ignored, so a model routed away
+    # from for being slow gets traffic (and fresh samples) again
+    LATENCY_WINDOW_SECONDS: float = 300.0
+    FALLBACK_MODEL: Optional[str] = None
+    FALLBACK_AFTER_SECONDS: float = 20.0
 
     class Config:
         env_prefix = "LLM_"
 
 
+class CacheSettings(BaseSettings):
+    # In-process caches broadcast invalidations to API replicas and worker.py:
+    # "redis", or "memory" for a single process (tests, local runs)
+    INVALIDATION_BACKEND: str = "redis"
+    # Safety net for writes that bypass the API (admin panel)
+    AI_CONFIG_TTL_SECONDS: int = 300
+    # Per-chat transcript tails used to build prompts without a message query
+    CONVERSATION_MAX_BYTES: int = 64 * 1024 * 1024
+    CONVERSATION_TAIL_MESSAGES: int = 200
+    CONVERSATION_TTL_SECONDS: int = 600
+    # Drafts pre-generated on client messages, valid until the conversation changes
+    SPECULATIVE_DRAFT_TTL_SECONDS: int = 900
+    SPECULATIVE_DRAFT_MAX_CHATS: int = 1000
+    SPECULATIVE_DRAFT_CONTEXT_MESSAGES: int = 10
+    # Exact-match LLM response cache ("memory" or "redis")
+    RESPONSE_ENABLED: bool = True
+    RESPONSE_BACKEND: str = "memory"
+    RESPONSE_TTL_SECONDS: int = 3600
+    RESPONSE_MAX_ENTRIES: int = 10000
+    # Semantic response cache (opt-in per company via AIConfiguration)
+    SEMANTIC_THRESHOLD: float = 0.92
+    SEMANTIC_MAX_ENTRIES: int = 5000
+    SEMANTIC_MAX_COMPANIES: int = 100
+    SEMANTIC_RELOAD_SECONDS: int = 600
+    # Listing totals: exact up to the threshold, estimated or cached beyond it
+    COUNT_EXACT_THRESHOLD: int = 1000
+    COUNT_TTL_SECONDS: int = 60
+    COUNT_MAX_ENTRIES: int = 10000
+
+    class Config:
+        env_prefix = "CACHE_"
+
+
+class SummarySettings(BaseSettings):
+    ENABLED: bool = True
+    # Newest messages always sent verbatim; older ones are folded into the summary
+    TAIL_MESSAGES: int = 20
+    # Fold only once this many messages have left the tail, at most MAX_BATCH per call
+    MIN_BATCH: int = 10
+    MAX_BATCH: int = 100
+    CACHE_SIZE: int = 10000
+
+    class Config:
+        env_prefix = "SUMMARY_"
+
+
+class FakeLLMSettings(BaseSettings):
+    """Behaviour of the offline fake provider (LLM_PROVIDER=fake)"""
+
+    # "lognormal" (median + sigma), "uniform" (min..max) or "constant" (median)
+    LATENCY_DISTRIBUTION: str = "lognormal"
+    LATENCY_MEDIAN_SECONDS: float = 0.8
+    LATENCY_SIGMA: float = 0.5
+    LATENCY_MIN_SECONDS: float = 0.2
+    LATENCY_MAX_SECONDS: float = 2.0
+    FIRST_TOKEN_SECONDS: float = 0.3
+    TOKEN_INTERVAL_SECONDS: float = 0.02
+    EMBEDDING_LATENCY_SECONDS: float = 0.05
+    # Share of calls failing with ERROR_STATUS, and of calls that never answer
+    ERROR_RATE: float = 0.0
+    ERROR_STATUS: int = 503
+    HANG_RATE: float = 0.0
+    RESPONSE_WORDS: int = 40
+    EMBEDDING_DIMENSIONS: int = 256
+    SEED: Optional[int] = None
+
+    class Config:
+        env_prefix = "FAKE_LLM_"
+
+
+class RetrievalSettings(BaseSettings):
+    ENABLED: bool = True
+    # Older messages most similar to the latest client message added to the prompt
+    TOP_K: int = 4
+    MIN_SCORE: float = 0.35
+    MAX_TOKENS: int = 800
+    # Chats whose embedding matrices are kept in memory
+    MAX_CHATS: int = 500
+    # Messages embedded per provider call
+    EMBED_BATCH: int = 100
+    # Unembedded messages (newest first) backfilled each time a chat index is loaded
+    BACKFILL_MESSAGES: int = 200
+
+    class Config:
+        env_prefix = "RETRIEVAL_"
+
+
+class UsageSettings(BaseSettings):
+    ENABLED: bool = True
+    # Buffered counters are written in one batched upsert per interval
+    FLUSH_SECONDS: float = 5.0
+    MAX_BUFFERED_ROWS: int = 1000
+
+    class Config:
+        env_prefix = "USAGE_"
+
+
+class StreamSettings(BaseSettings):
+    # Streamed content is written to the draft record at most once per interval
+    CHECKPOINT_SECONDS: float = 0.3
+    # A draft not checkpointed for this long, and not live here, was interrupted
+    STALE_SECONDS: float = 120.0
+    # Finished drafts are kept this long for late resumes
+    RETENTION_SECONDS: int = 86400
+
+    class Config:
+        env_prefix = "STREAM_"
+
+
+class ImportSettings(BaseSettings):
+    # Rows per multi-row INSERT (7 columns each, well under the bind parameter limit)
+    CHUNK_ROWS: int = 1000
+    # Streaming ingest: upload read size, longest accepted line, rejects listed
+    READ_CHUNK_BYTES: int = 64 * 1024
+    MAX_LINE_BYTES: int = 1024 * 1024
+    MAX_REPORTED_REJECTS: int = 100
+    # Raw uploads are received in full before ingesting; past this size they
+    # are spooled to disk (multipart files are spooled by the form parser)
+    SPOOL_MEMORY_BYTES: int = 1024 * 1024
+
+    class Config:
+        env_prefix = "IMPORT_"
+
+
+class ExportSettings(BaseSettings):
+    # Each running export holds its own database connection; more wait
+    MAX_CONCURRENT: int = 4
+    # Rows fetched per server-side cursor round trip
+    CURSOR_PREFETCH: int = 500
+    # Longest fetch, and longest wait for a slow client between fetches,
+    # before the database aborts the export
+    STATEMENT_TIMEOUT_SECONDS: float = 300.0
+    IDLE_TIMEOUT_SECONDS: float = 60.0
+    # Output is sent in blocks of about this size
+    FLUSH_BYTES: int = 64 * 1024
+
+    class Config:
+        env_prefix = "EXPORT_"
+
+
+class RedisSettings(BaseSettings):
+    URL: str = "redis://redis:6379/0"
+
+    class Config:
+        env_prefix = "REDIS_"
+
+
+class JobSettings(BaseSettings):
+    # "redis" for the shared queue, "memory" for a single process (tests, local runs)
+    BACKEND: str = "redis"
+    # Run workers inside the API process; disable when using a separate worker.py
+    RUN_WORKERS: bool = True
+    WORKERS: int = 4
+    RESULT_TTL_SECONDS: int = 3600
+
+    class Config:
+        env_prefix = "JOBS_"
+
+
 class Settings(BaseSettings):
     db: PostgresSettings = PostgresSettings()
     llm: LLMSettings = LLMSettings()
+    fake_llm: FakeLLMSettings = FakeLLMSettings()
+    cache: CacheSettings = CacheSettings()
+    summary: SummarySettings = SummarySettings()
+    retrieval: RetrievalSettings = RetrievalSettings()
+    usage: UsageSettings = UsageSettings()
+    stream: StreamSettings = StreamSettings()
+    imports: ImportSettings = ImportSettings()
+    export: ExportSettings = ExportSettings()
+    redis: RedisSettings = RedisSettings()
+    jobs: JobSettings = JobSettings()
 
     # JWT configuration
     secret_key: str
@@ -0,0 +1,36 @@
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+
+from .settings import settings
+
+# Framing overhead the chat completions format adds to every message
+MESSAGE_TOKEN_OVERHEAD = 4
+DEFAULT_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str) -> tiktoken.Encoding:
+    """Get tokenizer for a model, falling back to a generic encoding"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Non-OpenAI or unreleased model names: estimate with a common encoding
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count tokens in a text for the given (or configured) model"""
+    encoding = _get_encoding(model or settings.llm.MODEL)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(message: dict, model: Optional[str] = None) -> int:
+    """Count tokens of a single chat message including framing overhead"""
+    return count_tokens(message["content"], model) + MESSAGE_TOKEN_OVERHEAD
+
+
+def count_messages_tokens(messages: List[dict], model: Optional[str] = None) -> int:
+    """Count tokens of a list of chat messages"""
+    return sum(count_message_tokens(message, model) for message in messages)
@@ -0,0 +1,115 @@
+"""OpenAI-compatible stand-in server backed by the fake provider.
+
+Lets the backend (and its HTTP client path) be load-tested offline:
+
+    uvicorn fake_llm_server:app --port 9000
+    LLM_PROVIDER=openai LLM_BASE_URL=http://localhost:9000/v1
+
+Latency, streaming pace and error injection follow the FAKE_LLM_* settings.
+"""
+import json
+import time
+import uuid
+from typing import List, Optional, Union
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from services.llm_providers import FakeProvider, ProviderError
+
+app = FastAPI(title="Fake LLM provider")
+provider = FakeProvider()
+
+
+class ChatCompletionRequest(BaseModel):
+    model: str
+    messages: List[dict]
+    temperature: float = 1
+    n: int = 1
+    stream: bool = False
+
+
+class EmbeddingRequest(BaseModel):
+    model: str
+    input: Union[str, List[str]]
+
+
+def _error_response(error: ProviderError) -> JSONResponse:
+    return JSONResponse(
+        status_code=error.status_code or 500,
+        content={"error": {"message": str(error), "type": "fake_error"}},
+    )
+
+
+def _chunk(completion_id: str, model: str, content: Optional[str], finish: Optional[str]) -> str:
+    delta = {"content": content} if content is not None else {}
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: ChatCompletionRequest):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    try:
+        if request.stream:
+            deltas = await provider.open_stream(request.messages, request.model)
+        else:
+            completion = await provider.complete(request.messages, request.model, n=request.n)
+    except ProviderError as e:
+        return _error_response(e)
+
+    if request.stream:
+        async def event_stream():
+            async for delta in deltas:
+                yield _chunk(completion_id, request.model, delta, None)
+            yield _chunk(completion_id, request.model, None, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": completion.model,
+        "choices": [
+            {
+                "index": i,
+                "message": {"role": "assistant", "content": choice},
+                "finish_reason": "stop",
+            }
+            for i, choice in enumerate(completion.choices)
+        ],
+        "usage": {
+            "prompt_tokens": completion.prompt_tokens,
+            "completion_tokens": completion.completion_tokens,
+            "total_tokens": completion.prompt_tokens + completion.completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": completion.cached_tokens},
+        },
+    }
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: EmbeddingRequest):
+    inputs = [request.input] if isinstance(request.input, str) else request.input
+    try:
+        vectors = await provider.embed(inputs, request.model)
+    except ProviderError as e:
+        return _error_response(e)
+
+    return {
+        "object": "list",
+        "model": request.model,
+        "data": [
+            {"object": "embedding", "index": i, "embedding": vector}
+            for i, vector in enumerate(vectors)
+        ],
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
@@ -6,8 +6,9 @@ import uvicorn
 
 from common.settings import settings
 from common.database import db
-from api import auth, chats, messages, ai_config
+from api import auth, chats, messages, ai_config, metrics, jobs, usage
 from models import User, Company
+from services.llm_client import LLMError, LLMTimeoutError
 from fastapi import FastAPI
 
 from fastadmin import fastapi_app as admin_app
@@ -40,9 +41,39 @@ async def lifespan(app: FastAPI):
             is_active=True,
         )
 
+    # Apply cache invalidations published by other processes (worker.py, replicas)
+    from common.invalidation import invalidation_bus
+
+    await invalidation_bus.start()
+
+    # Run AI job workers in this process unless a separate worker.py handles them
+    from services.job_queue import job_queue
+
+    if settings.jobs.RUN_WORKERS:
+        await job_queue.start(settings.jobs.WORKERS)
+
     yield
 
     # Shutdown
+    from common.redis import close_redis
+    from services.chat_summary_service import chat_summary_service
+    from services.count_service import count_service
+    from services.message_index_service import message_index_service
+    from services.semantic_cache_service import semantic_cache_service
+    from services.speculative_draft_service import speculative_draft_service
+    from services.stream_draft_service import stream_draft_service
+    from services.usage_service import usage_service
+
+    await job_queue.stop()
+    await stream_draft_service.shutdown()
+    await speculative_draft_service.shutdown()
+    await semantic_cache_service.shutdown()
+    await message_index_service.shutdown()
+    await usage_service.shutdown()
+    await count_service.shutdown()
+    await chat_summary_service.shutdown()
+    await invalidation_bus.stop()
+    await close_redis()
     await db.close_db()
 
 
@@ -92,6 +123,9 @@ app.include_router(auth.router)
 app.include_router(chats.router)
 app.include_router(messages.router)
 app.include_router(ai_config.router)
+app.include_router(jobs.router)
+app.include_router(metrics.router)
+app.include_router(usage.router)
 app.mount("/admin", admin_app)
 
 
@@ -107,6 +141,22 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.exception_handler(LLMTimeoutError)
+async def llm_timeout_handler(request, exc):
+    """LLM call exceeded its deadline"""
+    return JSONResponse(status_code=504, content={"detail": "AI provider timed out"})
+
+
+@app.exception_handler(LLMError)
+async def llm_error_handler(request, exc):
+    """LLM provider is failing or the circuit breaker is open"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "AI provider is temporarily unavailable"},
+        headers={"Retry-After": str(int(settings.llm.CIRCUIT_RESET_SECONDS))},
+    )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler"""
@@ -3,5 +3,10 @@ from .user import User
 from .chat import Chat
 from .message import Message
 from .ai_configuration import AIConfiguration
+from .chat_summary import ChatSummary
+from .semantic_cache_entry import SemanticCacheEntry
+from .message_embedding import MessageEmbedding
+from .usage import CompanyUsage
+from .stream_draft import StreamDraft
 
-__all__ = ["Company", "User", "Chat", "Message", "AIConfiguration"]
\ No newline at end of file
+__all__ = ["Company", "User", "Chat", "Message", "AIConfiguration", "ChatSummary", "SemanticCacheEntry", "MessageEmbedding", "CompanyUsage", "StreamDraft"]
\ No newline at end of file
@@ -9,6 +9,12 @@ class AIConfiguration(Model):
     id = fields.UUIDField(pk=True, default=uuid.uuid4)
     client_description = fields.TextField(null=True)
     special_instructions = fields.TextField(null=True)
+    # Pre-generate a draft when a client message arrives; None inherits from global
+    speculative_drafts = fields.BooleanField(null=True)
+    # Answer near-duplicate client questions from approved replies; None inherits
+    semantic_cache = fields.BooleanField(null=True)
+    # Add relevant older messages to prompts (embeds the chat's messages); None inherits
+    retrieval = fields.BooleanField(null=True)
     company = fields.ForeignKeyField("models.Company", related_name="ai_configurations")
     chat = fields.ForeignKeyField(
         "models.Chat", related_name="ai_configurations", null=True
@@ -0,0 +1,35 @@
+from tortoise.models import Model
+from tortoise import fields
+import uuid
+
+from fastadmin import TortoiseModelAdmin, WidgetType, register
+
+
+class ChatSummary(Model):
+    id = fields.UUIDField(pk=True, default=uuid.uuid4)
+    chat = fields.OneToOneField("models.Chat", related_name="summary")
+    summary = fields.TextField()
+    # (created_at, id) of the newest message folded into the summary; the id
+    # breaks ties between messages with the same timestamp (bulk imports)
+    summarized_until = fields.DatetimeField()
+    summarized_until_id = fields.UUIDField(null=True)
+    summarized_messages_count = fields.IntField(default=0)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "chat_summaries"
+
+    def __str__(self):
+        return f"ChatSummary({self.chat_id})"
+
+
+@register(ChatSummary)
+class ChatSummaryAdmin(TortoiseModelAdmin):
+    list_display = ("id", "chat", "summarized_messages_count", "updated_at")
+    list_display_links = ("id",)
+    list_filter = ("updated_at",)
+    search_fields = ("summary",)
+    formfield_overrides = {  # noqa: RUF012
+        "summary": (WidgetType.TextArea, {"required": True}),
+    }
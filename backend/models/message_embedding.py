@@ -0,0 +1,19 @@
+from tortoise.models import Model
+from tortoise import fields
+import uuid
+
+
+class MessageEmbedding(Model):
+    id = fields.UUIDField(pk=True, default=uuid.uuid4)
+    message = fields.OneToOneField("models.Message", related_name="embedding")
+    chat = fields.ForeignKeyField("models.Chat", related_name="message_embeddings")
+    # float16 vector of the message content
+    embedding = fields.BinaryField()
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "message_embeddings"
+
+    def __str__(self):
+        return f"MessageEmbedding({self.message_id})"
@@ -0,0 +1,42 @@
+from tortoise.models import Model
+from tortoise import fields
+import uuid
+
+from fastadmin import TortoiseModelAdmin, WidgetType, register
+
+
+class SemanticCacheEntry(Model):
+    """An approved manager reply and the client question it answered"""
+
+    id = fields.UUIDField(pk=True, default=uuid.uuid4)
+    company = fields.ForeignKeyField("models.Company", related_name="semantic_cache_entries")
+    chat = fields.ForeignKeyField("models.Chat", related_name="semantic_cache_entries")
+    reply_message = fields.OneToOneField(
+        "models.Message", related_name="semantic_cache_entry"
+    )
+    # Hash of the effective AI configuration the reply was written under
+    config_hash = fields.CharField(max_length=64)
+    question = fields.TextField()
+    reply = fields.TextField()
+    # float32 vector of the question embedding
+    embedding = fields.BinaryField()
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "semantic_cache_entries"
+
+    def __str__(self):
+        return f"SemanticCacheEntry({self.question[:50]}...)"
+
+
+@register(SemanticCacheEntry)
+class SemanticCacheEntryAdmin(TortoiseModelAdmin):
+    list_display = ("id", "company", "chat", "created_at")
+    list_display_links = ("id",)
+    list_filter = ("created_at", "company")
+    search_fields = ("question", "reply")
+    formfield_overrides = {  # noqa: RUF012
+        "question": (WidgetType.TextArea, {"required": True}),
+        "reply": (WidgetType.TextArea, {"required": True}),
+    }
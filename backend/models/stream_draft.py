@@ -0,0 +1,46 @@
+from tortoise.models import Model
+from tortoise import fields
+import uuid
+from enum import Enum
+
+from fastadmin import TortoiseModelAdmin, WidgetType, register
+
+
+class StreamDraftStatus(str, Enum):
+    STREAMING = "streaming"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class StreamDraft(Model):
+    """Checkpointed output of a streaming AI generation, for resuming it"""
+
+    id = fields.UUIDField(pk=True, default=uuid.uuid4)
+    chat = fields.ForeignKeyField("models.Chat", related_name="stream_drafts")
+    status = fields.CharEnumField(StreamDraftStatus, max_length=20, default=StreamDraftStatus.STREAMING)
+    # Content streamed so far; the full reply once completed
+    content = fields.TextField(default="")
+    message = fields.ForeignKeyField(
+        "models.Message", related_name="stream_drafts", null=True, on_delete=fields.SET_NULL
+    )
+    error = fields.CharField(max_length=255, null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "stream_drafts"
+
+    def __str__(self):
+        return f"StreamDraft({self.chat_id}, {self.status})"
+
+
+@register(StreamDraft)
+class StreamDraftAdmin(TortoiseModelAdmin):
+    list_display = ("id", "chat", "status", "created_at", "updated_at")
+    list_display_links = ("id",)
+    list_filter = ("status", "created_at")
+    search_fields = ("content",)
+    formfield_overrides = {  # noqa: RUF012
+        "content": (WidgetType.TextArea, {"required": False}),
+    }
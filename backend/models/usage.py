@@ -0,0 +1,38 @@
+from tortoise.models import Model
+from tortoise import fields
+import uuid
+
+from fastadmin import TortoiseModelAdmin, register
+
+
+class CompanyUsage(Model):
+    """LLM usage of a company on one (UTC) day with one model"""
+
+    id = fields.UUIDField(pk=True, default=uuid.uuid4)
+    company = fields.ForeignKeyField("models.Company", related_name="usage")
+    day = fields.DateField()
+    model = fields.CharField(max_length=255)
+    requests = fields.IntField(default=0)
+    cache_hits = fields.IntField(default=0)
+    errors = fields.IntField(default=0)
+    prompt_tokens = fields.BigIntField(default=0)
+    # Prompt tokens the provider served from its prefix cache
+    cached_tokens = fields.BigIntField(default=0)
+    completion_tokens = fields.BigIntField(default=0)
+    # Summed provider latency of the requests, for averages
+    latency_ms = fields.BigIntField(default=0)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "company_usage"
+        unique_together = (("company", "day", "model"),)
+
+    def __str__(self):
+        return f"CompanyUsage({self.company_id}, {self.day}, {self.model})"
+
+
+@register(CompanyUsage)
+class CompanyUsageAdmin(TortoiseModelAdmin):
+    list_display = ("id", "company", "day", "model", "requests", "prompt_tokens", "completion_tokens")
+    list_display_links = ("id",)
+    list_filter = ("day", "company", "model")
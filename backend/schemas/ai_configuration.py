@@ -7,6 +7,9 @@ from typing import Optional
 class AIConfigurationBase(BaseModel):
     client_description: Optional[str] = None
     special_instructions: Optional[str] = None
+    speculative_drafts: Optional[bool] = None
+    semantic_cache: Optional[bool] = None
+    retrieval: Optional[bool] = None
 
 
 class AIConfigurationCreate(AIConfigurationBase):
@@ -16,6 +19,9 @@ class AIConfigurationCreate(AIConfigurationBase):
 class AIConfigurationUpdate(BaseModel):
     client_description: Optional[str] = None
     special_instructions: Optional[str] = None
+    speculative_drafts: Optional[bool] = None
+    semantic_cache: Optional[bool] = None
+    retrieval: Optional[bool] = None
 
 
 class AIConfigurationResponse(AIConfigurationBase):
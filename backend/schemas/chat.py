@@ -34,7 +34,10 @@ class ChatWithMessagesResponse(ChatResponse):
 
 class ChatListResponse(BaseModel):
     chats: List[ChatResponse]
-    total_count: int
-    page: int
     page_size: int
-    total_pages: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    # Only computed when requested with include_total; large totals are
+    # estimated or cached and flagged approximate
+    total_count: Optional[int] = None
+    approximate: bool = False
@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from uuid import UUID
+from datetime import datetime
+from typing import Optional, Dict, Any
+from services.job_queue import JobKind, JobStatus
+from .message import MessageResponse
+
+
+class JobResponse(BaseModel):
+    id: UUID
+    kind: JobKind
+    status: JobStatus
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    message: Optional[MessageResponse] = None
+    created_at: datetime
+    updated_at: datetime
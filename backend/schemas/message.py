@@ -1,7 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from uuid import UUID
 from datetime import datetime
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from models.message import MessageRole
 
 
@@ -31,22 +31,80 @@ class MessageResponse(MessageBase):
 
 class MessageListResponse(BaseModel):
     messages: List[MessageResponse]
-    total_count: int
-    page: int
     page_size: int
-    total_pages: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    # Only computed when requested with include_total; large totals are
+    # estimated or cached and flagged approximate
+    total_count: Optional[int] = None
+    approximate: bool = False
 
 
 class AIMessageGenerationRequest(BaseModel):
     chat_id: UUID
     context_messages_count: Optional[int] = 10
+    fresh: bool = False
+    fast: bool = False
+
+
+class AICandidatesGenerationRequest(BaseModel):
+    chat_id: UUID
+    context_messages_count: Optional[int] = 10
+    candidates_count: int = Field(default=3, ge=1, le=8)
+    fresh: bool = False
+    fast: bool = False
+
+
+class AICandidatesResponse(BaseModel):
+    message: MessageResponse
+    candidates: List[str]
+
+
+class AIBatchGenerationRequest(BaseModel):
+    chat_ids: List[UUID] = Field(min_length=1, max_length=200)
+    context_messages_count: Optional[int] = 10
+    fresh: bool = False
+    fast: bool = False
+
+
+class AIBatchGenerationResult(BaseModel):
+    chat_id: UUID
+    status: str
+    message: Optional[MessageResponse] = None
+    detail: Optional[str] = None
 
 
 class AIMessageRevisionRequest(BaseModel):
     message_id: UUID
     revision_instructions: str
+    fresh: bool = False
+    fast: bool = False
+
+
+class MessageImportItem(BaseModel):
+    """One message of an imported history"""
+    content: str = Field(min_length=1)
+    role: MessageRole
+    is_ai_generated: bool = False
+    # Original send time (naive values are UTC); defaults to import time
+    created_at: Optional[datetime] = None
 
 
 class MessageImportRequest(BaseModel):
     chat_id: UUID
-    messages: List[dict]
\ No newline at end of file
+    # Rows are validated one by one against MessageImportItem, so a bad row
+    # is reported instead of failing the whole request
+    messages: List[Dict[str, Any]]
+    # Import nothing if any row is rejected
+    strict: bool = False
+
+
+class MessageImportReject(BaseModel):
+    index: int
+    error: str
+
+
+class MessageImportResponse(BaseModel):
+    chat_id: UUID
+    imported_count: int
+    rejected: List[MessageImportReject]
\ No newline at end of file
@@ -0,0 +1,28 @@
+from pydantic import BaseModel
+from uuid import UUID
+from datetime import date
+from typing import List, Optional
+
+
+class UsageTotals(BaseModel):
+    requests: int = 0
+    cache_hits: int = 0
+    errors: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    cached_token_ratio: Optional[float] = None
+    completion_tokens: int = 0
+    avg_latency_ms: Optional[float] = None
+
+
+class UsageDay(UsageTotals):
+    day: date
+    model: str
+
+
+class UsageResponse(BaseModel):
+    company_id: UUID
+    start: Optional[date] = None
+    end: Optional[date] = None
+    days: List[UsageDay]
+    totals: UsageTotals
@@ -3,6 +3,7 @@ from .company_service import CompanyService
 from .user_service import UserService
 from .chat_service import ChatService
 from .message_service import MessageService
+from .ai_config_service import AIConfigService
 from .ai_service import AIService
 
 __all__ = [
@@ -11,5 +12,6 @@ __all__ = [
     "UserService",
     "ChatService",
     "MessageService",
+    "AIConfigService",
     "AIService"
 ]
\ No newline at end of file
@@ -0,0 +1,178 @@
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from tortoise.expressions import Q
+
+from common.database import db
+from common.invalidation import invalidation_bus
+from common.settings import settings
+from models import AIConfiguration
+from services.prompt_layout import PromptPrefix, render_prefix
+
+DEFAULT_SYSTEM_PROMPT = "You are a professional customer service manager. Respond helpfully and professionally to customer inquiries."
+
+
+@dataclass(frozen=True)
+class ResolvedAIConfig:
+    """Effective AI configuration for a chat (chat-specific over global)"""
+
+    config: Optional[AIConfiguration]
+    special_instructions: str
+    client_description: Optional[str]
+    system_prompt: str
+    prefix: PromptPrefix
+    speculative_drafts: bool = False
+    semantic_cache: bool = False
+    retrieval: bool = False
+
+
+class AIConfigService:
+    """Resolves effective AI configuration and caches it in process.
+
+    Entries are grouped by company so a change to the global configuration
+    drops every chat of that company at once, while a chat-specific change
+    only drops that chat. Invalidations reach other processes through the
+    invalidation bus; a TTL bounds staleness for writes made outside the API
+    (admin panel).
+    """
+
+    def __init__(self):
+        # company_id -> chat_id (None for global) -> (expires_at, resolved)
+        self._entries: Dict[UUID, Dict[Optional[UUID], Tuple[float, ResolvedAIConfig]]] = {}
+        # Bumped on every invalidation so in-flight lookups don't store stale data
+        self._versions: Dict[UUID, int] = {}
+        invalidation_bus.subscribe("ai_config", self._on_invalidation, self.clear)
+
+    async def resolve(
+        self, company_id: UUID, chat_id: Optional[UUID] = None
+    ) -> ResolvedAIConfig:
+        """Get effective configuration and compiled system prompt for a chat"""
+        resolved = await self.resolve_many(company_id, [chat_id])
+        return resolved[chat_id]
+
+    async def resolve_many(
+        self, company_id: UUID, chat_ids: Iterable[Optional[UUID]]
+    ) -> Dict[Optional[UUID], ResolvedAIConfig]:
+        """Resolve configuration for several chats of a company in one query"""
+        now = time.monotonic()
+        company_entries = self._entries.get(company_id, {})
+        resolved: Dict[Optional[UUID], ResolvedAIConfig] = {}
+        missing = []
+        for chat_id in dict.fromkeys(chat_ids):
+            cached = company_entries.get(chat_id)
+            if cached and cached[0] > now:
+                resolved[chat_id] = cached[1]
+            else:
+                missing.append(chat_id)
+
+        if not missing:
+            return resolved
+
+        version = self._versions.get(company_id, 0)
+        loaded = await self._load(company_id, missing)
+
+        if self._versions.get(company_id, 0) == version:
+            expires_at = time.monotonic() + settings.cache.AI_CONFIG_TTL_SECONDS
+            entries = self._entries.setdefault(company_id, {})
+            for chat_id, config in loaded.items():
+                entries[chat_id] = (expires_at, config)
+
+        resolved.update(loaded)
+        return resolved
+
+    def invalidate(self, company_id: UUID, chat_id: Optional[UUID] = None) -> None:
+        """Drop cached configuration after a write.
+
+        Invalidating the global configuration (chat_id=None) drops all chats of
+        the company, since they fall back to it.
+        """
+        self._invalidate(company_id, chat_id)
+        invalidation_bus.publish("ai_config", company_id=company_id, chat_id=chat_id)
+
+    def clear(self) -> None:
+        """Drop all cached configuration"""
+        for company_id in self._versions:
+            self._versions[company_id] += 1
+        self._entries.clear()
+
+    def _on_invalidation(self, data: dict) -> None:
+        chat_id = data.get("chat_id")
+        self._invalidate(UUID(data["company_id"]), UUID(chat_id) if chat_id else None)
+
+    def _invalidate(self, company_id: UUID, chat_id: Optional[UUID]) -> None:
+        self._versions[company_id] = self._versions.get(company_id, 0) + 1
+        if chat_id is None:
+            self._entries.pop(company_id, None)
+        else:
+            self._entries.get(company_id, {}).pop(chat_id, None)
+
+    async def _load(
+        self, company_id: UUID, chat_ids: List[Optional[UUID]]
+    ) -> Dict[Optional[UUID], ResolvedAIConfig]:
+        """Fetch chat-specific and global configuration in a single query"""
+        scope = Q(chat_id__isnull=True)
+        specific_ids = [chat_id for chat_id in chat_ids if chat_id]
+        if specific_ids:
+            scope |= Q(chat_id__in=specific_ids)
+        configs = await db.get_records(AIConfiguration, scope, company_id=company_id)
+
+        global_config = next((c for c in configs if c.chat_id is None), None)
+        chat_configs = {c.chat_id: c for c in configs if c.chat_id is not None}
+
+        return {
+            chat_id: self._compile(chat_configs.get(chat_id), global_config)
+            for chat_id in chat_ids
+        }
+
+    @staticmethod
+    def _compile(
+        chat_config: Optional[AIConfiguration], global_config: Optional[AIConfiguration]
+    ) -> ResolvedAIConfig:
+        """Merge chat-specific over global configuration into a system prompt"""
+        # Special instructions fall back field by field, other fields by record
+        special_instructions = DEFAULT_SYSTEM_PROMPT
+        if chat_config and chat_config.special_instructions:
+            special_instructions = chat_config.special_instructions
+        elif global_config and global_config.special_instructions:
+            special_instructions = global_config.special_instructions
+
+        config = chat_config or global_config
+        client_description = config.client_description if config else None
+
+        # Rendered once per distinct configuration and shared by its chats
+        prefix = render_prefix(special_instructions, client_description)
+
+        # Opt-in flags: chat-specific value wins unless left unset
+        speculative_drafts = False
+        if chat_config and chat_config.speculative_drafts is not None:
+            speculative_drafts = chat_config.speculative_drafts
+        elif global_config and global_config.speculative_drafts:
+            speculative_drafts = True
+
+        semantic_cache = False
+        if chat_config and chat_config.semantic_cache is not None:
+            semantic_cache = chat_config.semantic_cache
+        elif global_config and global_config.semantic_cache:
+            semantic_cache = True
+
+        retrieval = False
+        if chat_config and chat_config.retrieval is not None:
+            retrieval = chat_config.retrieval
+        elif global_config and global_config.retrieval:
+            retrieval = True
+
+        return ResolvedAIConfig(
+            config=config,
+            special_instructions=special_instructions,
+            client_description=client_description,
+            system_prompt=prefix.message["content"],
+            prefix=prefix,
+            speculative_drafts=speculative_drafts,
+            semantic_cache=semantic_cache,
+            retrieval=retrieval,
+        )
+
+
+ai_config_service = AIConfigService()
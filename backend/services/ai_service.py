@@ -1,135 +1,510 @@
-from openai import AsyncOpenAI
-from typing import List, Optional
+import asyncio
+import hashlib
+import json
+import time
+import numpy as np
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
 from uuid import UUID
 
 from common.database import db
 from common.settings import settings
-from models import Message, Chat, AIConfiguration
+from common.tokens import count_message_tokens, count_messages_tokens, count_tokens
+from models import Message, Chat, AIConfiguration, ChatSummary
 from models.message import MessageRole
+from services import prompt_layout
+from services.ai_config_service import ResolvedAIConfig, ai_config_service
+from services.chat_summary_service import chat_summary_service, is_summarized
+from services.conversation_cache import conversation_cache
+from services.llm_client import LLMError, ResilientLLMClient
+from services.llm_providers import create_provider
+from services.model_router import ModelRouter
+from services.llm_scheduler import LLMPriority, llm_scheduler
+from services.message_index_service import message_index_service
+from services.response_cache import response_cache
+from services.semantic_cache_service import semantic_cache_service
+from services.usage_service import usage_service
+
+
+def prompt_fingerprint(messages: List[dict], **params) -> str:
+    """Stable hash of a prompt and its generation parameters"""
+    payload = json.dumps({"messages": messages, **params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class ChatPrompt:
+    """Assembled LLM messages for a chat together with their tenant"""
+
+    chat_id: UUID
+    company_id: UUID
+    messages: List[dict]
+
+    @property
+    def fingerprint(self) -> str:
+        return prompt_fingerprint(self.messages)
 
 
 class AIService:
     def __init__(self):
-        self.openai_client = None
+        self.router = None
+        self.embedding_client = None
         self._init_clients()
 
     def _init_clients(self):
-        """Initialize AI clients based on available API keys"""
-        self.openai_client = AsyncOpenAI(
-            api_key=settings.llm.API_KEY,
-        )
+        """Initialize LLM clients for the configured providers"""
+        self.router = ModelRouter(create_provider(settings.llm.PROVIDER))
+        if settings.llm.EMBEDDING_PROVIDER == settings.llm.PROVIDER:
+            self.embedding_client = self.router.client(settings.llm.EMBEDDING_MODEL)
+        else:
+            self.embedding_client = ResilientLLMClient(
+                create_provider(settings.llm.EMBEDDING_PROVIDER)
+            )
 
     async def get_ai_configuration(
         self, company_id: UUID, chat_id: Optional[UUID] = None
     ) -> str:
         """Get AI configuration prompt (chat-specific or global)"""
-        chat_config = None
-        if chat_id:
-            chat_config = await db.get_record_by_field(
-                AIConfiguration, company_id=company_id, chat_id=chat_id
-            )
-
-        if chat_config and chat_config.special_instructions:
-            return chat_config.special_instructions
-
-        # Fall back to global configuration
-        global_config = await db.get_record_by_field(
-            AIConfiguration, company_id=company_id, chat_id=None
-        )
-
-        if global_config and global_config.special_instructions:
-            return global_config.special_instructions
-
-        # Default prompt
-        return "You are a professional customer service manager. Respond helpfully and professionally to customer inquiries."
+        resolved = await ai_config_service.resolve(company_id, chat_id)
+        return resolved.special_instructions
 
     async def get_ai_config_object(
         self, company_id: UUID, chat_id: Optional[UUID] = None
     ) -> Optional[AIConfiguration]:
         """Get AI configuration object (chat-specific or global)"""
-        chat_config = None
-        if chat_id:
-            chat_config = await db.get_record_by_field(
-                AIConfiguration, company_id=company_id, chat_id=chat_id
-            )
+        resolved = await ai_config_service.resolve(company_id, chat_id)
+        return resolved.config
 
-        if chat_config:
-            return chat_config
+    @staticmethod
+    def _fit_conversation(
+        recent_messages: List, token_budget: int, summary: Optional[ChatSummary] = None
+    ) -> List[dict]:
+        """Convert messages to LLM format, dropping the oldest beyond the budget.
 
-        # Fall back to global configuration
-        global_config = await db.get_record_by_field(
-            AIConfiguration, company_id=company_id, chat_id=None
+        Messages already folded into `summary` are skipped.
+        """
+        conversation = []
+        used_tokens = 0
+        for message in reversed(recent_messages):
+            if is_summarized(summary, message):
+                break
+            role = "user" if message.role == MessageRole.CLIENT else "assistant"
+            entry = {"role": role, "content": message.content}
+            entry_tokens = count_message_tokens(entry)
+            if conversation and used_tokens + entry_tokens > token_budget:
+                break
+            conversation.append(entry)
+            used_tokens += entry_tokens
+
+        # Restore chronological order
+        conversation.reverse()
+        return conversation
+
+    @staticmethod
+    def _history_limit(summary: Optional[ChatSummary], context_messages_count: int) -> int:
+        """How many of the newest messages to consider for the prompt history.
+
+        Once a chat has a summary, every message after it is sent (as far as
+        the token budget allows), not just the requested count: otherwise the
+        messages between the summary and the requested tail would be in
+        neither.
+        """
+        if summary is None:
+            return context_messages_count
+        return max(context_messages_count, settings.cache.CONVERSATION_TAIL_MESSAGES)
+
+    @staticmethod
+    async def _retrieve(
+        resolved: ResolvedAIConfig, chat_id: UUID, recent: List
+    ) -> List[Message]:
+        """Older messages relevant to the latest one, for chats that opted in"""
+        if not resolved.retrieval:
+            return []
+        return await message_index_service.retrieve(chat_id, recent)
+
+    def _assemble_prompt(
+        self,
+        resolved: ResolvedAIConfig,
+        summary: Optional[ChatSummary],
+        recent: List[Message],
+        retrieved: List[Message],
+    ) -> List[dict]:
+        """Lay out prompt messages with the configuration prefix first.
+
+        History gets what is left of the prompt budget after the prefix,
+        summary and retrieved context.
+        """
+        summary_msg = prompt_layout.summary_message(summary.summary if summary else None)
+        retrieved_msg = prompt_layout.retrieved_message(retrieved)
+        extra = [m for m in (summary_msg, retrieved_msg) if m]
+        budget = (
+            settings.llm.CONTEXT_TOKEN_BUDGET
+            - resolved.prefix.tokens
+            - count_messages_tokens(extra)
         )
+        conversation = self._fit_conversation(recent, max(budget, 0), summary)
+        return prompt_layout.assemble(resolved.prefix, summary_msg, conversation, retrieved_msg)
 
-        return global_config
+    async def build_prompt(
+        self, chat_id: UUID, context_messages_count: int = 10
+    ) -> Optional[ChatPrompt]:
+        """Build the full list of LLM messages (system prompt + history) for a chat"""
+        # Get chat details
+        chat = await db.get_record_by_id(Chat, chat_id)
+        if not chat:
+            return None
 
-    async def build_conversation_context(
-        self, chat_id: UUID, context_count: int = 10
-    ) -> List[dict]:
-        """Build conversation context from recent messages"""
-        messages = await db.get_records(Message, chat_id=chat_id)
+        # Effective configuration and compiled system prompt in one (cached) lookup
+        resolved = await ai_config_service.resolve(chat.company_id, chat_id)
 
-        # Get the last N messages
-        recent_messages = (
-            messages[-context_count:] if len(messages) > context_count else messages
+        # Older messages are represented by the rolling summary, plus the few
+        # of them most relevant to the latest client message
+        summary = await chat_summary_service.get_summary(chat_id)
+        recent = await conversation_cache.get_recent(
+            chat_id, self._history_limit(summary, context_messages_count)
         )
+        retrieved = await self._retrieve(resolved, chat_id, recent)
 
-        conversation = []
-        for message in recent_messages:
-            role = "user" if message.role == MessageRole.CLIENT else "assistant"
-            conversation.append({"role": role, "content": message.content})
+        # Prepare messages for AI
+        return ChatPrompt(
+            chat_id=chat_id,
+            company_id=chat.company_id,
+            messages=self._assemble_prompt(resolved, summary, recent, retrieved),
+        )
 
-        return conversation
+    async def build_prompts(
+        self, chats: List[Chat], context_messages_count: int = 10
+    ) -> Dict[UUID, ChatPrompt]:
+        """Build prompts for many chats with set-based configuration and history lookups"""
+        chats_by_company: Dict[UUID, List[Chat]] = defaultdict(list)
+        for chat in chats:
+            chats_by_company[chat.company_id].append(chat)
+
+        resolved = {}
+        for company_id, company_chats in chats_by_company.items():
+            company_resolved = await ai_config_service.resolve_many(
+                company_id, [chat.id for chat in company_chats]
+            )
+            resolved.update(company_resolved)
+
+        chat_ids = [chat.id for chat in chats]
+        summaries = await chat_summary_service.get_summaries(chat_ids)
+        limits = {
+            chat_id: self._history_limit(summary, context_messages_count)
+            for chat_id, summary in summaries.items()
+        }
+        recent = await conversation_cache.get_recent_many(
+            chat_ids, max(limits.values(), default=context_messages_count)
+        )
+        recent = {
+            chat_id: messages[-limits[chat_id]:] if limits[chat_id] else []
+            for chat_id, messages in recent.items()
+        }
+        retrieved = await asyncio.gather(
+            *(self._retrieve(resolved[chat_id], chat_id, recent[chat_id]) for chat_id in chat_ids)
+        )
+        retrieved = dict(zip(chat_ids, retrieved))
+
+        prompts = {}
+        for chat in chats:
+            prompts[chat.id] = ChatPrompt(
+                chat_id=chat.id,
+                company_id=chat.company_id,
+                messages=self._assemble_prompt(
+                    resolved[chat.id],
+                    summaries[chat.id],
+                    recent[chat.id],
+                    retrieved[chat.id],
+                ),
+            )
+        return prompts
 
     async def generate_manager_response(
         self, chat_id: UUID, context_messages_count: int = 10
     ) -> Optional[str]:
         """Generate AI response as manager to client messages"""
         try:
-            # Get chat details
-            chat = await db.get_record_by_id(Chat, chat_id)
-            if not chat:
+            prompt = await self.build_prompt(chat_id, context_messages_count)
+            if not prompt:
                 return None
 
-            # Get AI configuration for all fields
-            ai_config = await self.get_ai_config_object(chat.company_id, chat_id)
+            return await self.generate_from_prompt(prompt)
 
-            # Build system prompt starting with special instructions (the main prompt)
-            ai_prompt = await self.get_ai_configuration(chat.company_id, chat_id)
-
-            # Add client description if available
-            if ai_config and ai_config.client_description:
-                ai_prompt += f"\n\nClient Description: {ai_config.client_description}"
+        except LLMError:
+            raise
+        except Exception as e:
+            print(f"Error generating AI response: {e}")
+            return None
 
-            # Get conversation history
-            conversation = await self.build_conversation_context(
-                chat_id, context_messages_count
+    async def generate_from_prompt(
+        self,
+        prompt: ChatPrompt,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        fresh: bool = False,
+        fast: bool = False,
+    ) -> Optional[str]:
+        """Generate AI response for an already assembled prompt"""
+        try:
+            if not fresh:
+                # Approved reply to a near-identical question, if the company opted in
+                reply = await semantic_cache_service.lookup(
+                    prompt.chat_id, prompt.company_id, prompt.messages
+                )
+                if reply:
+                    self._record_cache_hit(prompt, fast)
+                    return reply
+
+            return await self._generate_response(
+                prompt.messages, prompt.company_id, priority, fresh=fresh, fast=fast
             )
 
-            # Prepare messages for AI
-            messages = [{"role": "system", "content": ai_prompt}, *conversation]
-            print(messages)
-
-            return await self._generate_openai_response(messages)
-
+        except LLMError:
+            raise
         except Exception as e:
             print(f"Error generating AI response: {e}")
             return None
 
-    async def _generate_openai_response(self, messages: List[dict]) -> Optional[str]:
-        """Generate response using OpenAI"""
+    async def generate_candidates_from_prompt(
+        self,
+        prompt: ChatPrompt,
+        candidates_count: int,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        fresh: bool = False,
+        fast: bool = False,
+    ) -> List[str]:
+        """Generate several alternative drafts for a prompt in one provider call"""
         try:
-            response = await self.openai_client.chat.completions.create(
-                messages=messages, model=settings.llm.MODEL, temperature=1
+            return await self._generate_choices(
+                prompt.messages,
+                prompt.company_id,
+                priority,
+                n=candidates_count,
+                fresh=fresh,
+                fast=fast,
             )
 
-            return response.choices[0].message.content.strip()
+        except LLMError:
+            raise
+        except Exception as e:
+            print(f"Error generating AI candidates: {e}")
+            return []
+
+    async def stream_manager_response(
+        self, chat_id: UUID, context_messages_count: int = 10
+    ) -> AsyncIterator[str]:
+        """Stream AI response as manager token by token.
+
+        Unlike generate_manager_response, errors are propagated to the caller
+        so a partially streamed draft is never mistaken for a complete one.
+        """
+        prompt = await self.build_prompt(chat_id, context_messages_count)
+        if not prompt:
+            raise ValueError(f"Chat {chat_id} not found")
+
+        async for token in self.stream_from_prompt(prompt):
+            yield token
+
+    async def stream_from_prompt(
+        self, prompt: ChatPrompt, fresh: bool = False, fast: bool = False
+    ) -> AsyncIterator[str]:
+        """Stream AI response for an already assembled prompt (errors propagate)"""
+        if not fresh:
+            reply = await semantic_cache_service.lookup(
+                prompt.chat_id, prompt.company_id, prompt.messages
+            )
+            if reply:
+                self._record_cache_hit(prompt, fast)
+                yield reply
+                return
+
+        async for token in self._stream_response(
+            prompt.messages, prompt.company_id, fresh=fresh, fast=fast
+        ):
+            yield token
+
+    def _record_cache_hit(self, prompt: ChatPrompt, fast: bool) -> None:
+        """Count a semantic cache hit against the model the call would have used"""
+        route = self.router.route(
+            count_messages_tokens(prompt.messages), prompt.company_id, fast
+        )
+        usage_service.record(prompt.company_id, route.model, cache_hit=True)
+
+    async def _generate_response(
+        self,
+        messages: List[dict],
+        company_id: Optional[UUID] = None,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        fresh: bool = False,
+        fast: bool = False,
+    ) -> Optional[str]:
+        """Generate a single response"""
+        choices = await self._generate_choices(
+            messages, company_id, priority, fresh=fresh, fast=fast
+        )
+        return choices[0] if choices else None
+
+    async def _generate_choices(
+        self,
+        messages: List[dict],
+        company_id: Optional[UUID] = None,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        n: int = 1,
+        fresh: bool = False,
+        fast: bool = False,
+    ) -> List[str]:
+        """Generate `n` alternative responses in a single provider call.
+
+        Identical requests are answered from the response cache unless
+        `fresh` asks for a new sample. The model is picked by the router;
+        `fast` asks for the low-latency model. Cache entries are per model.
+        """
+        route = self.router.route(count_messages_tokens(messages), company_id, fast)
+        params = dict(model=route.model, temperature=1, n=n)
+        cache_key = prompt_fingerprint(
+            messages, company_id=company_id, provider=settings.llm.PROVIDER, **params
+        )
+        try:
+            cached = await response_cache.get(cache_key, fresh=fresh)
+            if cached:
+                usage_service.record(company_id, route.model, cache_hit=True)
+                return cached
+
+            async with llm_scheduler.slot(company_id, priority):
+                started = time.monotonic()
+                try:
+                    model, completion = await self.router.complete(
+                        route, messages=messages, temperature=1, n=n
+                    )
+                except LLMError:
+                    usage_service.record(company_id, route.model, error=True)
+                    raise
+                # Under the configured name of the model that answered (the
+                # fallback, if used): the provider's versioned ID would
+                # split its ledger rows
+                usage_service.record(
+                    company_id,
+                    model,
+                    completion.prompt_tokens,
+                    completion.completion_tokens,
+                    time.monotonic() - started,
+                    cached_tokens=completion.cached_tokens,
+                )
+
+            choices = [choice.strip() for choice in completion.choices if choice.strip()]
+            await response_cache.set(cache_key, choices)
+            return choices
+        except LLMError:
+            raise
         except Exception as e:
-            print(f"OpenAI API error: {e}")
+            print(f"LLM API error: {e}")
+            return []
+
+    async def _stream_response(
+        self,
+        messages: List[dict],
+        company_id: Optional[UUID] = None,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        fresh: bool = False,
+        fast: bool = False,
+    ) -> AsyncIterator[str]:
+        """Stream response content deltas from the routed model.
+
+        A cached completion for the same prompt is sent as a single delta;
+        a fully streamed completion is stored for later identical requests.
+        """
+        prompt_tokens = count_messages_tokens(messages)
+        route = self.router.route(prompt_tokens, company_id, fast)
+        # Shares cache entries with non-streaming single-choice calls
+        params = dict(model=route.model, temperature=1)
+        cache_key = prompt_fingerprint(
+            messages, company_id=company_id, provider=settings.llm.PROVIDER, n=1, **params
+        )
+        cached = await response_cache.get(cache_key, fresh=fresh)
+        if cached:
+            usage_service.record(company_id, route.model, cache_hit=True)
+            yield cached[0]
+            return
+
+        deltas = []
+        # The slot is held until the stream is fully consumed
+        async with llm_scheduler.slot(company_id, priority):
+            started = time.monotonic()
+            model = route.model
+            try:
+                model, stream = await self.router.open_stream(
+                    route, messages=messages, temperature=1
+                )
+
+                async for delta in stream:
+                    deltas.append(delta)
+                    yield delta
+            except LLMError:
+                usage_service.record(company_id, model, error=True)
+                raise
+
+        content = "".join(deltas).strip()
+        # Streams carry no usage block; completion tokens are counted locally
+        usage_service.record(
+            company_id,
+            model,
+            prompt_tokens,
+            count_tokens(content),
+            time.monotonic() - started,
+        )
+        if content:
+            await response_cache.set(cache_key, [content])
+
+    async def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Embed texts as unit-length float32 rows (dot product is cosine similarity)"""
+        embeddings = await self.embedding_client.create_embedding(
+            model=settings.llm.EMBEDDING_MODEL, input=texts
+        )
+        vectors = np.array(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    async def summarize_conversation(
+        self,
+        previous_summary: Optional[str],
+        messages: List[Message],
+        company_id: Optional[UUID] = None,
+    ) -> Optional[str]:
+        """Fold a batch of older messages into the rolling chat summary"""
+        transcript = "\n".join(
+            f"{'Client' if message.role == MessageRole.CLIENT else 'Manager'}: {message.content}"
+            for message in messages
+        )
+
+        system_prompt = """You maintain a running summary of a conversation between a client and a customer service manager.
+
+Update the existing summary with the new messages. Keep every fact the manager may need later: client details, preferences, requests, prices and offers discussed, commitments and open questions. Drop small talk. Reply with the updated summary only, in at most 300 words."""
+
+        user_prompt = f"""Existing summary:
+{previous_summary or "(none yet)"}
+
+New messages:
+{transcript}"""
+
+        try:
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ]
+            return await self._generate_response(
+                messages, company_id, LLMPriority.BATCH
+            )
+
+        except Exception as e:
+            print(f"Error summarizing conversation: {e}")
             return None
 
     async def revise_message_with_ai(
-        self, message_id: UUID, revision_instructions: str
+        self,
+        message_id: UUID,
+        revision_instructions: str,
+        fresh: bool = False,
+        fast: bool = False,
     ) -> Optional[str]:
         """Revise existing message using AI with specific instructions"""
         try:
@@ -152,8 +527,12 @@ Revision instructions: {revision_instructions}
 Please provide a revised version of the message that incorporates the requested changes while maintaining professionalism."""
 
             messages = [{"role": "system", "content": system_prompt}]
-            return await self._generate_openai_response(messages)
+            return await self._generate_response(
+                messages, chat.company_id, fresh=fresh, fast=fast
+            )
 
+        except LLMError:
+            raise
         except Exception as e:
             print(f"Error revising message with AI: {e}")
             return None
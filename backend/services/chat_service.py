@@ -2,8 +2,10 @@ from typing import Optional, List, Dict, Any
 from uuid import UUID
 
 from common.database import db
-from models import Chat, User
+from common.pagination import Cursor
+from models import Chat, Message, User
 from schemas.chat import ChatCreate, ChatUpdate
+from services.count_service import count_service
 
 
 class ChatService:
@@ -20,31 +22,57 @@ class ChatService:
             "company_id": user.company_id
         })
         
-        return await db.create_record(Chat, **chat_dict)
+        chat = await db.create_record(Chat, **chat_dict)
+        self._adjust_counts(chat, 1)
+        return chat
     
     async def get_chat_by_id(self, chat_id: UUID) -> Optional[Chat]:
         """Get chat by ID"""
         return await db.get_record_by_id(Chat, chat_id)
     
-    async def get_chats_by_user(self, user_id: UUID, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
-        """Get all chats for a user with pagination"""
-        return await db.get_records_paginated(
+    async def get_chats_by_user(
+        self,
+        user_id: UUID,
+        cursor: Optional[Cursor] = None,
+        page_size: int = 20,
+        include_total: bool = False
+    ) -> Dict[str, Any]:
+        """Get a page of a user's chats, newest first"""
+        result = await db.get_records_keyset(
             Chat,
-            page=page,
             page_size=page_size,
-            order_by="-created_at",
+            cursor=cursor,
+            descending=True,
             user_id=user_id
         )
+        result["total_count"], result["approximate"] = None, False
+        if include_total:
+            result["total_count"], result["approximate"] = await count_service.count(
+                Chat, user_id=user_id
+            )
+        return result
     
-    async def get_chats_by_company(self, company_id: UUID, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
-        """Get all chats for a company with pagination"""
-        return await db.get_records_paginated(
+    async def get_chats_by_company(
+        self,
+        company_id: UUID,
+        cursor: Optional[Cursor] = None,
+        page_size: int = 20,
+        include_total: bool = False
+    ) -> Dict[str, Any]:
+        """Get a page of a company's chats, newest first"""
+        result = await db.get_records_keyset(
             Chat,
-            page=page,
             page_size=page_size,
-            order_by="-created_at",
+            cursor=cursor,
+            descending=True,
             company_id=company_id
         )
+        result["total_count"], result["approximate"] = None, False
+        if include_total:
+            result["total_count"], result["approximate"] = await count_service.count(
+                Chat, company_id=company_id
+            )
+        return result
     
     async def update_chat(self, chat_id: UUID, chat_data: ChatUpdate) -> Optional[Chat]:
         """Update chat"""
@@ -59,7 +87,15 @@ class ChatService:
     
     async def delete_chat(self, chat_id: UUID) -> bool:
         """Delete chat and all its messages"""
-        return await db.delete_record(Chat, chat_id)
+        chat = await self.get_chat_by_id(chat_id)
+        if not chat:
+            return False
+
+        deleted = await db.delete_record(Chat, chat_id)
+        if deleted:
+            self._adjust_counts(chat, -1)
+            count_service.invalidate(Message, chat_id=chat_id)
+        return deleted
     
     async def check_user_chat_access(self, user_id: UUID, chat_id: UUID) -> bool:
         """Check if user has access to the chat"""
@@ -76,5 +112,11 @@ class ChatService:
         chats = await db.get_records_with_relations(Chat, ["messages"], id=chat_id)
         return chats[0] if chats else None
 
+    @staticmethod
+    def _adjust_counts(chat: Chat, delta: int) -> None:
+        """Update cached totals of the listings a chat appears in"""
+        count_service.adjust(Chat, delta, user_id=chat.user_id)
+        count_service.adjust(Chat, delta, company_id=chat.company_id)
+
 
 chat_service = ChatService()
\ No newline at end of file
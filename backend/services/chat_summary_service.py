@@ -0,0 +1,217 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+from uuid import UUID
+
+from tortoise.expressions import Q
+
+from common.database import db
+from common.invalidation import invalidation_bus
+from common.settings import settings
+from models import Chat, ChatSummary, Message
+
+
+def is_summarized(summary: Optional[ChatSummary], message) -> bool:
+    """Whether a message (or a cached copy of one) is folded into the summary"""
+    if summary is None:
+        return False
+    if summary.summarized_until_id is None:
+        return message.created_at <= summary.summarized_until
+    return (message.created_at, message.id) <= (
+        summary.summarized_until,
+        summary.summarized_until_id,
+    )
+
+
+def _before(created_at: datetime, message_id: UUID) -> List[Q]:
+    """Messages ordered before (created_at, id)"""
+    return [
+        Q(created_at__lte=created_at),
+        Q(created_at__lt=created_at) | Q(id__lt=message_id),
+    ]
+
+
+def _after_summary(summary: ChatSummary) -> List[Q]:
+    """Messages not folded into the summary yet"""
+    if summary.summarized_until_id is None:
+        return [Q(created_at__gt=summary.summarized_until)]
+    return [
+        Q(created_at__gte=summary.summarized_until),
+        Q(created_at__gt=summary.summarized_until) | Q(id__gt=summary.summarized_until_id),
+    ]
+
+
+class ChatSummaryService:
+    """Maintains a rolling summary per chat in the background.
+
+    Messages that fall out of the verbatim tail (SUMMARY_TAIL_MESSAGES) are
+    folded into the chat's summary in batches, so prompts stay the same size
+    however long the chat gets. Work runs in at most one task per chat;
+    triggers that arrive while it runs make it go around once more.
+    Summaries are cached in process since this service is their only writer;
+    other processes drop their copy through the invalidation bus.
+    """
+
+    def __init__(self):
+        # chat_id -> summary, or None when the chat has no summary yet
+        self._cache: "OrderedDict[UUID, Optional[ChatSummary]]" = OrderedDict()
+        self._tasks: Dict[UUID, asyncio.Task] = {}
+        self._rerun: Set[UUID] = set()
+        self._reset: Set[UUID] = set()
+        invalidation_bus.subscribe("chat_summary", self._on_invalidation, self._cache.clear)
+
+    async def get_summary(self, chat_id: UUID) -> Optional[ChatSummary]:
+        """Get the current summary of a chat"""
+        summaries = await self.get_summaries([chat_id])
+        return summaries[chat_id]
+
+    async def get_summaries(
+        self, chat_ids: Iterable[UUID]
+    ) -> Dict[UUID, Optional[ChatSummary]]:
+        """Get summaries of several chats, loading misses in one query"""
+        result: Dict[UUID, Optional[ChatSummary]] = {}
+        missing = []
+        for chat_id in dict.fromkeys(chat_ids):
+            if chat_id in self._cache:
+                self._cache.move_to_end(chat_id)
+                result[chat_id] = self._cache[chat_id]
+            else:
+                missing.append(chat_id)
+
+        if missing:
+            summaries = await db.get_records(ChatSummary, chat_id__in=missing)
+            loaded = {summary.chat_id: summary for summary in summaries}
+            for chat_id in missing:
+                # Don't overwrite a summary written while we were loading
+                if chat_id not in self._cache:
+                    self._remember(chat_id, loaded.get(chat_id))
+                result[chat_id] = self._cache.get(chat_id)
+
+        return result
+
+    def schedule(self, chat_id: UUID) -> None:
+        """Fold messages that left the tail into the summary, in the background"""
+        if not settings.summary.ENABLED:
+            return
+
+        task = self._tasks.get(chat_id)
+        if task and not task.done():
+            self._rerun.add(chat_id)
+            return
+        self._tasks[chat_id] = asyncio.create_task(self._run(chat_id))
+
+    async def on_message_changed(self, message: Message) -> None:
+        """Rebuild the summary if an already summarized message was edited or deleted"""
+        summary = await self.get_summary(message.chat_id)
+        if is_summarized(summary, message):
+            self._reset.add(message.chat_id)
+            self.schedule(message.chat_id)
+
+    def forget(self, chat_id: UUID) -> None:
+        """Drop cached state of a deleted chat"""
+        self._cache.pop(chat_id, None)
+        invalidation_bus.publish("chat_summary", chat_id=chat_id)
+
+    async def shutdown(self) -> None:
+        """Cancel background summarization"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def update_summary(self, chat_id: UUID) -> Optional[ChatSummary]:
+        """Fold every complete batch of messages outside the tail into the summary"""
+        from services.ai_service import ai_service
+
+        chat = await db.get_record_by_id(Chat, chat_id)
+        if not chat:
+            self.forget(chat_id)
+            return None
+
+        summary = await self.get_summary(chat_id)
+        if chat_id in self._reset:
+            self._reset.discard(chat_id)
+            if summary:
+                await db.delete_record(ChatSummary, summary.id)
+                summary = None
+                self._written(chat_id, None)
+
+        tail_size = settings.summary.TAIL_MESSAGES
+        while True:
+            # Messages are paged on (created_at, id): imports can give many
+            # messages the same timestamp
+            tail = await db.get_latest_records(
+                Message, tail_size, ("-created_at", "-id"), chat_id=chat_id
+            )
+            if len(tail) < tail_size:
+                return summary
+
+            q_filters = _before(tail[-1].created_at, tail[-1].id)
+            if summary:
+                q_filters += _after_summary(summary)
+            pending = await db.get_records_ordered(
+                Message,
+                ("created_at", "id"),
+                settings.summary.MAX_BATCH,
+                *q_filters,
+                chat_id=chat_id,
+            )
+            if len(pending) < settings.summary.MIN_BATCH:
+                return summary
+
+            text = await ai_service.summarize_conversation(
+                summary.summary if summary else None, pending, chat.company_id
+            )
+            if not text:
+                return summary
+
+            if summary:
+                summary = await db.update_record_instance(
+                    summary,
+                    summary=text,
+                    summarized_until=pending[-1].created_at,
+                    summarized_until_id=pending[-1].id,
+                    summarized_messages_count=summary.summarized_messages_count
+                    + len(pending),
+                )
+            else:
+                summary = await db.create_record(
+                    ChatSummary,
+                    chat_id=chat_id,
+                    summary=text,
+                    summarized_until=pending[-1].created_at,
+                    summarized_until_id=pending[-1].id,
+                    summarized_messages_count=len(pending),
+                )
+            self._written(chat_id, summary)
+
+    async def _run(self, chat_id: UUID) -> None:
+        try:
+            while True:
+                self._rerun.discard(chat_id)
+                await self.update_summary(chat_id)
+                if chat_id not in self._rerun:
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error updating chat summary: {e}")
+        finally:
+            self._tasks.pop(chat_id, None)
+
+    def _on_invalidation(self, data: dict) -> None:
+        self._cache.pop(UUID(data["chat_id"]), None)
+
+    def _written(self, chat_id: UUID, summary: Optional[ChatSummary]) -> None:
+        self._remember(chat_id, summary)
+        invalidation_bus.publish("chat_summary", chat_id=chat_id)
+
+    def _remember(self, chat_id: UUID, summary: Optional[ChatSummary]) -> None:
+        self._cache[chat_id] = summary
+        self._cache.move_to_end(chat_id)
+        while len(self._cache) > settings.summary.CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+
+chat_summary_service = ChatSummaryService()
@@ -0,0 +1,313 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from common.database import db
+from common.invalidation import invalidation_bus
+from common.settings import settings
+from models import Message
+from models.message import MessageRole
+
+# Rough per-entry bookkeeping cost on top of the message content
+ENTRY_OVERHEAD_BYTES = 128
+
+
+@dataclass
+class CachedMessage:
+    """Lightweight copy of the message fields needed to build prompts"""
+
+    id: UUID
+    role: MessageRole
+    content: str
+    created_at: datetime
+
+    @property
+    def size(self) -> int:
+        return len(self.content.encode()) + ENTRY_OVERHEAD_BYTES
+
+    @classmethod
+    def from_message(cls, message: Message) -> "CachedMessage":
+        return cls(
+            id=message.id,
+            role=message.role,
+            content=message.content,
+            created_at=message.created_at,
+        )
+
+    @classmethod
+    def from_row(cls, row: dict) -> "CachedMessage":
+        return cls(
+            id=row["id"],
+            role=MessageRole(row["role"]),
+            content=row["content"],
+            created_at=row["created_at"],
+        )
+
+
+@dataclass
+class ChatTranscript:
+    """Newest messages of a chat in chronological order.
+
+    `complete` is True when the tail holds the whole chat, so requests for
+    more messages than are cached can still be served from memory.
+    """
+
+    messages: List[CachedMessage]
+    complete: bool
+    expires_at: float
+    size: int = field(default=0)
+
+    def __post_init__(self):
+        self.size = sum(message.size for message in self.messages)
+
+
+class ConversationCache:
+    """Write-through LRU cache of per-chat transcript tails, bounded by bytes.
+
+    MessageService keeps cached chats up to date on every mutation, so
+    AIService can build prompts without a message query on the hot path.
+    Mutations of a chat that is being loaded bump its version, which stops
+    the in-flight load from caching rows that were read before the write.
+    Other processes drop their copy of a chat it writes to, through the
+    invalidation bus.
+    """
+
+    def __init__(self):
+        self._chats: "OrderedDict[UUID, ChatTranscript]" = OrderedDict()
+        self._message_chats: Dict[UUID, UUID] = {}
+        # Only tracked while a load is in flight: chat_id -> [pending loads, version]
+        self._loads: Dict[UUID, List[int]] = {}
+        self._total_bytes = 0
+        invalidation_bus.subscribe("conversation", self._on_invalidation, self.clear)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    async def get_recent(self, chat_id: UUID, limit: int) -> List[CachedMessage]:
+        """Get the newest `limit` messages of a chat in chronological order"""
+        cached = self._get_cached(chat_id, limit)
+        if cached is not None:
+            return cached
+
+        tail_size = max(limit, settings.cache.CONVERSATION_TAIL_MESSAGES)
+        versions = self._begin_load([chat_id])
+        try:
+            latest = await db.get_latest_records(Message, tail_size, chat_id=chat_id)
+        finally:
+            self._end_load([chat_id])
+        messages = [CachedMessage.from_message(message) for message in reversed(latest)]
+
+        if self._unchanged(versions, chat_id):
+            self._store(chat_id, messages, complete=len(latest) < tail_size)
+
+        return messages[-limit:] if limit else []
+
+    async def get_recent_many(
+        self, chat_ids: List[UUID], limit: int
+    ) -> Dict[UUID, List[CachedMessage]]:
+        """Get the newest `limit` messages of several chats, loading misses in one query"""
+        result: Dict[UUID, List[CachedMessage]] = {}
+        missing = []
+        for chat_id in dict.fromkeys(chat_ids):
+            cached = self._get_cached(chat_id, limit)
+            if cached is None:
+                missing.append(chat_id)
+            else:
+                result[chat_id] = cached
+
+        if not missing:
+            return result
+
+        tail_size = max(limit, settings.cache.CONVERSATION_TAIL_MESSAGES)
+        versions = self._begin_load(missing)
+        try:
+            rows = await db.get_latest_rows_per_group(
+                Message, "chat_id", missing, tail_size
+            )
+        finally:
+            self._end_load(missing)
+
+        loaded: Dict[UUID, List[CachedMessage]] = {chat_id: [] for chat_id in missing}
+        for row in rows:
+            loaded[row["chat_id"]].append(CachedMessage.from_row(row))
+
+        for chat_id, messages in loaded.items():
+            messages.sort(key=lambda entry: entry.created_at)
+            if self._unchanged(versions, chat_id):
+                self._store(chat_id, list(messages), complete=len(messages) < tail_size)
+            result[chat_id] = messages[-limit:] if limit else []
+
+        return result
+
+    def add_messages(self, chat_id: UUID, messages: Iterable[Message]) -> None:
+        """Append newly created messages to a cached chat"""
+        self._bump(chat_id)
+        self._publish(chat_id)
+        transcript = self._chats.get(chat_id)
+        if transcript is None:
+            return
+
+        for message in messages:
+            if message.id in self._message_chats:
+                # Already picked up by the load that populated this chat
+                continue
+            entry = CachedMessage.from_message(message)
+            transcript.messages.append(entry)
+            transcript.size += entry.size
+            self._total_bytes += entry.size
+            self._message_chats[entry.id] = chat_id
+
+        transcript.messages.sort(key=lambda entry: entry.created_at)
+        self._trim(chat_id, transcript)
+        self._evict()
+
+    def update_message(self, message: Message) -> None:
+        """Refresh the content of a cached message"""
+        self._bump(message.chat_id)
+        self._publish(message.chat_id)
+        chat_id = self._message_chats.get(message.id)
+        if chat_id is None:
+            return
+
+        transcript = self._chats[chat_id]
+        for index, entry in enumerate(transcript.messages):
+            if entry.id == message.id:
+                updated = CachedMessage.from_message(message)
+                transcript.messages[index] = updated
+                transcript.size += updated.size - entry.size
+                self._total_bytes += updated.size - entry.size
+                break
+        self._evict()
+
+    def remove_message(self, message_id: UUID, chat_id: Optional[UUID] = None) -> None:
+        """Drop a deleted message from its cached chat"""
+        cached_chat_id = self._message_chats.pop(message_id, None)
+        # A load may be in flight even while the chat is cached (requests for
+        # a longer tail than the cached one reload it)
+        self._bump(cached_chat_id or chat_id)
+        self._publish(cached_chat_id or chat_id)
+        if cached_chat_id is None:
+            return
+
+        transcript = self._chats[cached_chat_id]
+        for index, entry in enumerate(transcript.messages):
+            if entry.id == message_id:
+                del transcript.messages[index]
+                transcript.size -= entry.size
+                self._total_bytes -= entry.size
+                break
+
+    def invalidate(self, chat_id: UUID) -> None:
+        """Drop a chat entirely (e.g. when the chat is deleted)"""
+        self._bump(chat_id)
+        self._drop(chat_id)
+        self._publish(chat_id)
+
+    def clear(self) -> None:
+        """Drop all cached chats"""
+        for load in self._loads.values():
+            load[1] += 1
+        self._chats.clear()
+        self._message_chats.clear()
+        self._total_bytes = 0
+
+    def _on_invalidation(self, data: dict) -> None:
+        """Another process wrote to a chat; reload it on next use"""
+        chat_id = UUID(data["chat_id"])
+        self._bump(chat_id)
+        self._drop(chat_id)
+
+    @staticmethod
+    def _publish(chat_id: Optional[UUID]) -> None:
+        if chat_id is not None:
+            invalidation_bus.publish("conversation", chat_id=chat_id)
+
+    def _get_cached(self, chat_id: UUID, limit: int) -> Optional[List[CachedMessage]]:
+        """Serve a request from memory if the cached tail covers it"""
+        transcript = self._get_fresh(chat_id)
+        if transcript and (transcript.complete or len(transcript.messages) >= limit):
+            self._chats.move_to_end(chat_id)
+            return transcript.messages[-limit:] if limit else []
+        return None
+
+    def _begin_load(self, chat_ids: List[UUID]) -> Dict[UUID, Tuple[List[int], int]]:
+        """Register in-flight loads; returns the load state and its start version"""
+        versions = {}
+        for chat_id in chat_ids:
+            load = self._loads.setdefault(chat_id, [0, 0])
+            load[0] += 1
+            versions[chat_id] = (load, load[1])
+        return versions
+
+    @staticmethod
+    def _unchanged(versions: Dict[UUID, Tuple[List[int], int]], chat_id: UUID) -> bool:
+        """Whether no write touched the chat while it was being loaded"""
+        load, start_version = versions[chat_id]
+        return load[1] == start_version
+
+    def _end_load(self, chat_ids: List[UUID]) -> None:
+        for chat_id in chat_ids:
+            load = self._loads.get(chat_id)
+            if load is None:
+                continue
+            load[0] -= 1
+            if not load[0]:
+                del self._loads[chat_id]
+
+    def _get_fresh(self, chat_id: UUID) -> Optional[ChatTranscript]:
+        transcript = self._chats.get(chat_id)
+        if transcript and transcript.expires_at <= time.monotonic():
+            self._drop(chat_id)
+            return None
+        return transcript
+
+    def _store(self, chat_id: UUID, messages: List[CachedMessage], complete: bool) -> None:
+        self._drop(chat_id)
+        transcript = ChatTranscript(
+            messages=messages,
+            complete=complete,
+            expires_at=time.monotonic() + settings.cache.CONVERSATION_TTL_SECONDS,
+        )
+        self._chats[chat_id] = transcript
+        self._total_bytes += transcript.size
+        for entry in messages:
+            self._message_chats[entry.id] = chat_id
+        self._evict()
+
+    def _trim(self, chat_id: UUID, transcript: ChatTranscript) -> None:
+        """Keep a cached tail within the configured message count"""
+        excess = len(transcript.messages) - settings.cache.CONVERSATION_TAIL_MESSAGES
+        if excess <= 0:
+            return
+        for entry in transcript.messages[:excess]:
+            transcript.size -= entry.size
+            self._total_bytes -= entry.size
+            self._message_chats.pop(entry.id, None)
+        del transcript.messages[:excess]
+        transcript.complete = False
+
+    def _evict(self) -> None:
+        """Evict least recently used chats until within the byte budget"""
+        while self._chats and self._total_bytes > settings.cache.CONVERSATION_MAX_BYTES:
+            chat_id = next(iter(self._chats))
+            self._drop(chat_id)
+
+    def _drop(self, chat_id: UUID) -> None:
+        transcript = self._chats.pop(chat_id, None)
+        if transcript is None:
+            return
+        self._total_bytes -= transcript.size
+        for entry in transcript.messages:
+            self._message_chats.pop(entry.id, None)
+
+    def _bump(self, chat_id: Optional[UUID]) -> None:
+        load = self._loads.get(chat_id)
+        if load is not None:
+            load[1] += 1
+
+
+conversation_cache = ConversationCache()
@@ -0,0 +1,120 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from common.database import db
+from common.settings import settings
+
+CountKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class CountService:
+    """Total counts for paginated listings without a full COUNT(*) per page.
+
+    Up to CACHE_COUNT_EXACT_THRESHOLD the count is exact and cheap: the
+    query stops after threshold + 1 rows. Beyond that the last exact count
+    is served from cache, or on a miss the planner's estimate while an exact
+    count is refreshed in the background. Those larger counts are reported as
+    approximate. The message and chat services adjust the cached totals of
+    the listings they write to by the number of rows added or removed (a
+    busy listing would otherwise be recounted after every write), and
+    invalidate them when that number isn't known. A TTL covers writes made
+    by other processes.
+    """
+
+    def __init__(self):
+        # key -> (expires_at, count)
+        self._counts: "OrderedDict[CountKey, Tuple[float, int]]" = OrderedDict()
+        # Keys with an exact count running; invalidation drops the token so a
+        # refresh that started before the write doesn't store its result
+        self._refreshing: Dict[CountKey, object] = {}
+        self._tasks: set = set()
+        self.exact = 0
+        self.cached = 0
+        self.estimated = 0
+
+    async def count(self, model_class, **filters) -> Tuple[int, bool]:
+        """Total of matching records and whether it is approximate"""
+        threshold = settings.cache.COUNT_EXACT_THRESHOLD
+        key = self._key(model_class, filters)
+
+        entry = self._counts.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._counts.move_to_end(key)
+            self.cached += 1
+            return entry[1], True
+
+        total = await db.count_records_capped(model_class, threshold + 1, **filters)
+        if total <= threshold:
+            self.exact += 1
+            return total, False
+
+        if key not in self._refreshing:
+            token = self._refreshing[key] = object()
+            self._spawn(self._refresh(key, token, model_class, filters))
+        try:
+            estimate = await db.estimate_records_count(model_class, **filters)
+        except Exception as e:
+            print(f"Error estimating count: {e}")
+            estimate = 0
+        self.estimated += 1
+        # The capped count is a lower bound the estimate can't contradict
+        return max(estimate, total), True
+
+    def adjust(self, model_class, delta: int, **filters) -> None:
+        """Add a known change to the cached total of one listing after a write"""
+        key = self._key(model_class, filters)
+        entry = self._counts.get(key)
+        if entry is not None:
+            self._counts[key] = (entry[0], max(entry[1] + delta, 0))
+
+    def invalidate(self, model_class, **filters) -> None:
+        """Drop the cached total of one listing after a write to it"""
+        key = self._key(model_class, filters)
+        self._counts.pop(key, None)
+        self._refreshing.pop(key, None)
+
+    def metrics(self) -> dict:
+        return {
+            "entries": len(self._counts),
+            "exact": self.exact,
+            "cached": self.cached,
+            "estimated": self.estimated,
+        }
+
+    async def shutdown(self) -> None:
+        """Cancel background refreshes"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, key: CountKey, token: object, model_class, filters: dict) -> None:
+        try:
+            total = await db.count_records(model_class, **filters)
+        except Exception as e:
+            print(f"Error refreshing count: {e}")
+            total = None
+        if self._refreshing.get(key) is not token:
+            return
+        del self._refreshing[key]
+        if total is None:
+            return
+
+        self._counts[key] = (time.monotonic() + settings.cache.COUNT_TTL_SECONDS, total)
+        self._counts.move_to_end(key)
+        while len(self._counts) > settings.cache.COUNT_MAX_ENTRIES:
+            self._counts.popitem(last=False)
+
+    @staticmethod
+    def _key(model_class, filters: dict) -> CountKey:
+        return model_class.__name__, tuple(sorted((k, str(v)) for k, v in filters.items()))
+
+
+count_service = CountService()
@@ -0,0 +1,140 @@
+import asyncio
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+from uuid import UUID
+
+from common.database import db
+from common.settings import settings
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Column order of CSV exports; importable again with the csv ingest format
+CSV_FIELDS = [
+    "chat_id",
+    "chat_name",
+    "id",
+    "role",
+    "content",
+    "is_ai_generated",
+    "created_at",
+]
+
+
+class ExportService:
+    """Streams chat histories out as NDJSON or CSV.
+
+    Messages are read through a server-side cursor in (chat, created_at, id)
+    order and encoded into blocks of about EXPORT_FLUSH_BYTES, optionally
+    gzip-compressed on the fly, so memory stays constant however large the
+    export. Each export reads on its own database connection, so a slow
+    download never holds one of the pool's; at most EXPORT_MAX_CONCURRENT
+    run at once and the others wait for a slot.
+    """
+
+    def __init__(self):
+        self._slots = asyncio.Semaphore(settings.export.MAX_CONCURRENT)
+
+    def export(
+        self,
+        format: str,
+        chat_ids: Optional[List[UUID]] = None,
+        user_id: Optional[UUID] = None,
+        company_id: Optional[UUID] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        compress: bool = False,
+    ) -> AsyncIterator[bytes]:
+        """Encoded messages of chats matching all given scopes"""
+        rows = self._rows(chat_ids, user_id, company_id, start, end)
+        blocks = self._encode(rows, format)
+        return self._gzip(blocks) if compress else blocks
+
+    async def _rows(
+        self,
+        chat_ids: Optional[List[UUID]],
+        user_id: Optional[UUID],
+        company_id: Optional[UUID],
+        start: Optional[datetime],
+        end: Optional[datetime],
+    ) -> AsyncIterator[Dict[str, Any]]:
+        conditions, params = [], []
+        if chat_ids is not None:
+            params.append(list(chat_ids))
+            conditions.append(f"m.chat_id = ANY(${len(params)}::uuid[])")
+        if user_id is not None:
+            params.append(user_id)
+            conditions.append(f"c.user_id = ${len(params)}")
+        if company_id is not None:
+            params.append(company_id)
+            conditions.append(f"c.company_id = ${len(params)}")
+        if start is not None:
+            params.append(start)
+            conditions.append(f"m.created_at >= ${len(params)}")
+        if end is not None:
+            params.append(end)
+            conditions.append(f"m.created_at < ${len(params)}")
+
+        query = (
+            "SELECT m.chat_id, c.name AS chat_name, m.id, m.role, m.content, "
+            "m.is_ai_generated, m.created_at "
+            "FROM messages m JOIN chats c ON c.id = m.chat_id"
+        )
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY m.chat_id, m.created_at, m.id"
+
+        async with self._slots:
+            async for row in db.stream_query(
+                query,
+                params,
+                settings.export.CURSOR_PREFETCH,
+                statement_timeout=settings.export.STATEMENT_TIMEOUT_SECONDS,
+                idle_timeout=settings.export.IDLE_TIMEOUT_SECONDS,
+            ):
+                yield row
+
+    async def _encode(
+        self, rows: AsyncIterator[Dict[str, Any]], format: str
+    ) -> AsyncIterator[bytes]:
+        buffer = io.StringIO()
+        writer = None
+        if format == "csv":
+            writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+
+        async for row in rows:
+            row = {
+                **row,
+                "chat_id": str(row["chat_id"]),
+                "id": str(row["id"]),
+                "created_at": row["created_at"].isoformat(),
+            }
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row))
+                buffer.write("\n")
+
+            if buffer.tell() >= settings.export.FLUSH_BYTES:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+    @staticmethod
+    async def _gzip(blocks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+        async for block in blocks:
+            compressed = compressor.compress(block)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+
+export_service = ExportService()
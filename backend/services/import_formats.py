@@ -0,0 +1,195 @@
+"""Incremental parsers for uploaded conversation archives.
+
+Each parser takes the upload as an async iterator of byte chunks and yields
+`(row, error)` pairs: a dict shaped like MessageImportItem, or an error for
+input that couldn't be read as a row. Only one line (or one JSON message)
+is held in memory at a time.
+"""
+import csv
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from common.settings import settings
+from models.message import MessageRole
+
+ParsedRow = Tuple[Optional[dict], Optional[str]]
+
+# Header names CRM exports use for each import field
+CSV_COLUMNS = {
+    "content": ("content", "message", "text", "body"),
+    "role": ("role", "direction", "sender_type"),
+    "created_at": ("created_at", "timestamp", "date", "sent_at", "time"),
+    "is_ai_generated": ("is_ai_generated",),
+}
+
+# Direction values CRMs use, as seen from the business
+ROLE_ALIASES = {
+    "inbound": MessageRole.CLIENT,
+    "incoming": MessageRole.CLIENT,
+    "customer": MessageRole.CLIENT,
+    "contact": MessageRole.CLIENT,
+    "outbound": MessageRole.MANAGER,
+    "outgoing": MessageRole.MANAGER,
+    "agent": MessageRole.MANAGER,
+}
+
+FORMATS = ("ndjson", "csv", "instagram")
+
+
+class ImportFormatError(ValueError):
+    """The upload can't be parsed in the requested format"""
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into decoded lines of bounded length"""
+    max_bytes = settings.imports.MAX_LINE_BYTES
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig", errors="replace").rstrip("\r")
+        if len(buffer) > max_bytes:
+            raise ImportFormatError(f"Line longer than {max_bytes} bytes")
+    if buffer:
+        yield buffer.decode("utf-8-sig", errors="replace").rstrip("\r")
+
+
+async def parse_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[ParsedRow]:
+    """One MessageImportItem JSON object per line"""
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line), None
+        except json.JSONDecodeError as e:
+            yield None, f"Invalid JSON: {e.msg}"
+
+
+async def parse_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[ParsedRow]:
+    """CSV with a header row, as exported by CRMs.
+
+    Columns are matched by common names (see CSV_COLUMNS) and inbound/
+    outbound directions map to client/manager roles.
+    """
+    header = None
+    record = ""
+    async for line in iter_lines(chunks):
+        # A quoted field may span lines; a record is complete once its
+        # quotes are balanced
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+
+        values = next(csv.reader([text]))
+        if header is None:
+            header = _csv_header(values)
+            continue
+        yield _csv_row(header, values), None
+
+    if record:
+        yield None, "Unterminated quoted field at end of file"
+
+
+def _csv_header(values) -> Dict[str, int]:
+    positions = {name.strip().lower(): i for i, name in enumerate(values)}
+    header = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in positions:
+                header[field] = positions[alias]
+                break
+    if "content" not in header or "role" not in header:
+        raise ImportFormatError("CSV header needs content and role (or direction) columns")
+    return header
+
+
+def _csv_row(header: Dict[str, int], values) -> dict:
+    row = {field: values[i] for field, i in header.items() if i < len(values)}
+    role = row.get("role", "").strip().lower()
+    row["role"] = ROLE_ALIASES.get(role, role)
+    if not row.get("created_at"):
+        row.pop("created_at", None)
+    if "is_ai_generated" in row:
+        row["is_ai_generated"] = row["is_ai_generated"].strip().lower() in ("1", "true", "yes")
+    return row
+
+
+class _ChunkReader:
+    """File-like adapter over byte chunks for ijson's async parser"""
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks.__aiter__()
+        self._buffer = b""
+
+    async def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += await self._chunks.__anext__()
+            except StopAsyncIteration:
+                break
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+async def parse_instagram(
+    chunks: AsyncIterator[bytes], manager_name: Optional[str]
+) -> AsyncIterator[ParsedRow]:
+    """A thread file (message_N.json) from Instagram's "Download your information".
+
+    Messages sent by `manager_name` are manager messages, all others client
+    messages. Messages without text (media, reactions) are rejected.
+    """
+    if not manager_name:
+        raise ImportFormatError("manager_name is required for Instagram exports")
+    try:
+        import ijson
+    except ImportError:
+        raise ImportFormatError("Instagram import requires the ijson package") from None
+
+    async for message in ijson.items_async(_ChunkReader(chunks), "messages.item"):
+        content = message.get("content")
+        if not isinstance(content, str):
+            yield None, "Message has no text content"
+            continue
+
+        row = {
+            "content": _fix_instagram_text(content),
+            "role": (
+                MessageRole.MANAGER
+                if message.get("sender_name") == manager_name
+                else MessageRole.CLIENT
+            ),
+        }
+        if message.get("timestamp_ms") is not None:
+            row["created_at"] = datetime.fromtimestamp(
+                int(message["timestamp_ms"]) / 1000, tz=timezone.utc
+            )
+        yield row, None
+
+
+def _fix_instagram_text(text: str) -> str:
+    """Instagram exports UTF-8 text escaped as Latin-1 code points"""
+    try:
+        return text.encode("latin-1").decode("utf-8")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return text
+
+
+def parse_upload(
+    format: str, chunks: AsyncIterator[bytes], manager_name: Optional[str] = None
+) -> AsyncIterator[ParsedRow]:
+    """Parser for an upload format"""
+    if format == "ndjson":
+        return parse_ndjson(chunks)
+    if format == "csv":
+        return parse_csv(chunks)
+    if format == "instagram":
+        return parse_instagram(chunks, manager_name)
+    raise ImportFormatError(f"Unknown import format: {format}")
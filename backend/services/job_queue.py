@@ -0,0 +1,325 @@
+import asyncio
+import json
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from uuid import UUID
+
+from common.redis import get_redis
+from common.settings import settings
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class JobKind(str, Enum):
+    GENERATE = "generate"
+    REVISE = "revise"
+    # Uploads ingested by the API request itself; tracked for progress only
+    IMPORT = "import"
+
+
+FINISHED_STATUSES = (JobStatus.COMPLETED, JobStatus.FAILED)
+
+# How often the in-memory backend drops expired job records
+PRUNE_INTERVAL_SECONDS = 60
+
+
+@dataclass
+class Job:
+    kind: JobKind
+    payload: Dict[str, Any]
+    user_id: str
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    status: JobStatus = JobStatus.QUEUED
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    updated_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, raw: str) -> "Job":
+        data = json.loads(raw)
+        data["kind"] = JobKind(data["kind"])
+        data["status"] = JobStatus(data["status"])
+        return cls(**data)
+
+
+class InMemoryJobBackend:
+    """Single-process backend for tests and local runs"""
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._jobs: Dict[str, Job] = {}
+        self._expires: Dict[str, float] = {}
+        self._events: Dict[str, asyncio.Event] = {}
+        self._pruned_at = time.monotonic()
+
+    async def enqueue(self, job: Job) -> None:
+        await self.save(job)
+        await self._queue.put(job.id)
+
+    async def dequeue(self, timeout: float) -> Optional[Job]:
+        # Idle workers poll here, so records expire without new submissions
+        self._prune()
+        try:
+            job_id = await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self._jobs.get(job_id)
+
+    async def save(self, job: Job) -> None:
+        self._prune()
+        self._jobs[job.id] = job
+        self._expires[job.id] = time.monotonic() + settings.jobs.RESULT_TTL_SECONDS
+        if job.finished:
+            self._events.setdefault(job.id, asyncio.Event()).set()
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        event = self._events.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._jobs.get(job_id)
+
+    async def close(self) -> None:
+        pass
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        if now - self._pruned_at < PRUNE_INTERVAL_SECONDS:
+            return
+        self._pruned_at = now
+        for job_id in [job_id for job_id, expires in self._expires.items() if expires <= now]:
+            if self._jobs[job_id].finished:
+                self._jobs.pop(job_id, None)
+                self._expires.pop(job_id, None)
+                self._events.pop(job_id, None)
+
+
+class RedisJobBackend:
+    """Shared backend on Redis: a list as the queue, one key per job and a
+    pub/sub channel per job for completion notifications.
+
+    Delivery is at most once: a job taken by a worker that crashes is lost
+    and stays `running` until its record expires.
+    """
+
+    QUEUE_KEY = "jobs:queue"
+
+    def __init__(self):
+        self._redis = get_redis()
+
+    async def enqueue(self, job: Job) -> None:
+        await self.save(job)
+        await self._redis.lpush(self.QUEUE_KEY, job.id)
+
+    async def dequeue(self, timeout: float) -> Optional[Job]:
+        item = await self._redis.brpop(self.QUEUE_KEY, timeout=max(1, int(timeout)))
+        if item is None:
+            return None
+        return await self.get(item[1])
+
+    async def save(self, job: Job) -> None:
+        await self._redis.set(
+            self._job_key(job.id), job.to_json(), ex=settings.jobs.RESULT_TTL_SECONDS
+        )
+        if job.finished:
+            await self._redis.publish(self._channel(job.id), job.status.value)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        raw = await self._redis.get(self._job_key(job_id))
+        return Job.from_json(raw) if raw else None
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        pubsub = self._redis.pubsub()
+        # Subscribe before reading the job so a completion in between isn't missed
+        await pubsub.subscribe(self._channel(job_id))
+        try:
+            job = await self.get(job_id)
+            if job is None or job.finished:
+                return job
+
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=deadline - time.monotonic(),
+                )
+                if message is not None:
+                    break
+            return await self.get(job_id)
+        finally:
+            await pubsub.unsubscribe(self._channel(job_id))
+            await pubsub.close()
+
+    async def close(self) -> None:
+        # The shared client is closed on application shutdown
+        pass
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"jobs:{job_id}"
+
+    @staticmethod
+    def _channel(job_id: str) -> str:
+        return f"jobs:{job_id}:events"
+
+
+JobHandler = Callable[[Job], Awaitable[Dict[str, Any]]]
+
+
+class JobQueue:
+    """Background execution of AI generation and revision.
+
+    The API submits a job and returns immediately; workers (in the API
+    process or in worker.py) run the registered handler and store its result
+    or error on the job record.
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._handlers: Dict[JobKind, JobHandler] = {}
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            if settings.jobs.BACKEND == "redis":
+                self._backend = RedisJobBackend()
+            else:
+                self._backend = InMemoryJobBackend()
+        return self._backend
+
+    def register(self, kind: JobKind, handler: JobHandler) -> None:
+        """Register the coroutine that executes jobs of a kind"""
+        self._handlers[kind] = handler
+
+    async def submit(self, kind: JobKind, payload: Dict[str, Any], user_id: UUID) -> Job:
+        """Queue a job and return it in `queued` state"""
+        job = Job(kind=kind, payload=payload, user_id=str(user_id))
+        await self.backend.enqueue(job)
+        return job
+
+    async def track(self, kind: JobKind, payload: Dict[str, Any], user_id: UUID) -> Job:
+        """Record work running outside the queue so its progress can be polled"""
+        job = Job(kind=kind, payload=payload, user_id=str(user_id), status=JobStatus.RUNNING)
+        await self.backend.save(job)
+        return job
+
+    async def report(self, job: Job, result: Dict[str, Any]) -> None:
+        """Store the intermediate result of a tracked job"""
+        job.result = result
+        job.updated_at = datetime.now(timezone.utc).isoformat()
+        await self.backend.save(job)
+
+    async def finish(
+        self, job: Job, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None
+    ) -> None:
+        """Complete a tracked job, failed if an error is given"""
+        status = JobStatus.FAILED if error else JobStatus.COMPLETED
+        await self._finish(job, status, result=result, error=error)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await self.backend.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """Wait up to `timeout` seconds for a job to finish"""
+        return await self.backend.wait(job_id, timeout)
+
+    async def start(self, concurrency: int) -> None:
+        """Start worker tasks in this process"""
+        self._workers = [
+            asyncio.create_task(self._worker_loop()) for _ in range(concurrency)
+        ]
+
+    async def stop(self) -> None:
+        """Stop workers and release the backend"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._backend is not None:
+            await self._backend.close()
+            self._backend = None
+
+    async def _worker_loop(self) -> None:
+        while True:
+            try:
+                job = await self.backend.dequeue(timeout=5)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error dequeuing job: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            if job is None:
+                continue
+            try:
+                await self._execute(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Storing the job state failed (backend down); keep the worker alive
+                print(f"Error executing {job.kind.value} job {job.id}: {e}")
+                await asyncio.sleep(1)
+
+    async def _execute(self, job: Job) -> None:
+        handler = self._handlers.get(job.kind)
+        if handler is None:
+            await self._finish(job, JobStatus.FAILED, error=f"No handler for {job.kind.value} jobs")
+            return
+
+        job.status = JobStatus.RUNNING
+        job.updated_at = datetime.now(timezone.utc).isoformat()
+        await self.backend.save(job)
+
+        try:
+            result = await handler(job)
+        except asyncio.CancelledError:
+            await self._finish(job, JobStatus.FAILED, error="Worker shut down")
+            raise
+        except Exception as e:
+            print(f"Error running {job.kind.value} job {job.id}: {e}")
+            await self._finish(job, JobStatus.FAILED, error=str(e) or type(e).__name__)
+            return
+
+        await self._finish(job, JobStatus.COMPLETED, result=result)
+
+    async def _finish(
+        self,
+        job: Job,
+        status: JobStatus,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        job.status = status
+        job.result = result
+        job.error = error
+        job.updated_at = datetime.now(timezone.utc).isoformat()
+        await self.backend.save(job)
+
+
+job_queue = JobQueue()
@@ -0,0 +1,299 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, List, Optional, Tuple, TypeVar
+
+from common.settings import settings
+from services.llm_providers import Completion, LLMProvider, ProviderError
+
+T = TypeVar("T")
+
+# Successful completion latencies kept for the hedging delay estimate
+LATENCY_SAMPLE_SIZE = 200
+
+
+class LLMError(Exception):
+    """Base error for LLM calls that could not be completed"""
+
+
+class LLMUnavailableError(LLMError):
+    """Provider is considered unhealthy; the call was rejected without trying"""
+
+
+class LLMTimeoutError(LLMError):
+    """Call did not complete within its deadline"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient provider errors worth retrying (and counting against health)"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    if isinstance(error, ProviderError):
+        return error.retryable
+    return False
+
+
+class CircuitBreaker:
+    """Fails fast after consecutive provider failures.
+
+    closed -> open after `failure_threshold` failures in a row; open -> half-open
+    after `reset_seconds`, letting a single trial call through; the trial's
+    outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == self.HALF_OPEN:
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if (
+            self.state == self.HALF_OPEN
+            or self.consecutive_failures >= self.failure_threshold
+        ):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def release(self) -> None:
+        """Give up a half-open trial that ended without a health verdict"""
+        self._trial_in_flight = False
+
+
+class ResilientLLMClient:
+    """Deadline, retry, hedging and circuit-breaker policy around a provider.
+
+    Providers make a single attempt per call, so retries are governed here
+    and never outlive the call deadline.
+    """
+
+    def __init__(self, provider: LLMProvider):
+        self.provider = provider
+        self.breaker = CircuitBreaker(
+            settings.llm.CIRCUIT_FAILURE_THRESHOLD, settings.llm.CIRCUIT_RESET_SECONDS
+        )
+        # (recorded_at, seconds) of recent successful attempts
+        self._latencies: Deque[Tuple[float, float]] = deque(maxlen=LATENCY_SAMPLE_SIZE)
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+        self.retries = 0
+
+    async def create_completion(
+        self, deadline_seconds: Optional[float] = None, **params
+    ) -> Completion:
+        """Create a chat completion (non-streaming), possibly hedged"""
+        return await self._call(
+            lambda: self.provider.complete(**params),
+            hedge=settings.llm.HEDGE_ENABLED,
+            deadline_seconds=deadline_seconds,
+            sample=True,
+        )
+
+    async def create_stream(
+        self, deadline_seconds: Optional[float] = None, **params
+    ) -> AsyncIterator[str]:
+        """Open a streaming chat completion and return its content deltas.
+
+        Retries and the deadline cover establishing the stream only; once
+        tokens flow, errors propagate to the consumer, and a stream that goes
+        LLM_STREAM_IDLE_SECONDS without a token fails with LLMTimeoutError.
+        Opening times are not latency samples, which measure whole completions.
+        """
+        stream = await self._call(
+            lambda: self.provider.open_stream(**params),
+            hedge=False,
+            deadline_seconds=deadline_seconds,
+        )
+        return self._idle_bounded(stream)
+
+    async def create_embedding(self, **params) -> List[List[float]]:
+        """Create embeddings for one or more inputs"""
+        return await self._call(lambda: self.provider.embed(**params), hedge=False)
+
+    def metrics(self) -> dict:
+        """Circuit state, latency and retry/hedging counters"""
+        return {
+            "provider": self.provider.name,
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "latency_p95_seconds": self._latency_p95(),
+            "retries": self.retries,
+            "hedged_requests": self.hedged_requests,
+            "hedge_wins": self.hedge_wins,
+        }
+
+    def latency_p95(self, min_samples: int = 0) -> Optional[float]:
+        """Observed p95 latency, or None with fewer than `min_samples` recent calls"""
+        latencies = self._recent_latencies()
+        if not latencies or len(latencies) < min_samples:
+            return None
+        return self._latency_p95()
+
+    async def _call(
+        self,
+        request: Callable[[], Awaitable[T]],
+        hedge: bool,
+        deadline_seconds: Optional[float] = None,
+        sample: bool = False,
+    ) -> T:
+        if not self.breaker.allow():
+            raise LLMUnavailableError("LLM provider is temporarily unavailable")
+
+        deadline = time.monotonic() + (
+            deadline_seconds or settings.llm.CALL_DEADLINE_SECONDS
+        )
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                if hedge:
+                    result = await self._hedged(request, remaining, sample)
+                else:
+                    result = await self._timed(request, remaining, sample)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # Client-side errors say nothing about provider health
+                    self.breaker.release()
+                    raise
+
+                delay = self._backoff(attempt)
+                out_of_time = time.monotonic() + delay >= deadline
+                if attempt >= settings.llm.MAX_RETRIES or out_of_time:
+                    self.breaker.record_failure()
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise LLMTimeoutError("LLM call exceeded its deadline") from e
+                    raise LLMUnavailableError(f"LLM provider error: {e}") from e
+
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    async def _timed(
+        self, request: Callable[[], Awaitable[T]], timeout: float, sample: bool
+    ) -> T:
+        started = time.monotonic()
+        result = await asyncio.wait_for(request(), timeout)
+        if sample:
+            finished = time.monotonic()
+            self._latencies.append((finished, finished - started))
+        return result
+
+    async def _hedged(
+        self, request: Callable[[], Awaitable[T]], timeout: float, sample: bool
+    ) -> T:
+        """Send a second request if the first is slower than the p95 latency"""
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None or hedge_delay >= timeout:
+            return await self._timed(request, timeout, sample)
+
+        deadline = time.monotonic() + timeout
+        primary = asyncio.ensure_future(self._timed(request, timeout, sample))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        self.hedged_requests += 1
+        hedge = asyncio.ensure_future(
+            self._timed(request, deadline - time.monotonic(), sample)
+        )
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _idle_bounded(self, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+        deltas = stream.__aiter__()
+        try:
+            while True:
+                try:
+                    delta = await asyncio.wait_for(
+                        deltas.__anext__(), settings.llm.STREAM_IDLE_SECONDS
+                    )
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError as e:
+                    # A stalled stream counts against provider health
+                    self.breaker.record_failure()
+                    raise LLMTimeoutError("LLM stream stalled") from e
+                yield delta
+        finally:
+            aclose = getattr(deltas, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def _hedge_delay(self) -> Optional[float]:
+        if len(self._recent_latencies()) < settings.llm.HEDGE_MIN_SAMPLES:
+            return None
+        return max(self._latency_p95(), settings.llm.HEDGE_MIN_DELAY_SECONDS)
+
+    def _recent_latencies(self) -> List[float]:
+        """Latency samples within LLM_LATENCY_WINDOW_SECONDS"""
+        cutoff = time.monotonic() - settings.llm.LATENCY_WINDOW_SECONDS
+        while self._latencies and self._latencies[0][0] < cutoff:
+            self._latencies.popleft()
+        return [seconds for _, seconds in self._latencies]
+
+    def _latency_p95(self) -> float:
+        latencies = self._recent_latencies()
+        if not latencies:
+            return 0.0
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        ceiling = min(
+            settings.llm.RETRY_MAX_DELAY_SECONDS,
+            settings.llm.RETRY_BASE_DELAY_SECONDS * (2**attempt),
+        )
+        return random.uniform(0, ceiling)
@@ -0,0 +1,366 @@
+import abc
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Type
+
+import openai
+
+from common.settings import settings
+from common.tokens import count_message_tokens, count_messages_tokens, count_tokens
+
+
+class ProviderError(Exception):
+    """Provider call failed; `retryable` marks transient failures"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retryable: bool = False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+
+    @classmethod
+    def from_status(cls, status_code: int, message: str) -> "ProviderError":
+        retryable = status_code in (408, 409, 429) or status_code >= 500
+        return cls(message, status_code, retryable)
+
+    @classmethod
+    def connection(cls, message: str) -> "ProviderError":
+        return cls(message, None, True)
+
+
+@dataclass
+class Completion:
+    """Provider-neutral chat completion"""
+
+    choices: List[str]
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Prompt tokens served from the provider's prefix cache
+    cached_tokens: int = 0
+
+
+class LLMProvider(abc.ABC):
+    """Chat completion, streaming and embedding calls against one backend.
+
+    Implementations make a single attempt per call and raise ProviderError;
+    deadlines, retries and health tracking are ResilientLLMClient's job.
+    """
+
+    name = "base"
+
+    @abc.abstractmethod
+    async def complete(
+        self, messages: List[dict], model: str, temperature: float = 1, n: int = 1
+    ) -> Completion:
+        """Run a chat completion with `n` choices"""
+
+    @abc.abstractmethod
+    async def open_stream(
+        self, messages: List[dict], model: str, temperature: float = 1
+    ) -> AsyncIterator[str]:
+        """Start a completion and return an iterator over its content deltas"""
+
+    @abc.abstractmethod
+    async def embed(self, input: List[str], model: str) -> List[List[float]]:
+        """Embed each input text"""
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI API or any OpenAI-compatible server (LLM_BASE_URL)"""
+
+    name = "openai"
+
+    def __init__(self):
+        # Retries are governed by the resilient client, within the call deadline
+        self.client = openai.AsyncOpenAI(
+            api_key=settings.llm.API_KEY,
+            base_url=settings.llm.BASE_URL,
+            max_retries=0,
+        )
+
+    async def complete(
+        self, messages: List[dict], model: str, temperature: float = 1, n: int = 1
+    ) -> Completion:
+        try:
+            response = await self.client.chat.completions.create(
+                messages=messages, model=model, temperature=temperature, n=n
+            )
+        except openai.APIError as e:
+            raise self._error(e) from e
+
+        usage = response.usage
+        details = getattr(usage, "prompt_tokens_details", None)
+        return Completion(
+            choices=[choice.message.content or "" for choice in response.choices],
+            model=response.model,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            cached_tokens=(details.cached_tokens or 0) if details else 0,
+        )
+
+    async def open_stream(
+        self, messages: List[dict], model: str, temperature: float = 1
+    ) -> AsyncIterator[str]:
+        try:
+            stream = await self.client.chat.completions.create(
+                messages=messages, model=model, temperature=temperature, stream=True
+            )
+        except openai.APIError as e:
+            raise self._error(e) from e
+        return self._deltas(stream)
+
+    async def _deltas(self, stream) -> AsyncIterator[str]:
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        except openai.APIError as e:
+            raise self._error(e) from e
+
+    async def embed(self, input: List[str], model: str) -> List[List[float]]:
+        try:
+            response = await self.client.embeddings.create(input=input, model=model)
+        except openai.APIError as e:
+            raise self._error(e) from e
+        return [item.embedding for item in response.data]
+
+    @staticmethod
+    def _error(error: openai.APIError) -> ProviderError:
+        if isinstance(error, openai.APIStatusError):
+            return ProviderError.from_status(error.status_code, str(error))
+        if isinstance(error, openai.APIConnectionError):
+            return ProviderError.connection(str(error))
+        return ProviderError(str(error))
+
+
+class AnthropicProvider(LLMProvider):
+    """Anthropic Messages API or a compatible server (LLM_BASE_URL)"""
+
+    name = "anthropic"
+
+    def __init__(self):
+        import anthropic
+
+        self._anthropic = anthropic
+        self.client = anthropic.AsyncAnthropic(
+            api_key=settings.llm.API_KEY,
+            base_url=settings.llm.BASE_URL,
+            max_retries=0,
+        )
+
+    async def complete(
+        self, messages: List[dict], model: str, temperature: float = 1, n: int = 1
+    ) -> Completion:
+        # The Messages API has no `n`; alternatives are requested in parallel
+        responses = await asyncio.gather(
+            *(self._create(messages, model, temperature) for _ in range(n))
+        )
+        usage = responses[0].usage
+        cached_tokens = usage.cache_read_input_tokens or 0
+        return Completion(
+            choices=[
+                "".join(block.text for block in response.content if block.type == "text")
+                for response in responses
+            ],
+            model=responses[0].model,
+            # input_tokens excludes cache reads and writes; report the whole prompt
+            prompt_tokens=(
+                usage.input_tokens + cached_tokens + (usage.cache_creation_input_tokens or 0)
+            ),
+            completion_tokens=sum(response.usage.output_tokens for response in responses),
+            cached_tokens=cached_tokens,
+        )
+
+    async def open_stream(
+        self, messages: List[dict], model: str, temperature: float = 1
+    ) -> AsyncIterator[str]:
+        stream = await self._create(messages, model, temperature, stream=True)
+        return self._deltas(stream)
+
+    async def _deltas(self, stream) -> AsyncIterator[str]:
+        try:
+            async for event in stream:
+                if event.type == "content_block_delta" and event.delta.type == "text_delta":
+                    yield event.delta.text
+        except self._anthropic.APIError as e:
+            raise self._error(e) from e
+
+    async def embed(self, input: List[str], model: str) -> List[List[float]]:
+        raise ProviderError("Anthropic has no embeddings API; set LLM_EMBEDDING_PROVIDER")
+
+    async def _create(self, messages: List[dict], model: str, temperature: float, **params):
+        system, turns = self._split(messages)
+        try:
+            return await self.client.messages.create(
+                model=model,
+                system=system or self._anthropic.NOT_GIVEN,
+                messages=turns,
+                max_tokens=settings.llm.MAX_TOKENS,
+                temperature=min(temperature, 1),
+                **params,
+            )
+        except self._anthropic.APIError as e:
+            raise self._error(e) from e
+
+    @staticmethod
+    def _split(messages: List[dict]) -> Tuple[List[dict], List[dict]]:
+        """System prompt goes in its own field; consecutive turns of a role are merged.
+
+        Each system message is its own block and the first (the configuration
+        prefix) is marked cacheable, since Anthropic only caches on request.
+        """
+        system = [
+            {"type": "text", "text": m["content"]} for m in messages if m["role"] == "system"
+        ]
+        if system:
+            system[0]["cache_control"] = {"type": "ephemeral"}
+        turns: List[dict] = []
+        for message in messages:
+            if message["role"] == "system":
+                continue
+            if turns and turns[-1]["role"] == message["role"]:
+                turns[-1]["content"] += "\n\n" + message["content"]
+            else:
+                turns.append({"role": message["role"], "content": message["content"]})
+        if not turns or turns[0]["role"] != "user":
+            turns.insert(0, {"role": "user", "content": "(conversation start)"})
+        return system, turns
+
+    def _error(self, error) -> ProviderError:
+        if isinstance(error, self._anthropic.APIStatusError):
+            return ProviderError.from_status(error.status_code, str(error))
+        if isinstance(error, self._anthropic.APIConnectionError):
+            return ProviderError.connection(str(error))
+        return ProviderError(str(error))
+
+
+# Distinct prompt prefixes the fake provider remembers as cached
+FAKE_PREFIX_CACHE_SIZE = 1000
+
+FAKE_VOCABULARY = (
+    "thank you for reaching out we are happy to help with your request "
+    "the order has been confirmed and will ship within two business days "
+    "please let us know if you have any other questions our team is available "
+    "regarding pricing the standard plan includes support and regular updates"
+).split()
+
+
+class FakeProvider(LLMProvider):
+    """Deterministic offline stand-in for load tests and capacity planning.
+
+    Replies and embeddings depend only on the input, so identical prompts give
+    identical results. Latency follows the configured distribution (FAKE_LLM_*),
+    streams emit one word per interval, and a configurable share of calls
+    fails with an HTTP status or hangs past any deadline. A leading system
+    message seen recently is reported as cached prompt tokens.
+    """
+
+    name = "fake"
+
+    def __init__(self):
+        self.options = settings.fake_llm
+        self._random = random.Random(self.options.SEED)
+        self._prefixes: "OrderedDict[str, None]" = OrderedDict()
+
+    async def complete(
+        self, messages: List[dict], model: str, temperature: float = 1, n: int = 1
+    ) -> Completion:
+        await self._inject_failure()
+        choices = [self._reply(messages, i) for i in range(n)]
+        await asyncio.sleep(self._latency())
+        return Completion(
+            choices=choices,
+            model=model,
+            prompt_tokens=count_messages_tokens(messages),
+            completion_tokens=sum(count_tokens(choice) for choice in choices),
+            cached_tokens=self._cached_tokens(messages),
+        )
+
+    async def open_stream(
+        self, messages: List[dict], model: str, temperature: float = 1
+    ) -> AsyncIterator[str]:
+        await self._inject_failure()
+        await asyncio.sleep(self.options.FIRST_TOKEN_SECONDS)
+        return self._deltas(self._reply(messages, 0))
+
+    async def _deltas(self, reply: str) -> AsyncIterator[str]:
+        for i, word in enumerate(reply.split(" ")):
+            if i:
+                await asyncio.sleep(self.options.TOKEN_INTERVAL_SECONDS)
+            yield word if i == 0 else " " + word
+
+    async def embed(self, input: List[str], model: str) -> List[List[float]]:
+        await self._inject_failure()
+        await asyncio.sleep(self.options.EMBEDDING_LATENCY_SECONDS)
+        return [self._embedding(text) for text in input]
+
+    def _latency(self) -> float:
+        distribution = self.options.LATENCY_DISTRIBUTION
+        if distribution == "constant":
+            return self.options.LATENCY_MEDIAN_SECONDS
+        if distribution == "uniform":
+            return self._random.uniform(
+                self.options.LATENCY_MIN_SECONDS, self.options.LATENCY_MAX_SECONDS
+            )
+        # Lognormal: long right tail like real providers
+        return self._random.lognormvariate(
+            math.log(self.options.LATENCY_MEDIAN_SECONDS), self.options.LATENCY_SIGMA
+        )
+
+    async def _inject_failure(self) -> None:
+        roll = self._random.random()
+        if roll < self.options.ERROR_RATE:
+            raise ProviderError.from_status(self.options.ERROR_STATUS, "Injected fake provider error")
+        if roll < self.options.ERROR_RATE + self.options.HANG_RATE:
+            # Never answers; the caller's deadline has to cut it
+            await asyncio.Event().wait()
+
+    def _cached_tokens(self, messages: List[dict]) -> int:
+        if not messages or messages[0]["role"] != "system":
+            return 0
+        key = hashlib.sha256(messages[0]["content"].encode()).hexdigest()
+        hit = key in self._prefixes
+        self._prefixes[key] = None
+        self._prefixes.move_to_end(key)
+        while len(self._prefixes) > FAKE_PREFIX_CACHE_SIZE:
+            self._prefixes.popitem(last=False)
+        return count_message_tokens(messages[0]) if hit else 0
+
+    def _reply(self, messages: List[dict], index: int) -> str:
+        payload = json.dumps({"messages": messages, "index": index}, sort_keys=True)
+        rng = random.Random(hashlib.sha256(payload.encode()).hexdigest())
+        words = [rng.choice(FAKE_VOCABULARY) for _ in range(self.options.RESPONSE_WORDS)]
+        return " ".join(words).capitalize() + "."
+
+    def _embedding(self, text: str) -> List[float]:
+        """Hashed bag of words, so texts sharing words are similar"""
+        vector = [0.0] * self.options.EMBEDDING_DIMENSIONS
+        for word in re.findall(r"\w+", text.lower()):
+            bucket = int(hashlib.md5(word.encode()).hexdigest(), 16)
+            vector[bucket % len(vector)] += 1.0
+        return vector
+
+
+PROVIDERS: Dict[str, Type[LLMProvider]] = {
+    OpenAIProvider.name: OpenAIProvider,
+    AnthropicProvider.name: AnthropicProvider,
+    FakeProvider.name: FakeProvider,
+}
+
+
+def create_provider(name: str) -> LLMProvider:
+    """Instantiate a provider by its LLM_PROVIDER name"""
+    try:
+        provider_class = PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown LLM provider: {name}") from None
+    return provider_class()
@@ -0,0 +1,236 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import AsyncIterator, Deque, Dict, List, Optional
+from uuid import UUID
+
+from common.settings import settings
+
+# Recent wait samples kept per priority for percentile metrics
+WAIT_SAMPLE_SIZE = 1000
+
+
+class LLMPriority(IntEnum):
+    """Lower value is dispatched first"""
+
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    virtual_finish: float
+    seq: int
+    company_id: Optional[UUID] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+@dataclass
+class _WaitStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    samples: Deque[float] = field(default_factory=lambda: deque(maxlen=WAIT_SAMPLE_SIZE))
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.samples.append(seconds)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "avg_seconds": self.total_seconds / self.count if self.count else 0.0,
+            "max_seconds": self.max_seconds,
+            "p50_seconds": _percentile(ordered, 0.50),
+            "p95_seconds": _percentile(ordered, 0.95),
+        }
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LLMScheduler:
+    """Admission control for outbound LLM calls.
+
+    At most `max_concurrency` calls run at once. Waiting calls are ordered by
+    strict priority (interactive before batch), then by weighted fair
+    queueing across companies: each company advances its own virtual clock
+    by 1/weight per call, so a tenant issuing many calls is interleaved with
+    others instead of starving them. A task's calls can be promoted to a
+    higher priority while they wait, e.g. when a user starts waiting on
+    batch work.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        company_weights: Optional[Dict[str, float]] = None,
+    ):
+        self.max_concurrency = max_concurrency or settings.llm.MAX_CONCURRENCY
+        self.company_weights = (
+            company_weights
+            if company_weights is not None
+            else settings.llm.COMPANY_WEIGHTS
+        )
+        self._active = 0
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._company_finish: Dict[Optional[UUID], float] = {}
+        self._company_active: Dict[Optional[UUID], int] = defaultdict(int)
+        self._company_waiting: Dict[Optional[UUID], int] = defaultdict(int)
+        self._wait_stats: Dict[LLMPriority, _WaitStats] = defaultdict(_WaitStats)
+        # Waiters by the task that queued them, and priorities promised to
+        # tasks that haven't queued yet
+        self._task_waiters: Dict[asyncio.Task, _Waiter] = {}
+        self._promoted: Dict[asyncio.Task, LLMPriority] = {}
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        company_id: Optional[UUID] = None,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+    ) -> AsyncIterator[None]:
+        """Hold one concurrency slot for the duration of an LLM call"""
+        await self.acquire(company_id, priority)
+        try:
+            yield
+        finally:
+            self.release(company_id)
+
+    async def acquire(
+        self,
+        company_id: Optional[UUID] = None,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+    ) -> None:
+        """Wait for a concurrency slot"""
+        task = asyncio.current_task()
+        priority = min(priority, self._promoted.pop(task, priority))
+        virtual_finish = self._stamp(company_id)
+        enqueued_at = time.monotonic()
+
+        if self._active < self.max_concurrency and not self._queue:
+            self._grant(company_id, virtual_finish)
+            self._wait_stats[priority].record(0.0)
+            return
+
+        waiter = _Waiter(
+            priority=int(priority),
+            virtual_finish=virtual_finish,
+            seq=next(self._seq),
+            company_id=company_id,
+            future=asyncio.get_running_loop().create_future(),
+            enqueued_at=enqueued_at,
+        )
+        heapq.heappush(self._queue, waiter)
+        self._company_waiting[company_id] += 1
+        self._task_waiters[task] = waiter
+        # Slots may be free if everything queued ahead was cancelled
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Slot was granted right as the caller went away: hand it on
+                self.release(company_id)
+            else:
+                self._company_waiting[company_id] -= 1
+                if not self._company_waiting[company_id]:
+                    del self._company_waiting[company_id]
+            raise
+        finally:
+            self._task_waiters.pop(task, None)
+
+        self._wait_stats[LLMPriority(waiter.priority)].record(time.monotonic() - enqueued_at)
+
+    def promote(self, task: asyncio.Task, priority: LLMPriority) -> None:
+        """Raise the priority of the LLM call a task is waiting for (or will make)"""
+        if task.done():
+            return
+        waiter = self._task_waiters.get(task)
+        if waiter is None:
+            if task not in self._promoted:
+                task.add_done_callback(lambda done: self._promoted.pop(done, None))
+            self._promoted[task] = min(priority, self._promoted.get(task, priority))
+            return
+        if priority < waiter.priority:
+            waiter.priority = int(priority)
+            heapq.heapify(self._queue)
+
+    def release(self, company_id: Optional[UUID] = None) -> None:
+        """Return a slot and dispatch the next waiter"""
+        self._active -= 1
+        self._company_active[company_id] -= 1
+        if not self._company_active[company_id]:
+            del self._company_active[company_id]
+        self._dispatch()
+
+    def metrics(self) -> dict:
+        """Queue depth and wait-time metrics"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "queue_depth": sum(self._company_waiting.values()),
+            "queue_depth_by_company": {
+                str(company_id): depth
+                for company_id, depth in self._company_waiting.items()
+                if depth
+            },
+            "active_by_company": {
+                str(company_id): active
+                for company_id, active in self._company_active.items()
+            },
+            "wait_time": {
+                priority.name.lower(): stats.snapshot()
+                for priority, stats in self._wait_stats.items()
+            },
+        }
+
+    def _stamp(self, company_id: Optional[UUID]) -> float:
+        """Assign the WFQ virtual finish time for a new call"""
+        weight = self.company_weights.get(str(company_id), 1.0) if company_id else 1.0
+        start = max(self._virtual_time, self._company_finish.get(company_id, 0.0))
+        finish = start + 1.0 / max(weight, 1e-6)
+        self._company_finish[company_id] = finish
+        return finish
+
+    def _grant(self, company_id: Optional[UUID], virtual_finish: float) -> None:
+        self._active += 1
+        self._company_active[company_id] += 1
+        self._virtual_time = max(self._virtual_time, virtual_finish)
+        if not self._queue:
+            # Idle system: forget per-company history so it can't grow unbounded
+            self._company_finish = {
+                cid: finish
+                for cid, finish in self._company_finish.items()
+                if finish > self._virtual_time
+            }
+
+    def _dispatch(self) -> None:
+        while self._queue and self._active < self.max_concurrency:
+            waiter = heapq.heappop(self._queue)
+            if waiter.future.done():
+                # Caller was cancelled while waiting
+                continue
+            self._company_waiting[waiter.company_id] -= 1
+            if not self._company_waiting[waiter.company_id]:
+                del self._company_waiting[waiter.company_id]
+            self._grant(waiter.company_id, waiter.virtual_finish)
+            waiter.future.set_result(None)
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,259 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Set
+from uuid import UUID
+
+import numpy as np
+
+from common.database import db
+from common.settings import settings
+from common.singleflight import SingleFlight
+from models import Chat, Message, MessageEmbedding
+from models.message import MessageRole
+from services.ai_config_service import ai_config_service
+from services.conversation_cache import CachedMessage
+
+# Newest messages of a chat without a stored embedding
+BACKFILL_QUERY = (
+    "SELECT m.id, m.role, m.content, m.created_at FROM messages m "
+    "LEFT JOIN message_embeddings e ON e.message_id = m.id "
+    "WHERE m.chat_id = $1 AND e.id IS NULL AND btrim(m.content) <> '' "
+    "ORDER BY m.created_at DESC LIMIT $2"
+)
+
+
+@dataclass
+class _ChatIndex:
+    """Message embeddings of one chat as a float16 matrix (one unit row per message)"""
+
+    message_ids: List[UUID]
+    vectors: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.message_ids)
+
+    def upsert(self, message_ids: List[UUID], vectors: np.ndarray) -> None:
+        self.remove(set(message_ids))
+        self.message_ids.extend(message_ids)
+        self.vectors = vectors if self.vectors is None else np.vstack([self.vectors, vectors])
+
+    def remove(self, message_ids: Set[UUID]) -> None:
+        drop = [i for i, message_id in enumerate(self.message_ids) if message_id in message_ids]
+        if not drop:
+            return
+        for i in reversed(drop):
+            del self.message_ids[i]
+        self.vectors = np.delete(self.vectors, drop, axis=0) if self.message_ids else None
+
+    def vector_of(self, message_id: UUID) -> Optional[np.ndarray]:
+        try:
+            return self.vectors[self.message_ids.index(message_id)].astype(np.float32)
+        except ValueError:
+            return None
+
+    def top(self, query: np.ndarray, k: int, exclude: Set[UUID], min_score: float) -> List[UUID]:
+        """Most similar messages, best first"""
+        if not len(self):
+            return []
+        # Upcast for the product: float16 keeps memory low, float32 keeps BLAS fast
+        scores = self.vectors.astype(np.float32) @ query
+        for i, message_id in enumerate(self.message_ids):
+            if message_id in exclude:
+                scores[i] = -np.inf
+        best = np.argsort(scores)[::-1][:k]
+        return [self.message_ids[i] for i in best if scores[i] >= min_score]
+
+
+class MessageIndexService:
+    """Per-chat embedding index used to retrieve relevant older messages.
+
+    Only chats whose configuration opts in (AIConfiguration.retrieval) are
+    indexed. Their messages are embedded in the background as they are
+    created or edited; vectors are persisted in message_embeddings and held
+    in memory per chat (LRU) as float16 matrices. At prompt time the latest
+    client message is compared against the rest of the chat with one
+    matrix-vector product, so the recent tail can be complemented by the few
+    older messages that matter. Messages without a vector (from before the
+    opt-in, or imported) are backfilled newest first, at most
+    RETRIEVAL_BACKFILL_MESSAGES each time a chat index is loaded or history
+    is imported.
+    """
+
+    def __init__(self):
+        self._indexes: "OrderedDict[UUID, _ChatIndex]" = OrderedDict()
+        self._loads = SingleFlight()
+        self._tasks: set = set()
+        # Messages whose embedding is being computed, so backfill skips them
+        self._embedding: Set[UUID] = set()
+
+    def index_messages(self, chat_id: UUID, messages: Iterable[Message]) -> None:
+        """Embed new messages of a chat in the background, if it uses retrieval"""
+        messages = [message for message in messages if message.content.strip()]
+        if settings.retrieval.ENABLED and messages:
+            self._spawn(self._index_if_enabled(chat_id, messages))
+
+    def index_import(self, chat_id: UUID) -> None:
+        """Embed the newest messages of an import in the background (bounded batch)"""
+        if settings.retrieval.ENABLED:
+            self._spawn(self._backfill_if_enabled(chat_id))
+
+    def reindex_message(self, message: Message) -> None:
+        """Re-embed an edited message in the background"""
+        self.index_messages(message.chat_id, [message])
+
+    def remove_message(self, message_id: UUID, chat_id: UUID) -> None:
+        """Drop a deleted message (its row is removed by the database cascade)"""
+        index = self._indexes.get(chat_id)
+        if index is not None:
+            index.remove({message_id})
+
+    def forget(self, chat_id: UUID) -> None:
+        """Drop the index of a deleted chat"""
+        self._indexes.pop(chat_id, None)
+
+    async def retrieve(self, chat_id: UUID, recent: List) -> List[Message]:
+        """Older messages most relevant to the latest client message, best first.
+
+        `recent` is the verbatim tail that goes into the prompt anyway; its
+        messages are never returned.
+        """
+        query = next(
+            (message for message in reversed(recent) if message.role == MessageRole.CLIENT),
+            None,
+        )
+        if not settings.retrieval.ENABLED or query is None:
+            return []
+
+        try:
+            index = await self._index(chat_id)
+            exclude = {message.id for message in recent}
+            if len(index) <= len(exclude):
+                return []
+
+            vector = index.vector_of(query.id)
+            if vector is None:
+                vector = (await self._embed([query.content]))[0]
+
+            message_ids = index.top(
+                vector,
+                settings.retrieval.TOP_K,
+                exclude,
+                settings.retrieval.MIN_SCORE,
+            )
+            if not message_ids:
+                return []
+            messages = {m.id: m for m in await db.get_records(Message, id__in=message_ids)}
+            return [messages[message_id] for message_id in message_ids if message_id in messages]
+
+        except Exception as e:
+            print(f"Error retrieving relevant messages: {e}")
+            return []
+
+    async def shutdown(self) -> None:
+        """Cancel background embedding"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _index_if_enabled(self, chat_id: UUID, messages: List[Message]) -> None:
+        if await self._uses_retrieval(chat_id):
+            await self._embed_and_store(chat_id, messages)
+
+    async def _backfill_if_enabled(self, chat_id: UUID) -> None:
+        if await self._uses_retrieval(chat_id):
+            await self._backfill(chat_id)
+
+    @staticmethod
+    async def _uses_retrieval(chat_id: UUID) -> bool:
+        try:
+            chat = await db.get_record_by_id(Chat, chat_id)
+            if not chat:
+                return False
+            resolved = await ai_config_service.resolve(chat.company_id, chat_id)
+        except Exception as e:
+            print(f"Error indexing messages: {e}")
+            return False
+        return resolved.retrieval
+
+    async def _embed_and_store(self, chat_id: UUID, messages: List) -> None:
+        message_ids = [message.id for message in messages]
+        self._embedding.update(message_ids)
+        try:
+            batch_size = settings.retrieval.EMBED_BATCH
+            for start in range(0, len(messages), batch_size):
+                batch = messages[start:start + batch_size]
+                batch_ids = [message.id for message in batch]
+                vectors = await self._embed([message.content for message in batch])
+                vectors = vectors.astype(np.float16)
+
+                # Replace existing rows so edits overwrite the old vector
+                await db.delete_records(MessageEmbedding, message_id__in=batch_ids)
+                await db.create_records(
+                    MessageEmbedding,
+                    [
+                        {"message_id": message_id, "chat_id": chat_id, "embedding": vector.tobytes()}
+                        for message_id, vector in zip(batch_ids, vectors)
+                    ],
+                )
+
+                index = self._indexes.get(chat_id)
+                if index is not None:
+                    index.upsert(batch_ids, vectors)
+
+        except Exception as e:
+            print(f"Error indexing messages: {e}")
+        finally:
+            self._embedding.difference_update(message_ids)
+
+    async def _index(self, chat_id: UUID) -> _ChatIndex:
+        index = self._indexes.get(chat_id)
+        if index is None:
+            index = await self._loads.do(chat_id, lambda: self._load(chat_id))
+            self._indexes[chat_id] = index
+        self._indexes.move_to_end(chat_id)
+        while len(self._indexes) > settings.retrieval.MAX_CHATS:
+            self._indexes.popitem(last=False)
+        return index
+
+    async def _load(self, chat_id: UUID) -> _ChatIndex:
+        """Build a chat index from stored vectors and backfill missing ones in the background"""
+        rows = await db.get_records(MessageEmbedding, chat_id=chat_id)
+        index = _ChatIndex(message_ids=[row.message_id for row in rows])
+        if rows:
+            index.vectors = np.vstack(
+                [np.frombuffer(row.embedding, dtype=np.float16) for row in rows]
+            )
+
+        self._spawn(self._backfill(chat_id))
+        return index
+
+    async def _backfill(self, chat_id: UUID) -> None:
+        """Embed a bounded batch of the newest messages that have no vector yet"""
+        try:
+            rows = await db.fetch_rows(
+                BACKFILL_QUERY, [chat_id, settings.retrieval.BACKFILL_MESSAGES]
+            )
+        except Exception as e:
+            print(f"Error backfilling message index: {e}")
+            return
+        missing = [
+            CachedMessage.from_row(row) for row in rows if row["id"] not in self._embedding
+        ]
+        if missing:
+            await self._embed_and_store(chat_id, missing)
+
+    @staticmethod
+    async def _embed(texts: List[str]) -> np.ndarray:
+        from services.ai_service import ai_service
+
+        return await ai_service.embed_texts(texts)
+
+
+message_index_service = MessageIndexService()
@@ -1,14 +1,37 @@
-from typing import Optional, List, Dict, Any
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 from uuid import UUID
 
+from pydantic import ValidationError
+
 from common.database import db
+from common.pagination import Cursor
+from common.settings import settings
+from common.singleflight import SingleFlight
 from models import Message, Chat
 from models.message import MessageRole
-from schemas.message import MessageCreate, MessageUpdate
-from services.ai_service import ai_service
+from schemas.message import MessageCreate, MessageImportItem, MessageImportReject, MessageUpdate
+from services.ai_service import ChatPrompt, ai_service
+from services.chat_summary_service import chat_summary_service
+from services.conversation_cache import conversation_cache
+from services.count_service import count_service
+from services.job_queue import Job, JobKind, job_queue
+from services.message_index_service import message_index_service
+from services.semantic_cache_service import semantic_cache_service
+from services.speculative_draft_service import speculative_draft_service
+from services.llm_client import LLMError
+from services.llm_scheduler import LLMPriority
+
+# Assigned and given (None if absent) timestamp of the last imported row,
+# carried across the chunks of one import
+ImportPosition = Tuple[datetime, Optional[datetime]]
 
 
 class MessageService:
+    def __init__(self):
+        self._generation_flight = SingleFlight()
+
     async def create_message(self, message_data: MessageCreate) -> Optional[Message]:
         """Create a new message"""
         # Verify chat exists
@@ -16,17 +39,53 @@ class MessageService:
         if not chat:
             return None
         
-        return await db.create_record(Message, **message_data.dict())
+        message = await db.create_record(Message, **message_data.dict())
+        conversation_cache.add_messages(message.chat_id, [message])
+        count_service.adjust(Message, 1, chat_id=message.chat_id)
+        message_index_service.index_messages(message.chat_id, [message])
+        chat_summary_service.schedule(message.chat_id)
+        if message.role == MessageRole.CLIENT:
+            speculative_draft_service.trigger(message.chat_id)
+        else:
+            # A reply written by the manager is an approved answer
+            semantic_cache_service.remember(message)
+        return message
     
     async def create_ai_message(self, chat_id: UUID, content: str) -> Optional[Message]:
         """Create an AI-generated manager message"""
-        return await db.create_record(
+        message = await db.create_record(
             Message,
             content=content,
             role=MessageRole.MANAGER,
             is_ai_generated=True,
             chat_id=chat_id
         )
+        conversation_cache.add_messages(chat_id, [message])
+        count_service.adjust(Message, 1, chat_id=chat_id)
+        message_index_service.index_messages(chat_id, [message])
+        chat_summary_service.schedule(chat_id)
+        return message
+    
+    async def create_ai_messages(self, drafts: List[Tuple[UUID, str]]) -> List[Message]:
+        """Create AI-generated manager messages for several chats in one insert"""
+        messages = await db.create_records(
+            Message,
+            [
+                {
+                    "content": content,
+                    "role": MessageRole.MANAGER,
+                    "is_ai_generated": True,
+                    "chat_id": chat_id,
+                }
+                for chat_id, content in drafts
+            ],
+        )
+        for message in messages:
+            conversation_cache.add_messages(message.chat_id, [message])
+            count_service.adjust(Message, 1, chat_id=message.chat_id)
+            message_index_service.index_messages(message.chat_id, [message])
+            chat_summary_service.schedule(message.chat_id)
+        return messages
     
     async def get_message_by_id(self, message_id: UUID) -> Optional[Message]:
         """Get message by ID"""
@@ -35,47 +94,248 @@ class MessageService:
     async def get_messages_by_chat(
         self, 
         chat_id: UUID, 
-        page: int = 1, 
-        page_size: int = 50
+        cursor: Optional[Cursor] = None,
+        page_size: int = 50,
+        include_total: bool = False
     ) -> Dict[str, Any]:
-        """Get all messages for a chat with pagination"""
-        return await db.get_records_paginated(
+        """Get a page of a chat's messages, oldest first"""
+        result = await db.get_records_keyset(
             Message,
-            page=page,
             page_size=page_size,
-            order_by="created_at",
+            cursor=cursor,
             chat_id=chat_id
         )
+        result["total_count"], result["approximate"] = None, False
+        if include_total:
+            result["total_count"], result["approximate"] = await count_service.count(
+                Message, chat_id=chat_id
+            )
+        return result
     
-    async def update_message(self, message_id: UUID, message_data: MessageUpdate) -> Optional[Message]:
-        """Update message"""
+    async def update_message(
+        self, message_id: UUID, message_data: MessageUpdate, approve: bool = False
+    ) -> Optional[Message]:
+        """Update message; `approve` marks new content as written by a manager"""
         update_data = {k: v for k, v in message_data.dict().items() if v is not None}
         if not update_data:
             return await self.get_message_by_id(message_id)
         
         success = await db.update_record(Message, message_id, **update_data)
         if success:
-            return await self.get_message_by_id(message_id)
+            message = await self.get_message_by_id(message_id)
+            if message:
+                conversation_cache.update_message(message)
+                await chat_summary_service.on_message_changed(message)
+                if "content" in update_data:
+                    message_index_service.reindex_message(message)
+                    if approve:
+                        # A manager editing a reply (including an AI draft) approves it
+                        semantic_cache_service.remember(message)
+            return message
         return None
     
     async def delete_message(self, message_id: UUID) -> bool:
         """Delete message"""
-        return await db.delete_record(Message, message_id)
+        message = await self.get_message_by_id(message_id)
+        if not message:
+            return False
+
+        deleted = await db.delete_record(Message, message_id)
+        if deleted:
+            conversation_cache.remove_message(message_id, message.chat_id)
+            count_service.adjust(Message, -1, chat_id=message.chat_id)
+            semantic_cache_service.forget_message(message_id)
+            message_index_service.remove_message(message_id, message.chat_id)
+            await chat_summary_service.on_message_changed(message)
+        return deleted
+    
+    async def generate_ai_response(
+        self,
+        chat_id: UUID,
+        context_count: int = 10,
+        fresh: bool = False,
+        fast: bool = False
+    ) -> Optional[Message]:
+        """Generate AI response for a chat.
+
+        Concurrent requests for the same chat and the same conversation state
+        (identical prompt) share one LLM call and one inserted message.
+        With `fresh`, pre-generated and cached drafts are skipped.
+        """
+        prompt = await ai_service.build_prompt(chat_id, context_count)
+        if not prompt:
+            return None
+
+        key = (chat_id, prompt.fingerprint, fresh)
+        return await self._generation_flight.do(
+            key, lambda: self._generate_and_store(prompt, fresh, fast)
+        )
     
-    async def generate_ai_response(self, chat_id: UUID, context_count: int = 10) -> Optional[Message]:
-        """Generate AI response for a chat"""
-        # Generate AI response content
-        ai_content = await ai_service.generate_manager_response(chat_id, context_count)
+    async def _generate_and_store(
+        self, prompt: ChatPrompt, fresh: bool = False, fast: bool = False
+    ) -> Optional[Message]:
+        """Generate AI response content for a prompt and persist it"""
+        # Use the pre-generated draft if the conversation hasn't changed since
+        ai_content = None
+        if not fresh:
+            ai_content = await speculative_draft_service.take(prompt.chat_id, prompt.fingerprint)
+        if not ai_content:
+            ai_content = await ai_service.generate_from_prompt(prompt, fresh=fresh, fast=fast)
         if not ai_content:
             return None
         
         # Create AI message
-        return await self.create_ai_message(chat_id, ai_content)
+        return await self.create_ai_message(prompt.chat_id, ai_content)
+    
+    async def generate_ai_candidates(
+        self,
+        chat_id: UUID,
+        context_count: int = 10,
+        candidates_count: int = 3,
+        fresh: bool = False,
+        fast: bool = False
+    ) -> Optional[Tuple[Message, List[str]]]:
+        """Generate several draft candidates in one LLM call.
+
+        The first candidate is persisted as the AI message and all candidates
+        are returned; picking another one is a regular message update.
+        Concurrent identical requests share the call like generate_ai_response.
+        """
+        prompt = await ai_service.build_prompt(chat_id, context_count)
+        if not prompt:
+            return None
+
+        key = (chat_id, prompt.fingerprint, candidates_count, fresh)
+        return await self._generation_flight.do(
+            key,
+            lambda: self._generate_candidates_and_store(prompt, candidates_count, fresh, fast)
+        )
+    
+    async def _generate_candidates_and_store(
+        self,
+        prompt: ChatPrompt,
+        candidates_count: int,
+        fresh: bool = False,
+        fast: bool = False
+    ) -> Optional[Tuple[Message, List[str]]]:
+        """Generate draft candidates for a prompt and persist the first one"""
+        candidates = await ai_service.generate_candidates_from_prompt(
+            prompt, candidates_count, fresh=fresh, fast=fast
+        )
+        if not candidates:
+            return None
+        
+        message = await self.create_ai_message(prompt.chat_id, candidates[0])
+        return message, candidates
+    
+    async def generate_ai_responses_batch(
+        self,
+        user_id: UUID,
+        chat_ids: List[UUID],
+        context_count: int = 10,
+        fresh: bool = False,
+        fast: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Generate AI responses for many chats, yielding per-chat results as they finish.
+
+        Chats, configurations and histories are loaded with set-based queries,
+        LLM calls fan out with bounded concurrency at batch priority, and the
+        drafts finished since the last write are inserted together.
+        """
+        chat_ids = list(dict.fromkeys(chat_ids))
+        chats = await db.get_records(Chat, id__in=chat_ids, user_id=user_id)
+        found = {chat.id for chat in chats}
+        for chat_id in chat_ids:
+            if chat_id not in found:
+                yield {"chat_id": chat_id, "status": "failed", "detail": "Access denied to this chat"}
+        if not chats:
+            return
+
+        prompts = await ai_service.build_prompts(chats, context_count)
+        finished: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(settings.llm.BATCH_CONCURRENCY)
+
+        async def generate(prompt: ChatPrompt):
+            content = None
+            try:
+                async with semaphore:
+                    content = await ai_service.generate_from_prompt(
+                        prompt, LLMPriority.BATCH, fresh=fresh, fast=fast
+                    )
+            except LLMError as e:
+                print(f"Error generating AI response in batch: {e}")
+            await finished.put((prompt.chat_id, content))
+
+        tasks = [asyncio.create_task(generate(prompt)) for prompt in prompts.values()]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                # Wait for one draft, then take everything else already done
+                completed = [await finished.get()]
+                while not finished.empty():
+                    completed.append(finished.get_nowait())
+                remaining -= len(completed)
+
+                drafts = [(chat_id, content) for chat_id, content in completed if content]
+                created = {message.chat_id: message for message in await self.create_ai_messages(drafts)}
+
+                for chat_id, content in completed:
+                    if chat_id in created:
+                        yield {"chat_id": chat_id, "status": "completed", "message": created[chat_id]}
+                    else:
+                        yield {"chat_id": chat_id, "status": "failed", "detail": "Failed to generate AI response"}
+        finally:
+            for task in tasks:
+                task.cancel()
     
+    async def stream_ai_response(
+        self,
+        chat_id: UUID,
+        context_count: int = 10,
+        fresh: bool = False,
+        fast: bool = False
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream AI response for a chat, persisting the final message.
+
+        Yields ("token", str) events while the completion streams, then a single
+        ("message", Message) event once the full draft is saved, or
+        ("error", str) if generation fails.
+        """
+        chunks = []
+        try:
+            prompt = await ai_service.build_prompt(chat_id, context_count)
+            if not prompt:
+                raise ValueError(f"Chat {chat_id} not found")
+
+            # A pre-generated draft for this exact conversation state is sent at once
+            draft = None
+            if not fresh:
+                draft = await speculative_draft_service.take(chat_id, prompt.fingerprint)
+            if draft:
+                chunks.append(draft)
+                yield "token", draft
+            else:
+                async for token in ai_service.stream_from_prompt(prompt, fresh=fresh, fast=fast):
+                    chunks.append(token)
+                    yield "token", token
+        except Exception as e:
+            print(f"Error streaming AI response: {e}")
+            yield "error", "Failed to generate AI response"
+            return
+
+        ai_content = "".join(chunks).strip()
+        if not ai_content:
+            yield "error", "Failed to generate AI response"
+            return
+
+        yield "message", await self.create_ai_message(chat_id, ai_content)
+
     async def revise_message_with_ai(
         self, 
         message_id: UUID, 
-        revision_instructions: str
+        revision_instructions: str,
+        fresh: bool = False,
+        fast: bool = False
     ) -> Optional[Message]:
         """Revise existing message using AI"""
         # Get original message
@@ -84,43 +344,220 @@ class MessageService:
             return None
         
         # Generate revised content
-        revised_content = await ai_service.revise_message_with_ai(message_id, revision_instructions)
+        revised_content = await ai_service.revise_message_with_ai(
+            message_id, revision_instructions, fresh=fresh, fast=fast
+        )
         if not revised_content:
             return None
         
         # Update message with revised content
         return await self.update_message(message_id, MessageUpdate(content=revised_content))
     
-    async def import_messages(self, chat_id: UUID, messages_data: List[dict]) -> List[Message]:
-        """Import multiple messages to a chat"""
-        imported_messages = []
-        
-        for msg_data in messages_data:
+    async def import_messages(
+        self, chat_id: UUID, rows: List[dict], strict: bool = False
+    ) -> Dict[str, Any]:
+        """Import a message history into a chat in bulk.
+
+        Every row is validated up front; invalid rows are reported as rejects
+        (and with `strict` nothing is imported). Valid rows keep their order
+        and timestamps and are written with chunked multi-row inserts in one
+        transaction.
+        """
+        items, rejected = self.validate_import_rows(rows)
+        if strict and rejected:
+            return {"messages": [], "rejected": rejected}
+
+        messages = await self.insert_imported_messages(chat_id, items)
+        return {"messages": messages, "rejected": rejected}
+
+    @staticmethod
+    def validate_import_rows(
+        rows: List[dict], start_index: int = 0
+    ) -> Tuple[List[MessageImportItem], List[MessageImportReject]]:
+        """Split rows into valid items and rejects (indexes from `start_index`)"""
+        items, rejected = [], []
+        for index, row in enumerate(rows, start_index):
             try:
-                # Validate required fields
-                if "content" not in msg_data or "role" not in msg_data:
-                    continue
-                
-                # Ensure role is valid
-                if msg_data["role"] not in [MessageRole.CLIENT, MessageRole.MANAGER]:
-                    continue
-                
-                message = await db.create_record(
-                    Message,
-                    content=msg_data["content"],
-                    role=MessageRole(msg_data["role"]),
-                    is_ai_generated=msg_data.get("is_ai_generated", False),
-                    chat_id=chat_id
+                items.append(MessageImportItem.parse_obj(row))
+            except ValidationError as e:
+                error = "; ".join(
+                    f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}"
+                    for err in e.errors()
                 )
-                
-                if message:
-                    imported_messages.append(message)
-                    
-            except Exception as e:
-                print(f"Error importing message: {e}")
-                continue
-        
-        return imported_messages
+                rejected.append(MessageImportReject(index=index, error=error))
+        return items, rejected
+
+    async def insert_imported_messages(
+        self, chat_id: UUID, items: List[MessageImportItem]
+    ) -> List[Message]:
+        """Write validated import items in one transaction, in their given order"""
+        if not items:
+            return []
+
+        records, _ = self._import_records(chat_id, items, None)
+        messages = await db.bulk_insert(Message, records, settings.imports.CHUNK_ROWS)
+        await self._after_import(
+            chat_id, min(messages, key=lambda message: message.created_at), len(messages)
+        )
+        return messages
+
+    async def ingest_messages(
+        self, chat_id: UUID, rows: AsyncIterator[Tuple[Optional[dict], Optional[str]]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Import a parsed upload of any size, yielding progress per chunk.
+
+        Rows are validated as they arrive and written in IMPORT_CHUNK_ROWS
+        chunks, each in its own transaction, while the next chunk is parsed.
+        At most two chunks and IMPORT_MAX_REPORTED_REJECTS rejects are held
+        in memory. The last progress entry has `done` set.
+        """
+        progress = {"imported": 0, "rejected": 0, "rejects": [], "done": False}
+        batch: List[MessageImportItem] = []
+        pending: Optional[asyncio.Task] = None
+        previous: Optional[ImportPosition] = None
+        earliest: Optional[Message] = None
+
+        async def wait_pending():
+            nonlocal pending, earliest
+            if pending is None:
+                return
+            messages, pending = await pending, None
+            progress["imported"] += len(messages)
+            first = min(messages, key=lambda message: message.created_at)
+            if earliest is None or first.created_at < earliest.created_at:
+                earliest = first
+
+        try:
+            index = 0
+            async for row, error in rows:
+                if error is None:
+                    items, rejected = self.validate_import_rows([row], index)
+                    batch.extend(items)
+                else:
+                    rejected = [MessageImportReject(index=index, error=error)]
+                index += 1
+                progress["rejected"] += len(rejected)
+                room = settings.imports.MAX_REPORTED_REJECTS - len(progress["rejects"])
+                progress["rejects"].extend(rejected[:max(room, 0)])
+
+                if len(batch) >= settings.imports.CHUNK_ROWS:
+                    # Write this chunk while the next one is parsed
+                    await wait_pending()
+                    records, previous = self._import_records(chat_id, batch, previous)
+                    pending = asyncio.create_task(db.bulk_insert(Message, records))
+                    batch = []
+                    yield dict(progress)
+
+            await wait_pending()
+            if batch:
+                records, previous = self._import_records(chat_id, batch, previous)
+                pending = asyncio.create_task(db.bulk_insert(Message, records))
+                await wait_pending()
+        finally:
+            # Rows of a chunk still being written when interrupted aren't counted
+            imported = progress["imported"] if pending is None else None
+            if pending is not None:
+                # Interrupted upload: keep what was already sent
+                await asyncio.gather(pending, return_exceptions=True)
+            if earliest is not None:
+                await self._after_import(chat_id, earliest, imported)
+
+        progress["done"] = True
+        yield progress
+
+    def _import_records(
+        self,
+        chat_id: UUID,
+        items: List[MessageImportItem],
+        previous: Optional[ImportPosition],
+    ) -> Tuple[List[dict], Optional[ImportPosition]]:
+        """Rows to insert for import items and the position of the last one.
+
+        `previous` is the position of the row imported just before these,
+        when a history is written in several chunks.
+        """
+        timestamps, position = self._import_timestamps(items, previous)
+        records = [
+            {
+                "content": item.content,
+                "role": item.role,
+                "is_ai_generated": item.is_ai_generated,
+                "created_at": created_at,
+                "chat_id": chat_id,
+            }
+            for item, created_at in zip(items, timestamps)
+        ]
+        return records, position
+
+    async def _after_import(
+        self, chat_id: UUID, earliest: Message, imported: Optional[int]
+    ) -> None:
+        """Refresh chat state after `imported` messages (None if unknown) were imported"""
+        # Imported history may land before cached or summarized messages
+        conversation_cache.invalidate(chat_id)
+        if imported is None:
+            count_service.invalidate(Message, chat_id=chat_id)
+        else:
+            count_service.adjust(Message, imported, chat_id=chat_id)
+        await chat_summary_service.on_message_changed(earliest)
+        chat_summary_service.schedule(chat_id)
+        speculative_draft_service.trigger(chat_id)
+        # Imports can be any size: embed a bounded batch of the newest messages,
+        # the rest is backfilled as the chat index is loaded
+        message_index_service.index_import(chat_id)
+
+    @staticmethod
+    def _import_timestamps(
+        items: List[MessageImportItem], previous: Optional[ImportPosition]
+    ) -> Tuple[List[datetime], Optional[ImportPosition]]:
+        """Creation times for import rows that keep their relative order.
+
+        Given timestamps are kept (naive ones as UTC). Rows without one, and
+        rows tied with the row before, get the previous time plus a
+        microsecond, since (created_at, id) ordering would shuffle ties.
+        """
+        now = datetime.now(timezone.utc)
+        timestamps = []
+        assigned_before, given_before = previous or (None, None)
+        for item in items:
+            given = item.created_at
+            if given is not None and given.tzinfo is None:
+                given = given.replace(tzinfo=timezone.utc)
+            if given is None or (assigned_before is not None and given == given_before):
+                created_at = (
+                    assigned_before + timedelta(microseconds=1) if assigned_before else now
+                )
+            else:
+                created_at = given
+            timestamps.append(created_at)
+            assigned_before, given_before = created_at, given
+        if assigned_before is None:
+            return timestamps, None
+        return timestamps, (assigned_before, given_before)
+    
+    async def run_generation_job(self, job: Job) -> Dict[str, Any]:
+        """Job handler: generate and persist an AI response"""
+        message = await self.generate_ai_response(
+            UUID(job.payload["chat_id"]),
+            job.payload.get("context_messages_count") or 10,
+            job.payload.get("fresh", False),
+            job.payload.get("fast", False)
+        )
+        if not message:
+            raise ValueError("Failed to generate AI response")
+        return {"message_id": str(message.id)}
+    
+    async def run_revision_job(self, job: Job) -> Dict[str, Any]:
+        """Job handler: revise a message with AI"""
+        message = await self.revise_message_with_ai(
+            UUID(job.payload["message_id"]),
+            job.payload["revision_instructions"],
+            job.payload.get("fresh", False),
+            job.payload.get("fast", False)
+        )
+        if not message:
+            raise ValueError("Failed to revise message with AI")
+        return {"message_id": str(message.id)}
     
     async def check_message_chat_access(self, message_id: UUID, chat_id: UUID) -> bool:
         """Check if message belongs to the specified chat"""
@@ -128,9 +565,11 @@ class MessageService:
         return message is not None and message.chat_id == chat_id
     
     async def get_recent_messages(self, chat_id: UUID, limit: int = 10) -> List[Message]:
-        """Get recent messages for a chat"""
-        messages = await db.get_records(Message, chat_id=chat_id)
-        return messages[-limit:] if len(messages) > limit else messages
+        """Get recent messages for a chat in chronological order"""
+        messages = await db.get_latest_records(Message, limit, chat_id=chat_id)
+        return list(reversed(messages))
 
 
-message_service = MessageService()
\ No newline at end of file
+message_service = MessageService()
+job_queue.register(JobKind.GENERATE, message_service.run_generation_job)
+job_queue.register(JobKind.REVISE, message_service.run_revision_job)
\ No newline at end of file
@@ -0,0 +1,137 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional, Tuple
+from uuid import UUID
+
+from common.settings import settings
+from services.llm_client import LLMError, ResilientLLMClient
+from services.llm_providers import Completion, LLMProvider
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """Model chosen for a call, why, and what to try if it fails"""
+
+    model: str
+    reason: str
+    fallback: Optional[str] = None
+
+
+class ModelRouter:
+    """Picks a model per LLM call and falls back when it fails.
+
+    Rules, in order: the company's tier model (LLM_COMPANY_TIERS /
+    LLM_TIER_MODELS) or LLM_MODEL; then LLM_FAST_MODEL for requests flagged
+    fast, prompts up to LLM_FAST_MAX_PROMPT_TOKENS, or when the chosen model's
+    observed p95 latency exceeds LLM_LATENCY_TARGET_SECONDS. Latency is
+    measured over LLM_LATENCY_WINDOW_SECONDS, so a model routed away from
+    for being slow is tried again once its samples age out. Each model has
+    its own resilient client, so latency and circuit state are tracked per
+    model and an outage of one doesn't block the fallback.
+    """
+
+    def __init__(self, provider: LLMProvider):
+        self.provider = provider
+        self._clients: Dict[str, ResilientLLMClient] = {}
+        self.routes: Counter = Counter()
+        self.fallbacks = 0
+
+    def client(self, model: str) -> ResilientLLMClient:
+        """Resilient client dedicated to a model"""
+        if model not in self._clients:
+            self._clients[model] = ResilientLLMClient(self.provider)
+        return self._clients[model]
+
+    def route(
+        self, prompt_tokens: int, company_id: Optional[UUID] = None, fast: bool = False
+    ) -> ModelRoute:
+        """Choose the model for a prompt"""
+        model, reason = settings.llm.MODEL, "default"
+        tier = settings.llm.COMPANY_TIERS.get(str(company_id)) if company_id else None
+        if tier in settings.llm.TIER_MODELS:
+            model, reason = settings.llm.TIER_MODELS[tier], f"tier:{tier}"
+
+        fast_model = settings.llm.FAST_MODEL
+        if fast_model and fast_model != model:
+            if fast:
+                model, reason = fast_model, "fast"
+            elif prompt_tokens <= settings.llm.FAST_MAX_PROMPT_TOKENS:
+                model, reason = fast_model, "short_prompt"
+            elif self._too_slow(model) and not self._too_slow(fast_model):
+                model, reason = fast_model, "latency"
+
+        fallback = settings.llm.FALLBACK_MODEL
+        return ModelRoute(model, reason, fallback if fallback != model else None)
+
+    async def complete(self, route: ModelRoute, **params) -> Tuple[str, Completion]:
+        """Create a completion with the routed model, or its fallback.
+
+        Returns the model that answered with its completion.
+        """
+        self._count(route)
+        if not route.fallback:
+            completion = await self.client(route.model).create_completion(
+                model=route.model, **params
+            )
+            return route.model, completion
+        try:
+            completion = await self.client(route.model).create_completion(
+                deadline_seconds=settings.llm.FALLBACK_AFTER_SECONDS,
+                model=route.model,
+                **params,
+            )
+            return route.model, completion
+        except LLMError:
+            self._record_fallback()
+            completion = await self.client(route.fallback).create_completion(
+                model=route.fallback, **params
+            )
+            return route.fallback, completion
+
+    async def open_stream(
+        self, route: ModelRoute, **params
+    ) -> Tuple[str, AsyncIterator[str]]:
+        """Open a stream with the routed model, or its fallback if it can't start.
+
+        Returns the model that answered with its content deltas.
+        """
+        self._count(route)
+        if not route.fallback:
+            stream = await self.client(route.model).create_stream(
+                model=route.model, **params
+            )
+            return route.model, stream
+        try:
+            stream = await self.client(route.model).create_stream(
+                deadline_seconds=settings.llm.FALLBACK_AFTER_SECONDS,
+                model=route.model,
+                **params,
+            )
+            return route.model, stream
+        except LLMError:
+            self._record_fallback()
+            stream = await self.client(route.fallback).create_stream(
+                model=route.fallback, **params
+            )
+            return route.fallback, stream
+
+    def metrics(self) -> dict:
+        return {
+            "routes": dict(self.routes),
+            "fallbacks": self.fallbacks,
+            "models": {model: client.metrics() for model, client in self._clients.items()},
+        }
+
+    def _too_slow(self, model: str) -> bool:
+        target = settings.llm.LATENCY_TARGET_SECONDS
+        if target is None or model not in self._clients:
+            return False
+        p95 = self._clients[model].latency_p95(settings.llm.HEDGE_MIN_SAMPLES)
+        return p95 is not None and p95 > target
+
+    def _count(self, route: ModelRoute) -> None:
+        # Counted per call made, not per route() (cache hits route too)
+        self.routes[f"{route.model} ({route.reason})"] += 1
+
+    def _record_fallback(self) -> None:
+        self.fallbacks += 1
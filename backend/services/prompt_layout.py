@@ -0,0 +1,89 @@
+import hashlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional
+
+from common.settings import settings
+from common.tokens import count_message_tokens, count_tokens
+from models import Message
+from models.message import MessageRole
+
+# Distinct configurations whose rendered prefix is kept
+PREFIX_CACHE_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class PromptPrefix:
+    """Leading system message of every prompt built from one configuration.
+
+    `version` changes whenever the rendered content does. The message dict is
+    shared between prompts and must not be mutated.
+    """
+
+    message: dict
+    tokens: int
+    version: str
+
+
+@lru_cache(maxsize=PREFIX_CACHE_SIZE)
+def render_prefix(special_instructions: str, client_description: Optional[str]) -> PromptPrefix:
+    """Render and count the configuration part of the prompt once per version"""
+    content = special_instructions
+    if client_description:
+        content += f"\n\nClient Description: {client_description}"
+    message = {"role": "system", "content": content}
+    return PromptPrefix(
+        message=message,
+        tokens=count_message_tokens(message),
+        version=hashlib.sha256(content.encode()).hexdigest()[:16],
+    )
+
+
+def summary_message(summary: Optional[str]) -> Optional[dict]:
+    """Rolling summary of older messages as its own system message"""
+    if not summary:
+        return None
+    return {"role": "system", "content": f"Conversation summary so far: {summary}"}
+
+
+def retrieved_message(retrieved: List[Message]) -> Optional[dict]:
+    """Relevant older messages (best first) within the retrieval token cap"""
+    selected = []
+    used_tokens = 0
+    for message in retrieved:
+        speaker = "Client" if message.role == MessageRole.CLIENT else "Manager"
+        line = f"{speaker}: {message.content}"
+        line_tokens = count_tokens(line)
+        if used_tokens + line_tokens > settings.retrieval.MAX_TOKENS:
+            continue
+        selected.append((message.created_at, line))
+        used_tokens += line_tokens
+
+    if not selected:
+        return None
+    lines = "\n".join(line for _, line in sorted(selected))
+    return {"role": "system", "content": f"Relevant earlier messages:\n{lines}"}
+
+
+def assemble(
+    prefix: PromptPrefix,
+    summary: Optional[dict],
+    conversation: List[dict],
+    retrieved: Optional[dict],
+) -> List[dict]:
+    """Order prompt parts from most to least shared.
+
+    Providers reuse work for a prompt whose leading tokens match a recent
+    request, so content shared by the most calls goes first: configuration
+    (every chat using it), summary (every call until it is next updated),
+    then history, which only grows at the end between turns. Retrieved
+    messages differ per call, so they go right before the newest message.
+    """
+    messages = [prefix.message]
+    if summary:
+        messages.append(summary)
+    messages.extend(conversation[:-1])
+    if retrieved:
+        messages.append(retrieved)
+    messages.extend(conversation[-1:])
+    return messages
@@ -0,0 +1,130 @@
+import json
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from common.redis import get_redis
+from common.settings import settings
+
+
+class InMemoryResponseCache:
+    """Process-local LRU with per-entry TTL"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[List[str]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, choices: List[str]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, choices)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class RedisResponseCache:
+    """Cache shared by all processes; entries expire by TTL and the size is
+    bounded by the Redis maxmemory policy (allkeys-lru recommended)"""
+
+    PREFIX = "llm-response:"
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, key: str) -> Optional[List[str]]:
+        raw = await get_redis().get(self.PREFIX + key)
+        return json.loads(raw) if raw else None
+
+    async def set(self, key: str, choices: List[str]) -> None:
+        await get_redis().set(self.PREFIX + key, json.dumps(choices), ex=self.ttl_seconds)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class ResponseCache:
+    """Exact-match cache of LLM completions keyed by prompt fingerprint.
+
+    Keys cover the tenant, model, generation parameters and the full message
+    list, so only byte-identical requests hit. Callers that want a new sample
+    pass fresh=True, which skips the lookup but still stores the result.
+    Backend errors are treated as misses so the cache never fails a call.
+    """
+
+    def __init__(self):
+        self._backend = None
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.errors = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            if settings.cache.RESPONSE_BACKEND == "redis":
+                self._backend = RedisResponseCache(settings.cache.RESPONSE_TTL_SECONDS)
+            else:
+                self._backend = InMemoryResponseCache(
+                    settings.cache.RESPONSE_MAX_ENTRIES,
+                    settings.cache.RESPONSE_TTL_SECONDS,
+                )
+        return self._backend
+
+    async def get(self, key: str, fresh: bool = False) -> Optional[List[str]]:
+        """Get cached choices for a fingerprint"""
+        if not settings.cache.RESPONSE_ENABLED:
+            return None
+        if fresh:
+            self.bypasses += 1
+            return None
+
+        try:
+            choices = await self.backend.get(key)
+        except Exception as e:
+            print(f"Response cache error: {e}")
+            self.errors += 1
+            choices = None
+
+        if choices:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return choices
+
+    async def set(self, key: str, choices: List[str]) -> None:
+        """Store choices for a fingerprint"""
+        if not settings.cache.RESPONSE_ENABLED or not choices:
+            return
+        try:
+            await self.backend.set(key, choices)
+        except Exception as e:
+            print(f"Response cache error: {e}")
+            self.errors += 1
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": settings.cache.RESPONSE_BACKEND,
+            "entries": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
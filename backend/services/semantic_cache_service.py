@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+from uuid import UUID
+
+import numpy as np
+
+from common.database import db
+from common.settings import settings
+from common.singleflight import SingleFlight
+from models import Chat, Message, SemanticCacheEntry
+from models.message import MessageRole
+from services.ai_config_service import ai_config_service
+from services.conversation_cache import conversation_cache
+
+# Messages searched backwards for the client question a reply answers
+QUESTION_LOOKBACK_MESSAGES = 20
+
+
+def config_hash(system_prompt: str) -> str:
+    """Hash of the effective configuration a reply was written under"""
+    return hashlib.sha256(system_prompt.encode()).hexdigest()
+
+
+@dataclass
+class _CompanyIndex:
+    """Question embeddings of one company as a unit-row float32 matrix"""
+
+    loaded_at: float
+    reply_ids: List[UUID] = field(default_factory=list)
+    chat_ids: List[UUID] = field(default_factory=list)
+    config_hashes: List[str] = field(default_factory=list)
+    replies: List[str] = field(default_factory=list)
+    vectors: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.reply_ids)
+
+    def add(self, entry: SemanticCacheEntry, vector: np.ndarray) -> None:
+        self.remove(lambda i: self.reply_ids[i] == entry.reply_message_id)
+        self.reply_ids.append(entry.reply_message_id)
+        self.chat_ids.append(entry.chat_id)
+        self.config_hashes.append(entry.config_hash)
+        self.replies.append(entry.reply)
+        row = vector.reshape(1, -1)
+        self.vectors = row if self.vectors is None else np.vstack([self.vectors, row])
+
+        overflow = len(self) - settings.cache.SEMANTIC_MAX_ENTRIES
+        if overflow > 0:
+            self.remove(lambda i: i < overflow)
+
+    def remove(self, predicate) -> None:
+        drop = [i for i in range(len(self)) if predicate(i)]
+        if not drop:
+            return
+        for column in (self.reply_ids, self.chat_ids, self.config_hashes, self.replies):
+            for i in reversed(drop):
+                del column[i]
+        self.vectors = np.delete(self.vectors, drop, axis=0) if len(self) else None
+
+    def search(self, vector: np.ndarray, config: str) -> Optional[tuple]:
+        """Best (score, reply) among entries written under the same configuration"""
+        if not len(self):
+            return None
+        scores = self.vectors @ vector
+        scores[np.asarray(self.config_hashes) != config] = -np.inf
+        best = int(np.argmax(scores))
+        if not np.isfinite(scores[best]):
+            return None
+        return float(scores[best]), self.replies[best]
+
+
+class SemanticCacheService:
+    """Answers near-duplicate client questions with approved manager replies.
+
+    For companies that opted in (AIConfiguration.semantic_cache), every
+    approved reply — a manager message written by hand, or an AI draft the
+    manager edited — is stored with an embedding of the client message it
+    answered. Before generating, the latest client message is embedded and
+    compared against that company's replies written under the same effective
+    configuration; above the similarity threshold the stored reply is used as
+    the draft. Indexes are per company, so replies never cross tenants.
+    """
+
+    def __init__(self):
+        self._indexes: "OrderedDict[UUID, _CompanyIndex]" = OrderedDict()
+        self._loads = SingleFlight()
+        self._pending: set = set()
+        self.hits = 0
+        self.misses = 0
+
+    async def lookup(self, chat_id: UUID, company_id: UUID, messages: List[dict]) -> Optional[str]:
+        """Get an approved reply to a question similar to the latest client message"""
+        if not messages or messages[-1]["role"] != "user":
+            return None
+        try:
+            resolved = await ai_config_service.resolve(company_id, chat_id)
+            if not resolved.semantic_cache:
+                return None
+
+            index = await self._index(company_id)
+            match = None
+            if len(index):
+                vector = await self._embed(messages[-1]["content"])
+                match = index.search(vector, config_hash(resolved.system_prompt))
+        except Exception as e:
+            print(f"Semantic cache lookup error: {e}")
+            return None
+
+        if match and match[0] >= settings.cache.SEMANTIC_THRESHOLD:
+            self.hits += 1
+            return match[1]
+        self.misses += 1
+        return None
+
+    def remember(self, message: Message) -> None:
+        """Record an approved manager reply in the background"""
+        if message.role != MessageRole.MANAGER:
+            return
+        task = asyncio.create_task(self._remember(message))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def forget_message(self, message_id: UUID) -> None:
+        """Drop a deleted reply (its row is removed by the database cascade)"""
+        for index in self._indexes.values():
+            index.remove(lambda i: index.reply_ids[i] == message_id)
+
+    def forget_chat(self, chat_id: UUID) -> None:
+        """Drop the replies of a deleted chat"""
+        for index in self._indexes.values():
+            index.remove(lambda i: index.chat_ids[i] == chat_id)
+
+    def metrics(self) -> dict:
+        return {
+            "companies": len(self._indexes),
+            "entries": sum(len(index) for index in self._indexes.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    async def shutdown(self) -> None:
+        """Cancel pending reply indexing"""
+        tasks = list(self._pending)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _remember(self, message: Message) -> None:
+        try:
+            chat = await db.get_record_by_id(Chat, message.chat_id)
+            if not chat:
+                return
+            resolved = await ai_config_service.resolve(chat.company_id, chat.id)
+            if not resolved.semantic_cache:
+                return
+
+            question = await self._question_for(message)
+            if not question:
+                return
+
+            vector = await self._embed(question)
+            data = dict(
+                company_id=chat.company_id,
+                chat_id=chat.id,
+                config_hash=config_hash(resolved.system_prompt),
+                question=question,
+                reply=message.content,
+                embedding=vector.tobytes(),
+            )
+            entry = await db.get_record_by_field(
+                SemanticCacheEntry, reply_message_id=message.id
+            )
+            if entry:
+                entry = await db.update_record_instance(entry, **data)
+            else:
+                entry = await db.create_record(
+                    SemanticCacheEntry, reply_message_id=message.id, **data
+                )
+
+            index = self._indexes.get(chat.company_id)
+            if index is not None:
+                index.add(entry, vector)
+
+        except Exception as e:
+            print(f"Error recording semantic cache entry: {e}")
+
+    @staticmethod
+    async def _question_for(message: Message) -> Optional[str]:
+        """Client message the reply directly follows, if any"""
+        recent = await conversation_cache.get_recent(
+            message.chat_id, QUESTION_LOOKBACK_MESSAGES
+        )
+        position = next(
+            (i for i, cached in enumerate(recent) if cached.id == message.id), None
+        )
+        if position is None or position == 0:
+            return None
+        previous = recent[position - 1]
+        return previous.content if previous.role == MessageRole.CLIENT else None
+
+    async def _index(self, company_id: UUID) -> _CompanyIndex:
+        index = self._indexes.get(company_id)
+        reload_after = settings.cache.SEMANTIC_RELOAD_SECONDS
+        if index is None or index.loaded_at + reload_after <= time.monotonic():
+            index = await self._loads.do(company_id, lambda: self._load(company_id))
+            self._indexes[company_id] = index
+        self._indexes.move_to_end(company_id)
+        while len(self._indexes) > settings.cache.SEMANTIC_MAX_COMPANIES:
+            self._indexes.popitem(last=False)
+        return index
+
+    @staticmethod
+    async def _load(company_id: UUID) -> _CompanyIndex:
+        """Build a company index from its newest stored entries"""
+        entries = await db.get_latest_records(
+            SemanticCacheEntry, settings.cache.SEMANTIC_MAX_ENTRIES, company_id=company_id
+        )
+        index = _CompanyIndex(loaded_at=time.monotonic())
+        for entry in reversed(entries):
+            index.reply_ids.append(entry.reply_message_id)
+            index.chat_ids.append(entry.chat_id)
+            index.config_hashes.append(entry.config_hash)
+            index.replies.append(entry.reply)
+        if entries:
+            index.vectors = np.vstack(
+                [np.frombuffer(entry.embedding, dtype=np.float32) for entry in reversed(entries)]
+            )
+        return index
+
+    @staticmethod
+    async def _embed(text: str) -> np.ndarray:
+        from services.ai_service import ai_service
+
+        vectors = await ai_service.embed_texts([text])
+        return vectors[0]
+
+
+semantic_cache_service = SemanticCacheService()
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from uuid import UUID
+
+from common.database import db
+from common.settings import settings
+from models import Chat
+from services.llm_scheduler import LLMPriority, llm_scheduler
+
+
+@dataclass
+class _Draft:
+    fingerprint: str
+    task: asyncio.Task
+    expires_at: float
+
+
+class SpeculativeDraftService:
+    """Pre-generates AI drafts when a client message arrives.
+
+    For chats that opted in (AIConfiguration.speculative_drafts), a draft is
+    generated in the background at batch priority and kept against the
+    fingerprint of the prompt it was built from. A later generate request
+    whose prompt has the same fingerprint (nothing changed since) takes the
+    draft instead of calling the LLM, joining it if still in flight (its LLM
+    call is then promoted to interactive priority). Only the newest draft per
+    chat is kept; a newer conversation state cancels the previous one.
+    """
+
+    def __init__(self):
+        self._drafts: "OrderedDict[UUID, _Draft]" = OrderedDict()
+        self._preparing: set = set()
+        self.hits = 0
+        self.misses = 0
+
+    def trigger(self, chat_id: UUID) -> None:
+        """Start pre-generating a draft for the current state of a chat"""
+        task = asyncio.create_task(self._prepare(chat_id))
+        self._preparing.add(task)
+        task.add_done_callback(self._preparing.discard)
+
+    async def take(self, chat_id: UUID, fingerprint: str) -> Optional[str]:
+        """Consume the pre-generated draft if it matches the prompt"""
+        draft = self._drafts.get(chat_id)
+        if (
+            draft is None
+            or draft.fingerprint != fingerprint
+            or draft.expires_at <= time.monotonic()
+        ):
+            self.misses += 1
+            return None
+
+        del self._drafts[chat_id]
+        # Someone is waiting on it now; don't leave it queued behind batch work
+        llm_scheduler.promote(draft.task, LLMPriority.INTERACTIVE)
+        try:
+            content = await asyncio.shield(draft.task)
+        except Exception:
+            content = None
+
+        if content:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return content
+
+    def forget(self, chat_id: UUID) -> None:
+        """Drop the draft of a deleted chat"""
+        draft = self._drafts.pop(chat_id, None)
+        if draft:
+            draft.task.cancel()
+
+    def metrics(self) -> dict:
+        return {"drafts": len(self._drafts), "hits": self.hits, "misses": self.misses}
+
+    async def shutdown(self) -> None:
+        """Cancel pending pre-generation"""
+        tasks = list(self._preparing) + [draft.task for draft in self._drafts.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._drafts.clear()
+
+    async def _prepare(self, chat_id: UUID) -> None:
+        from services.ai_service import ai_service
+        from services.ai_config_service import ai_config_service
+
+        try:
+            # Check the opt-in before paying for a prompt build
+            chat = await db.get_record_by_id(Chat, chat_id)
+            if not chat:
+                return
+            resolved = await ai_config_service.resolve(chat.company_id, chat_id)
+            if not resolved.speculative_drafts:
+                return
+
+            prompt = await ai_service.build_prompt(
+                chat_id, settings.cache.SPECULATIVE_DRAFT_CONTEXT_MESSAGES
+            )
+            if not prompt:
+                return
+
+            current = self._drafts.get(chat_id)
+            if current and current.fingerprint == prompt.fingerprint:
+                return
+            if current:
+                current.task.cancel()
+
+            task = asyncio.create_task(
+                ai_service.generate_from_prompt(prompt, LLMPriority.BATCH)
+            )
+            # Nobody may ever take this draft, so don't leave its errors unretrieved
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._drafts[chat_id] = _Draft(
+                fingerprint=prompt.fingerprint,
+                task=task,
+                expires_at=time.monotonic()
+                + settings.cache.SPECULATIVE_DRAFT_TTL_SECONDS,
+            )
+            self._drafts.move_to_end(chat_id)
+            while len(self._drafts) > settings.cache.SPECULATIVE_DRAFT_MAX_CHATS:
+                _, evicted = self._drafts.popitem(last=False)
+                evicted.task.cancel()
+
+        except Exception as e:
+            print(f"Error preparing speculative draft: {e}")
+
+
+speculative_draft_service = SpeculativeDraftService()
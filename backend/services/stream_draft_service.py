@@ -0,0 +1,323 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from tortoise import timezone
+
+from common.database import db
+from common.settings import settings
+from common.singleflight import SingleFlight
+from models import Message, StreamDraft
+from models.stream_draft import StreamDraftStatus
+from services.message_service import message_service
+
+INTERRUPTED_ERROR = "Generation was interrupted"
+CANCELLED_ERROR = "Generation was cancelled"
+
+
+@dataclass
+class _LiveDraft:
+    """Output of a generation running in this process"""
+
+    draft_id: UUID
+    chat_id: UUID
+    task: Optional[asyncio.Task] = None
+    cancelled: bool = False
+    chunks: List[str] = field(default_factory=list)
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+    finished: bool = False
+    message: Optional[Message] = None
+    error: Optional[str] = None
+    # Chunks already written to the draft record, and when
+    checkpointed: int = 0
+    checkpointed_at: float = field(default_factory=time.monotonic)
+
+
+class StreamDraftService:
+    """Streaming generations that outlive the request that started them.
+
+    A generation runs in a background task and its output goes to a draft
+    record, so a client whose connection drops can resume it: the text
+    streamed so far is replayed, then live deltas follow, or the final
+    message is returned if it already finished. Deltas are buffered in
+    memory and checkpointed at most once per STREAM_CHECKPOINT_SECONDS, not
+    once per token. Resumes landing on another process follow the
+    checkpoints instead of the live buffer.
+
+    A chat has at most one running generation: starting another joins it.
+    Cancelling stops the LLM call; a cancel handled by another process is
+    noticed by the generating process at its next checkpoint.
+    """
+
+    def __init__(self):
+        self._live: Dict[UUID, _LiveDraft] = {}
+        # chat_id -> draft running in this process
+        self._chat_live: Dict[UUID, _LiveDraft] = {}
+        self._starts = SingleFlight()
+        self._tasks: set = set()
+        self._pruned_at = 0.0
+
+    async def start(
+        self, chat_id: UUID, context_count: int = 10, fresh: bool = False, fast: bool = False
+    ) -> StreamDraft:
+        """Start generating into a new draft, or join the one running for the chat"""
+        return await self._starts.do(
+            chat_id, lambda: self._start(chat_id, context_count, fresh, fast)
+        )
+
+    async def cancel(self, draft_id: UUID) -> None:
+        """Stop a running generation; its draft ends as cancelled"""
+        live = self._live.get(draft_id)
+        if live is not None:
+            live.cancelled = True
+            if live.task is not None:
+                live.task.cancel()
+            return
+        # Running in another process (if at all), which sees this on checkpoint
+        await db.update_records(
+            StreamDraft,
+            dict(
+                status=StreamDraftStatus.CANCELLED,
+                error=CANCELLED_ERROR,
+                updated_at=timezone.now(),
+            ),
+            id=draft_id,
+            status=StreamDraftStatus.STREAMING,
+        )
+
+    async def get_draft(self, draft_id: UUID) -> Optional[StreamDraft]:
+        return await db.get_record_by_id(StreamDraft, draft_id)
+
+    async def follow(
+        self, draft_id: UUID, offset: int = 0
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Replay a draft from `offset` characters, then follow it to the end.
+
+        Yields ("token", str) events, then ("message", Message) once the
+        reply is saved, or ("error", str).
+        """
+        live = self._live.get(draft_id)
+        if live is not None:
+            events = self._follow_live(live, offset)
+        else:
+            events = self._follow_checkpoints(draft_id, offset)
+        async for event in events:
+            yield event
+
+    async def shutdown(self) -> None:
+        """Cancel running generations; their drafts are marked interrupted"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _start(
+        self, chat_id: UUID, context_count: int, fresh: bool, fast: bool
+    ) -> StreamDraft:
+        running = await self._running_draft(chat_id)
+        if running is not None:
+            return running
+
+        await self._prune()
+        draft = await db.create_record(StreamDraft, chat_id=chat_id)
+        live = _LiveDraft(draft_id=draft.id, chat_id=chat_id)
+        self._live[draft.id] = live
+        self._chat_live[chat_id] = live
+
+        live.task = asyncio.create_task(self._run(live, chat_id, context_count, fresh, fast))
+        self._tasks.add(live.task)
+        live.task.add_done_callback(self._tasks.discard)
+        return draft
+
+    async def _running_draft(self, chat_id: UUID) -> Optional[StreamDraft]:
+        """Draft of a generation still running for the chat, in any process"""
+        live = self._chat_live.get(chat_id)
+        if live is not None and not live.finished:
+            draft = await db.get_record_by_id(StreamDraft, live.draft_id)
+            if draft is not None:
+                return draft
+
+        # Another process's generation, if it checkpointed recently
+        cutoff = timezone.now() - timedelta(seconds=settings.stream.STALE_SECONDS)
+        drafts = await db.get_latest_records(
+            StreamDraft,
+            1,
+            chat_id=chat_id,
+            status=StreamDraftStatus.STREAMING,
+            updated_at__gte=cutoff,
+        )
+        return drafts[0] if drafts else None
+
+    async def _run(
+        self, live: _LiveDraft, chat_id: UUID, context_count: int, fresh: bool, fast: bool
+    ) -> None:
+        checkpoints = asyncio.create_task(self._checkpoint_periodically(live))
+        try:
+            async for event, payload in message_service.stream_ai_response(
+                chat_id, context_count, fresh, fast
+            ):
+                if event == "token":
+                    live.chunks.append(payload)
+                elif event == "message":
+                    live.message = payload
+                else:
+                    live.error = payload
+                async with live.changed:
+                    live.changed.notify_all()
+        except asyncio.CancelledError:
+            live.error = CANCELLED_ERROR if live.cancelled else INTERRUPTED_ERROR
+            raise
+        except Exception as e:
+            print(f"Error streaming draft {live.draft_id}: {e}")
+            live.error = "Failed to generate AI response"
+        finally:
+            checkpoints.cancel()
+            await asyncio.gather(checkpoints, return_exceptions=True)
+            live.finished = True
+            async with live.changed:
+                live.changed.notify_all()
+            await self._finish(live)
+            self._live.pop(live.draft_id, None)
+            if self._chat_live.get(chat_id) is live:
+                del self._chat_live[chat_id]
+
+    async def _checkpoint_periodically(self, live: _LiveDraft) -> None:
+        # Touch the record now and then even without output, so other
+        # processes can tell a slow generation from an interrupted one
+        heartbeat = settings.stream.STALE_SECONDS / 4
+        while True:
+            await asyncio.sleep(settings.stream.CHECKPOINT_SECONDS)
+            pending = len(live.chunks) > live.checkpointed
+            if pending or time.monotonic() - live.checkpointed_at >= heartbeat:
+                await self._checkpoint(live)
+
+    async def _checkpoint(self, live: _LiveDraft) -> None:
+        count = len(live.chunks)
+        try:
+            # Queryset updates skip auto_now, so updated_at is set explicitly
+            updated = await db.update_records(
+                StreamDraft,
+                dict(content="".join(live.chunks[:count]), updated_at=timezone.now()),
+                id=live.draft_id,
+                status=StreamDraftStatus.STREAMING,
+            )
+        except Exception as e:
+            print(f"Error checkpointing draft {live.draft_id}: {e}")
+            return
+        if not updated:
+            # Cancelled through another process (or given up on as stale)
+            live.cancelled = True
+            if live.task is not None:
+                live.task.cancel()
+            return
+        live.checkpointed = count
+        live.checkpointed_at = time.monotonic()
+
+    async def _finish(self, live: _LiveDraft) -> None:
+        if live.message is not None:
+            data = dict(
+                status=StreamDraftStatus.COMPLETED,
+                content=live.message.content,
+                message_id=live.message.id,
+            )
+        elif live.cancelled:
+            data = dict(
+                status=StreamDraftStatus.CANCELLED,
+                content="".join(live.chunks),
+                error=CANCELLED_ERROR,
+            )
+        else:
+            data = dict(
+                status=StreamDraftStatus.FAILED,
+                content="".join(live.chunks),
+                error=live.error or "Failed to generate AI response",
+            )
+        try:
+            await db.update_record(
+                StreamDraft, live.draft_id, updated_at=timezone.now(), **data
+            )
+        except Exception as e:
+            print(f"Error finishing draft {live.draft_id}: {e}")
+
+    async def _follow_live(
+        self, live: _LiveDraft, offset: int
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        position = 0  # chunks consumed
+        streamed = 0  # characters in them
+        while True:
+            async with live.changed:
+                await live.changed.wait_for(
+                    lambda: len(live.chunks) > position or live.finished
+                )
+            if len(live.chunks) == position:
+                break
+            # Everything buffered since the last wake-up goes out as one delta
+            text = "".join(live.chunks[position:])
+            position = len(live.chunks)
+            start, streamed = streamed, streamed + len(text)
+            if streamed > offset:
+                yield "token", text[max(offset - start, 0):]
+
+        if live.message is not None:
+            yield "message", live.message
+        else:
+            yield "error", live.error or "Failed to generate AI response"
+
+    async def _follow_checkpoints(
+        self, draft_id: UUID, offset: int
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        sent = offset
+        while True:
+            draft = await db.get_record_by_id(StreamDraft, draft_id)
+            if draft is None:
+                yield "error", "Draft not found"
+                return
+
+            if draft.status == StreamDraftStatus.STREAMING:
+                if len(draft.content) > sent:
+                    yield "token", draft.content[sent:]
+                    sent = len(draft.content)
+                age = timezone.now() - draft.updated_at
+                if age.total_seconds() > settings.stream.STALE_SECONDS:
+                    await db.update_records(
+                        StreamDraft,
+                        dict(
+                            status=StreamDraftStatus.FAILED,
+                            error=INTERRUPTED_ERROR,
+                            updated_at=timezone.now(),
+                        ),
+                        id=draft_id,
+                        status=StreamDraftStatus.STREAMING,
+                    )
+                    yield "error", INTERRUPTED_ERROR
+                    return
+                await asyncio.sleep(settings.stream.CHECKPOINT_SECONDS)
+                continue
+
+            if draft.status == StreamDraftStatus.COMPLETED and draft.message_id:
+                message = await db.get_record_by_id(Message, draft.message_id)
+                if message is not None:
+                    yield "message", message
+                    return
+            if draft.content[sent:]:
+                yield "token", draft.content[sent:]
+            yield "error", draft.error or "Failed to generate AI response"
+            return
+
+    async def _prune(self) -> None:
+        """Delete drafts past retention, at most once per tenth of it"""
+        retention = settings.stream.RETENTION_SECONDS
+        if time.monotonic() - self._pruned_at < retention / 10:
+            return
+        self._pruned_at = time.monotonic()
+        cutoff = timezone.now() - timedelta(seconds=retention)
+        try:
+            await db.delete_records(StreamDraft, updated_at__lt=cutoff)
+        except Exception as e:
+            print(f"Error pruning stream drafts: {e}")
+
+
+stream_draft_service = StreamDraftService()
@@ -0,0 +1,135 @@
+import asyncio
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from common.database import db
+from common.settings import settings
+from models import CompanyUsage
+
+COUNTER_FIELDS = [
+    "requests",
+    "cache_hits",
+    "errors",
+    "prompt_tokens",
+    "cached_tokens",
+    "completion_tokens",
+    "latency_ms",
+]
+
+# Rows per upsert statement, keeping well under the bind parameter limit
+FLUSH_CHUNK_ROWS = 500
+
+
+class UsageService:
+    """Per-company, per-day LLM usage ledger with write-behind batching.
+
+    Calls only bump in-memory counters keyed by (company, day, model); a
+    background task adds them to the company_usage table in one multi-row
+    upsert per interval, so busy tenants never contend on their ledger row.
+    Counters buffered at shutdown are flushed by shutdown().
+    """
+
+    def __init__(self):
+        self._buffer: Dict[Tuple[UUID, date, str], Dict[str, int]] = defaultdict(
+            lambda: dict.fromkeys(COUNTER_FIELDS, 0)
+        )
+        self._task: Optional[asyncio.Task] = None
+        self._early_flushes: set = set()
+        self._flush_lock = asyncio.Lock()
+
+    def record(
+        self,
+        company_id: Optional[UUID],
+        model: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        latency_seconds: float = 0.0,
+        cache_hit: bool = False,
+        error: bool = False,
+        cached_tokens: int = 0,
+    ) -> None:
+        """Count one LLM request (or one answered from a cache)"""
+        if not settings.usage.ENABLED or company_id is None:
+            return
+
+        day = datetime.now(timezone.utc).date()
+        counters = self._buffer[(company_id, day, model)]
+        counters["requests"] += 1
+        counters["cache_hits"] += int(cache_hit)
+        counters["errors"] += int(error)
+        counters["prompt_tokens"] += prompt_tokens
+        counters["cached_tokens"] += cached_tokens
+        counters["completion_tokens"] += completion_tokens
+        counters["latency_ms"] += int(latency_seconds * 1000)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_periodically())
+        elif len(self._buffer) >= settings.usage.MAX_BUFFERED_ROWS:
+            task = asyncio.create_task(self.flush())
+            self._early_flushes.add(task)
+            task.add_done_callback(self._early_flushes.discard)
+
+    async def flush(self) -> None:
+        """Write buffered counters to the ledger"""
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            buffer, self._buffer = self._buffer, defaultdict(
+                lambda: dict.fromkeys(COUNTER_FIELDS, 0)
+            )
+            rows = [
+                {"id": uuid.uuid4(), "company_id": company_id, "day": day, "model": model, **counters}
+                for (company_id, day, model), counters in buffer.items()
+            ]
+            try:
+                for start in range(0, len(rows), FLUSH_CHUNK_ROWS):
+                    await db.increment_counters(
+                        CompanyUsage,
+                        ["company_id", "day", "model"],
+                        COUNTER_FIELDS,
+                        rows[start:start + FLUSH_CHUNK_ROWS],
+                    )
+            except Exception as e:
+                print(f"Error flushing usage ledger: {e}")
+                self._restore(buffer)
+
+    async def get_usage(
+        self,
+        company_id: UUID,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> List[CompanyUsage]:
+        """Ledger rows of a company, oldest day first"""
+        await self.flush()
+        filters = {"company_id": company_id}
+        if start:
+            filters["day__gte"] = start
+        if end:
+            filters["day__lte"] = end
+        return await db.get_records_ordered(CompanyUsage, "day", **filters)
+
+    async def shutdown(self) -> None:
+        """Stop the flush task and write what is still buffered"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.usage.FLUSH_SECONDS)
+            await self.flush()
+
+    def _restore(self, buffer: Dict[Tuple[UUID, date, str], Dict[str, int]]) -> None:
+        """Put counters of a failed flush back so the next one retries them"""
+        for key, counters in buffer.items():
+            current = self._buffer[key]
+            for field, value in counters.items():
+                current[field] += value
+
+
+usage_service = UsageService()
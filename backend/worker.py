@@ -0,0 +1,46 @@
+import asyncio
+import signal
+
+from common.settings import settings
+from common.database import db
+from common.invalidation import invalidation_bus
+from common.redis import close_redis
+from services.chat_summary_service import chat_summary_service
+from services.count_service import count_service
+from services.message_index_service import message_index_service
+from services.semantic_cache_service import semantic_cache_service
+from services.speculative_draft_service import speculative_draft_service
+from services.stream_draft_service import stream_draft_service
+from services.usage_service import usage_service
+# Importing from message_service registers the generation/revision handlers
+from services.message_service import job_queue
+
+
+async def main():
+    """Run AI job workers without the HTTP API"""
+    await db.init_db()
+    await invalidation_bus.start()
+    await job_queue.start(settings.jobs.WORKERS)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await stop.wait()
+
+    await job_queue.stop()
+    await stream_draft_service.shutdown()
+    await speculative_draft_service.shutdown()
+    await semantic_cache_service.shutdown()
+    await message_index_service.shutdown()
+    await usage_service.shutdown()
+    await count_service.shutdown()
+    await chat_summary_service.shutdown()
+    await invalidation_bus.stop()
+    await close_redis()
+    await db.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -22,12 +22,15 @@ const ChatPage = ({ user }) => {
   const { chatId } = useParams();
   const navigate = useNavigate();
   const messagesEndRef = useRef(null);
+  // Last message the previous AI draft was generated after
+  const lastGeneratedAfterRef = useRef(undefined);
   
   const [chat, setChat] = useState(null);
   const [messages, setMessages] = useState([]);
   const [newMessage, setNewMessage] = useState('');
   const [isLoading, setIsLoading] = useState(true);
   const [isGeneratingAI, setIsGeneratingAI] = useState(false);
+  const [streamingDraft, setStreamingDraft] = useState(null);
   const [error, setError] = useState('');
   
   const [editingMessage, setEditingMessage] = useState(null);
@@ -82,7 +85,7 @@ const ChatPage = ({ user }) => {
 
   useEffect(() => {
     scrollToBottom();
-  }, [messages]);
+  }, [messages, streamingDraft]);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -104,13 +107,23 @@ const ChatPage = ({ user }) => {
 
   const handleGenerateAI = async () => {
     setIsGeneratingAI(true);
+    setStreamingDraft('');
+    // Generating again for the same conversation (e.g. after deleting the
+    // draft) should give a new draft, not the cached one
+    const generatedAfter = messages[messages.length - 1]?.id ?? null;
+    const fresh = lastGeneratedAfterRef.current === generatedAfter;
     try {
-      const aiMessage = await apiService.generateAIResponse(chatId);
+      const aiMessage = await apiService.streamAIResponse(chatId, {
+        onToken: (token) => setStreamingDraft((draft) => (draft || '') + token),
+        fresh,
+      });
+      lastGeneratedAfterRef.current = generatedAfter;
       setMessages([...messages, aiMessage]);
     } catch (error) {
       setError('Failed to generate AI response');
       console.error('Error generating AI response:', error);
     } finally {
+      setStreamingDraft(null);
       setIsGeneratingAI(false);
     }
   };
@@ -349,11 +362,20 @@ const ChatPage = ({ user }) => {
               ))
             )}
             {isGeneratingAI && (
-              <div className="flex items-center space-x-2 text-gray-600">
-                <Bot className="w-5 h-5" />
-                <span>AI is generating response...</span>
-                <LoadingSpinner size="small" />
-              </div>
+              streamingDraft ? (
+                <div className="flex items-start space-x-2 text-gray-700">
+                  <Bot className="w-5 h-5 mt-1 flex-shrink-0" />
+                  <p className="whitespace-pre-wrap bg-white border border-gray-200 rounded-lg px-4 py-2">
+                    {streamingDraft}
+                  </p>
+                </div>
+              ) : (
+                <div className="flex items-center space-x-2 text-gray-600">
+                  <Bot className="w-5 h-5" />
+                  <span>AI is generating response...</span>
+                  <LoadingSpinner size="small" />
+                </div>
+              )
             )}
             <div ref={messagesEndRef} />
           </div>
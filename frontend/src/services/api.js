@@ -2,6 +2,13 @@ import axios from 'axios';
 
 const API_BASE_URL = import.meta.env.VITE_FRONTEND_API_BASE_URL;
 
+// Reconnects to a streamed AI draft after the connection drops
+const STREAM_RESUME_ATTEMPTS = 3;
+const STREAM_RESUME_DELAY_MS = 1000;
+
+// Generation failed on the server (as opposed to a dropped connection)
+class AIStreamError extends Error {}
+
 class ApiService {
   constructor() {
     this.client = axios.create({
@@ -98,8 +105,10 @@ class ApiService {
   }
 
   // Chat endpoints
-  async getChats(page = 1, pageSize = 20) {
-    const response = await this.client.get(`/chats/?page=${page}&page_size=${pageSize}`);
+  async getChats(cursor = null, pageSize = 20) {
+    const response = await this.client.get('/chats/', {
+      params: { cursor: cursor || undefined, page_size: pageSize },
+    });
     return response.data;
   }
 
@@ -135,8 +144,10 @@ class ApiService {
     await this.client.delete(`/chats/${chatId}`);
   }
 
-  async getChatMessages(chatId, page = 1, pageSize = 50) {
-    const response = await this.client.get(`/chats/${chatId}/messages?page=${page}&page_size=${pageSize}`);
+  async getChatMessages(chatId, cursor = null, pageSize = 50) {
+    const response = await this.client.get(`/chats/${chatId}/messages`, {
+      params: { cursor: cursor || undefined, page_size: pageSize },
+    });
     return response.data;
   }
 
@@ -167,6 +178,121 @@ class ApiService {
     return response.data;
   }
 
+  async generateAICandidates(chatId, candidatesCount = 3, contextCount = 10) {
+    const response = await this.client.post('/messages/generate-ai-candidates', {
+      chat_id: chatId,
+      context_messages_count: contextCount,
+      candidates_count: candidatesCount,
+    });
+    return response.data;
+  }
+
+  async streamAIResponse(chatId, { onToken, contextCount = 10, fresh = false, signal } = {}) {
+    const headers = {
+      'ngrok-skip-browser-warning': 'true',
+      Authorization: `Bearer ${localStorage.getItem('access_token')}`,
+    };
+    let draftId = null;
+    // Characters received so far (code points, as counted by the server)
+    let received = 0;
+
+    // The generation outlives the connection, so aborting has to stop it explicitly
+    const cancel = () => {
+      if (draftId) {
+        this.client.delete(`/messages/generate-ai-response/stream/${draftId}`).catch(() => {});
+      }
+    };
+    signal?.addEventListener('abort', cancel, { once: true });
+
+    const handlers = {
+      onDraft: (id) => {
+        draftId = id;
+        if (signal?.aborted) cancel();
+      },
+      onToken: (content) => {
+        received += [...content].length;
+        onToken?.(content);
+      },
+    };
+
+    try {
+      // axios cannot consume a streaming body in the browser, so use fetch directly
+      let response = await fetch(`${API_BASE_URL}/messages/generate-ai-response/stream`, {
+        method: 'POST',
+        headers: { ...headers, 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          chat_id: chatId,
+          context_messages_count: contextCount,
+          // Bypass the response cache, e.g. when regenerating a rejected draft
+          fresh,
+        }),
+        signal,
+      });
+
+      for (let attempt = 0; ; attempt++) {
+        if (!response.ok) {
+          throw new Error(`Failed to stream AI response: ${response.status}`);
+        }
+        try {
+          const message = await this._readDraftStream(response, handlers);
+          if (message) return message;
+        } catch (error) {
+          if (error instanceof AIStreamError || signal?.aborted) throw error;
+        }
+
+        // Connection dropped: resume the draft from what we already have
+        if (!draftId || attempt >= STREAM_RESUME_ATTEMPTS) {
+          throw new Error('AI response stream ended unexpectedly');
+        }
+        await new Promise((resolve) => setTimeout(resolve, STREAM_RESUME_DELAY_MS * (attempt + 1)));
+        response = await fetch(
+          `${API_BASE_URL}/messages/generate-ai-response/stream/${draftId}?offset=${received}`,
+          { headers, signal },
+        );
+      }
+    } finally {
+      signal?.removeEventListener('abort', cancel);
+    }
+  }
+
+  // Consume draft SSE events; returns the saved message, or null if the stream ends early
+  async _readDraftStream(response, { onDraft, onToken }) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) return null;
+      buffer += decoder.decode(value, { stream: true });
+
+      // SSE frames are separated by a blank line
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const frame = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = 'message';
+        let data = '';
+        for (const line of frame.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        }
+        const payload = data ? JSON.parse(data) : null;
+
+        if (event === 'draft') {
+          onDraft(payload.id);
+        } else if (event === 'token') {
+          onToken(payload.content);
+        } else if (event === 'message') {
+          return payload;
+        } else if (event === 'error') {
+          throw new AIStreamError(payload?.detail || 'Failed to generate AI response');
+        }
+      }
+    }
+  }
+
   async reviseMessageWithAI(messageId, revisionInstructions) {
     const response = await this.client.post('/messages/revise-with-ai', {
       message_id: messageId,